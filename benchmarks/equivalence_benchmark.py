@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalence check and speedup report of the optimised engines against the
+frozen reference engines (ltsim/reference.py), over randomized scenarios.
+Exits with an error if any output column differs beyond its tolerance.
+"""
+import os
+import sys
+
+# benchmarks run against this checkout of ltsim
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ltsim.equivalence import check_equivalence, summarize
+
+# number of scenarios for each engine
+n_scenarios = 50
+
+# number of hourly timesteps in each leveraged_token_model scenario
+n_steps = 500
+
+report = check_equivalence(n_scenarios, n_steps, seed=0)
+
+print(summarize(report).to_string())
+
+failed = report[~report['passed']]
+
+if len(failed):
+    print(failed[['engine', 'scenario', 'kind', 'mismatched',
+                  'max_abs_error']].to_string())
+
+    sys.exit(f'{len(failed)} scenarios do not match the reference engines')
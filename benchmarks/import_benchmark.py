@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Import time benchmark for the ltsim package. Each import is timed in a fresh
+interpreter, relative to importing numpy alone. Exits with an error if
+importing ltsim loads pandas, creates the data directory, or takes longer
+than the allowed overhead over numpy.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+# number of fresh interpreters to time each import in
+n_runs = 10
+
+# allowed import time (seconds) for ltsim on top of numpy
+max_overhead = 0.05
+
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+data_dir = os.path.join(root_dir, 'ltsim', 'data')
+
+check_code = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, 'pandas' in sys.modules)
+'''
+
+def time_import(module):
+    times = []
+    for _ in range(n_runs):
+        out = subprocess.run([sys.executable, '-c', check_code.format(module=module)],
+                             capture_output=True, text=True, check=True,
+                             cwd=root_dir).stdout.split()
+        times.append(float(out[0]))
+    return statistics.median(times), out[1] == 'True'
+
+data_dir_existed = os.path.exists(data_dir)
+
+numpy_time, _ = time_import('numpy')
+
+ltsim_time, pandas_loaded = time_import('ltsim')
+
+print(f'numpy: {numpy_time * 1e3:.1f} ms, ltsim: {ltsim_time * 1e3:.1f} ms '
+      f'(+{(ltsim_time - numpy_time) * 1e3:.1f} ms)')
+
+errors = []
+
+if pandas_loaded:
+    errors.append('importing ltsim loaded pandas')
+
+if not data_dir_existed and os.path.exists(data_dir):
+    errors.append('importing ltsim created the data directory')
+
+if ltsim_time - numpy_time > max_overhead:
+    errors.append(f'ltsim import overhead exceeds {max_overhead * 1e3:.0f} ms')
+
+if errors:
+    sys.exit('; '.join(errors))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark for the AMM pool curves. Measures vectorised quotes
+(swaps per second for a batch of trades) and full trade simulations
+(execute_trades calls per second) for each curve.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# benchmarks run against this checkout of ltsim
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ltsim import (CONSTANT_PRODUCT, StableSwapCurve,
+                   ConcentratedLiquidityCurve, execute_trades)
+
+curves = {'constant product': CONSTANT_PRODUCT,
+          'stableswap (amp=100)': StableSwapCurve(100),
+          'concentrated (range x2)': ConcentratedLiquidityCurve(2)}
+
+# Balances of pool tokens - x (UST), y (LUNA)
+pool_x, pool_y = 30160053, 659723
+
+swap_fee = 0.3
+
+# number of swaps quoted in each batch
+n_swaps = 1_000_000
+
+# number of execute_trades calls timed for each curve
+n_executions = 200
+
+rng = np.random.default_rng(0)
+
+# mix of buys and sells up to 1% of pool depth
+delta_x = rng.uniform(-0.01, 0.01, n_swaps) * pool_x
+
+delta_y = - delta_x / (pool_x / pool_y)
+
+def best_time(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+for name, curve in curves.items():
+
+    quote_time = best_time(lambda: curve.quote(delta_x, delta_y, pool_x,
+                                               pool_y, swap_fee))
+
+    execute_time = best_time(
+        lambda: [execute_trades(750000, 75000, 3, 1, 95, 3,
+                                {'pool_x_i': pool_x, 'pool_y_i': pool_y},
+                                swap_fee, curve)
+                 for _ in range(n_executions)], repeat=3)
+
+    print(f'{name:>24}: {n_swaps / quote_time / 1e6:8.1f} M quotes/s, '
+          f'{n_executions / execute_time:8.0f} executions/s')
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark for running many independent short simulations. Runs the
+same parameter sets with run_threaded (threads sharing the input arrays),
+with the compiled kernel and with the numpy implementation, and with
+run_parallel (worker processes attached to shared memory) on 1 to N cores,
+reporting runs per second and the speedup over a single worker.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# benchmarks run against this checkout of ltsim
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ltsim import kernel
+from ltsim.optimize import summary_metrics
+from ltsim.parallel import (SharedModelData, model_args, run_parallel,
+                            run_threaded)
+
+# number of hourly timesteps in each run
+n_steps = 24 * 90
+
+# number of parameter sets run for each worker count
+n_runs = 256
+
+# worker counts to time, from 1 to the number of CPUs
+max_workers = os.cpu_count()
+
+rng = np.random.default_rng(0)
+
+# random walk price path with around 5% hourly volatility
+price = 80 * np.exp(np.cumsum(rng.normal(0, 0.05, n_steps)))
+
+# Balances of pool tokens - x (UST), y (LUNA)
+pool_y = np.full(n_steps, 659723.0)
+
+pool_x = pool_y * price
+
+base_params = {'target_leverage': 2,
+               'min_leverage': 1.8,
+               'max_leverage': 2.2,
+               'congestion_time': 1,
+               'rebalance_interval': 24,
+               'recentering_speed_periodic': 1,
+               'recentering_speed_emergency': 1,
+               'trade_params_periodic': (750000, 3, 1),
+               'trade_params_emergency': (750000, 3, 1),
+               'borrow_rate': 20,
+               'liq_thresh': 85,
+               'liq_premium': 5,
+               'n_tokens_issued': 50000,
+               'swap_fee': 0.3,
+               'arb_params': (95, 3)}
+
+param_sets = [model_args(dict(base_params,
+                              min_leverage=rng.uniform(1.5, 1.9),
+                              max_leverage=rng.uniform(2.1, 2.5),
+                              rebalance_interval=int(rng.integers(1, 48))))
+              for _ in range(n_runs)]
+
+def run_threaded_numpy(*args):
+    # run_threaded with the compiled kernel disabled
+    kernel.enabled = False
+
+    try:
+        return run_threaded(*args)
+    finally:
+        kernel.enabled = True
+
+def best_time(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == '__main__':
+    with SharedModelData(price, pool_x, pool_y) as data:
+
+        runners = {'threads': run_threaded,
+                   'threads (numpy)': run_threaded_numpy,
+                   'processes': run_parallel}
+
+        base_times = {}
+
+        print(f'{n_runs} runs of {n_steps} timesteps, {max_workers} CPUs, '
+              f'compiled kernel {"available" if kernel.available() else "unavailable"}')
+
+        for n_workers in range(1, max_workers + 1):
+            for name, runner in runners.items():
+                elapsed = best_time(lambda: runner(data, param_sets, n_workers,
+                                                   summary_metrics))
+
+                base_times.setdefault(name, elapsed)
+
+                print(f'{name:>15} x {n_workers:<3}: {n_runs / elapsed:8.0f} runs/s, '
+                      f'speedup {base_times[name] / elapsed:5.2f}')
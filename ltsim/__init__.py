@@ -1,4 +1,44 @@
 # -*- coding: utf-8 -*-
-from .model import leveraged_token_model
+import importlib
+
+from .pools import *
 from .trade_sim import *
-from .data import *
\ No newline at end of file
+from .core import simulate_leveraged_token
+from .inputs import ModelInputs, prepare_inputs
+
+# pandas based modules are only imported when one of their attributes is
+# first accessed, so importing ltsim only requires numpy.
+_lazy_attrs = {'leveraged_token_model': 'model',
+               'dir_path': 'data',
+               'data_dir': 'data',
+               'token_pools': 'data',
+               'prices_url': 'data',
+               'liquidity_url': 'data',
+               'prices_schema': 'data',
+               'liquidity_schema': 'data',
+               'read_data_from_api': 'data',
+               'process_price_data': 'data',
+               'read_prices_from_api': 'data',
+               'get_token_prices': 'data',
+               'process_liquididty_data': 'data',
+               'read_liquidity_from_api': 'data',
+               'get_pool_liquidity': 'data',
+               'get_all_model_data': 'data',
+               'get_model_data': 'data'}
+
+# names provided by from ltsim import *, including the lazily imported ones
+__all__ = ['PoolCurve', 'ConstantProductCurve', 'StableSwapCurve',
+           'ConcentratedLiquidityCurve', 'CONSTANT_PRODUCT', 'sim_swap',
+           'sim_trades', 'optimal_trade_split', 'execute_trades',
+           'TradeEvent', 'TradeLog', 'simulate_leveraged_token',
+           'ModelInputs', 'prepare_inputs', *_lazy_attrs]
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        module = importlib.import_module(f'.{_lazy_attrs[name]}', __name__)
+        return getattr(module, name)
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attrs))
@@ -0,0 +1,505 @@
+/*
+ * Compiled counterpart of the simulate_leveraged_token loop (ltsim/core.py)
+ * and execute_trades (ltsim/trade_sim.py) for constant product pools.
+ *
+ * Loaded through ctypes by ltsim/kernel.py, which releases the GIL for the
+ * duration of each call. Every operation follows the Python implementation
+ * in the same order, so results are identical to it. Any input for which
+ * the Python implementation could raise returns a non zero status instead,
+ * and the caller falls back to the Python implementation.
+ */
+#include <math.h>
+#include <stdint.h>
+
+#define OK 0
+#define UNSUPPORTED 1
+
+/* indices of scalar parameters */
+enum {
+    P_TARGET_LEVERAGE, P_MIN_LEVERAGE, P_MAX_LEVERAGE, P_CONGESTION_TIME,
+    P_REBALANCE_INTERVAL, P_SPEED_PERIODIC, P_SPEED_EMERGENCY,
+    P_MAX_TRADE_PERIODIC, P_MAX_SLIPPAGE_PERIODIC, P_TRADE_DELAY_PERIODIC,
+    P_MAX_TRADE_EMERGENCY, P_MAX_SLIPPAGE_EMERGENCY, P_TRADE_DELAY_EMERGENCY,
+    P_LIQ_THRESH, P_LIQ_PREMIUM, P_N_TOKENS_ISSUED, P_ARB_EFFECTIVENESS,
+    P_ARB_TIME, P_IMPACT_DECAY, P_LIQUIDATION_CASCADE, N_PARAMS
+};
+
+/* indices of output arrays, in the order of core.state_names after n_tokens */
+enum {
+    O_N_UNDERLYING, O_BORROWED, O_LEVERAGE, O_TARGET_REBALANCE_AMOUNT,
+    O_REBALANCE_AMOUNT, O_OFFERED_AMOUNT, O_SWAP_FEES, O_SWAP_SPREAD,
+    O_MAX_SWAP_PERC_SPREAD, O_EMERGENCY_REBALANCES, O_PERIODIC_REBALANCES,
+    O_EXCEEDANCE_TIME, O_LTV, O_LIQUIDATION_AMOUNT, O_LIQUIDATION_VOLUME,
+    N_OUTPUTS
+};
+
+/* carried state */
+enum { F_UNDERLYING, F_DEBT, F_IMPACT_X, F_IMPACT_Y, N_FLOAT_STATE };
+
+enum { I_LAST_REBALANCED, I_EXCEEDANCE, I_IMPACT_TIME, N_INT_STATE };
+
+/* minimum number of timesteps before the next periodic rebalance to try
+ * stepping through them in a single pass (core._min_quiet_steps) */
+#define MIN_QUIET_STEPS 8
+
+/* Python's float floor division */
+static double py_floordiv(double vx, double wx)
+{
+    double mod = fmod(vx, wx);
+    double div = (vx - mod) / wx;
+    double floordiv;
+
+    if (mod) {
+        if ((wx < 0) != (mod < 0)) {
+            div -= 1.0;
+        }
+    }
+
+    if (div) {
+        floordiv = floor(div);
+        if (div - floordiv > 0.5) {
+            floordiv += 1.0;
+        }
+    } else {
+        floordiv = copysign(0.0, vx / wx);
+    }
+
+    return floordiv;
+}
+
+/* Python's max(a, b) and min(a, b), which keep a unless b compares greater
+ * (or less) */
+static double py_max(double a, double b)
+{
+    return b > a ? b : a;
+}
+
+static double py_min(double a, double b)
+{
+    return b < a ? b : a;
+}
+
+/* arb_offset[k] of trade_sim._run_trades */
+static double arb_offset(int64_t k, double time_delay, double arb_time,
+                         double arb_effectiveness)
+{
+    double offset = ((double)(k + 1) * time_delay) / arb_time;
+
+    if (offset > 1.0) {
+        offset = 1.0;
+    }
+
+    return offset * arb_effectiveness / 100;
+}
+
+/* trade_sim.execute_trades without optimal_split, for a constant product
+ * pool. result is (received, offered, fees, spread, max_perc_spread). */
+static int execute_trades(double trade_vol, double max_trade,
+                          double max_slippage, double time_delay,
+                          double arb_effectiveness, double arb_time,
+                          double pool_x, double pool_y, double swap_fee,
+                          double *result)
+{
+    double direction, n_max, rem_vol, nt_trades, received, fees, spread;
+    double max_perc_spread, prev_dx, prev_dy, first_offset;
+    int64_t nt, n, n_trades, nte, narb, narb_left, ne, t;
+
+    if (trade_vol == 0) {
+        result[0] = result[1] = result[2] = result[3] = result[4] = 0;
+        return OK;
+    }
+
+    if (!(max_trade > 0) || !isfinite(max_trade) || !(time_delay > 0)
+            || !isfinite(time_delay) || !(arb_time > 0)
+            || !isfinite(arb_time) || !isfinite(trade_vol)) {
+        return UNSUPPORTED;
+    }
+
+    direction = fabs(trade_vol) / trade_vol;
+
+    n_max = py_floordiv(fabs(trade_vol), max_trade);
+
+    if (n_max > 1e15) {
+        return UNSUPPORTED;
+    }
+
+    n = (int64_t)n_max;
+
+    rem_vol = fabs(trade_vol) - max_trade * (double)n;
+
+    n_trades = rem_vol > 0 ? n + 1 : n;
+
+    nt_trades = py_floordiv(60 * 60, time_delay);
+
+    nt = (int64_t)nt_trades;
+
+    nte = n_trades < nt ? n_trades : nt;
+
+    if (ceil(arb_time / time_delay) > 1e9) {
+        return UNSUPPORTED;
+    }
+
+    narb = (int64_t)ceil(arb_time / time_delay);
+
+    first_offset = arb_offset(0, time_delay, arb_time, arb_effectiveness);
+
+    received = fees = spread = 0;
+
+    max_perc_spread = -INFINITY;
+
+    prev_dx = prev_dy = 0;
+
+    ne = 0;
+
+    narb_left = 0;
+
+    t = 0;
+
+    while (ne < nte && t < nt) {
+        double dx = direction * (ne < n ? max_trade : rem_vol);
+        double dy, ask, out, fee, trade_spread, perc_spread;
+        int executed;
+
+        dy = -dx / (pool_x / pool_y);
+
+        if (dx > 0) {
+            ask = fabs(dy);
+            out = dx * pool_y / (dx + pool_x);
+            ask *= pool_x / pool_y;
+            out *= pool_x / pool_y;
+        } else if (dx < 0) {
+            ask = fabs(dx);
+            out = dy * pool_x / (dy + pool_y);
+        } else {
+            return UNSUPPORTED;
+        }
+
+        fee = out * swap_fee / 100;
+
+        trade_spread = ask - out;
+
+        perc_spread = trade_spread / ask * 100;
+
+        max_perc_spread = py_max(max_perc_spread, perc_spread);
+
+        executed = perc_spread < max_slippage;
+
+        if ((t == 0 || narb_left == 0) && perc_spread > max_slippage) {
+            break;
+        }
+
+        if (executed) {
+            if (narb < 1) {
+                return UNSUPPORTED;
+            }
+
+            pool_x = pool_x + dx * (1 - first_offset);
+            pool_y = pool_y + dy * (1 - first_offset);
+
+            narb_left = narb - 1;
+
+            received += out - fee;
+            fees += fee;
+            spread += trade_spread;
+
+            ne += 1;
+        } else if (narb_left > 0) {
+            double offset = arb_offset(narb - narb_left, time_delay, arb_time,
+                                       arb_effectiveness);
+
+            pool_x = pool_x + prev_dx * -offset;
+            pool_y = pool_y + prev_dy * -offset;
+
+            narb_left -= 1;
+        }
+
+        prev_dx = dx;
+        prev_dy = dy;
+
+        t += 1;
+    }
+
+    if (t < nt || nt == 0) {
+        max_perc_spread = py_max(max_perc_spread, 0);
+    }
+
+    result[0] = direction * received;
+    result[1] = direction * (received + fees + spread);
+    result[2] = fees;
+    result[3] = spread;
+    result[4] = max_perc_spread;
+
+    return OK;
+}
+
+/* core._accrue_quiet. Returns the first timestep that must be stepped
+ * through individually, and updates debt to the debt at the start of it. */
+static int64_t accrue_quiet(int64_t t, int64_t stop, double underlying,
+                            double *debt, const double *price,
+                            const double *growth, const double *params,
+                            double **out)
+{
+    int64_t size = 16;
+    double liq_ratio = params[P_LIQ_THRESH] / 100;
+
+    while (t < stop) {
+        int64_t end = stop < t + size ? stop : t + size;
+        int64_t k, stop_quiet = end;
+
+        for (k = t; k < end; k++) {
+            double debt_start = *debt * (growth[k] / growth[t]);
+            double value = underlying * price[k];
+            double ltv = debt_start > 0 ? debt_start / value : NAN;
+            double leverage = value / (value - debt_start);
+
+            if (ltv >= liq_ratio || leverage < params[P_MIN_LEVERAGE]
+                    || leverage > params[P_MAX_LEVERAGE]) {
+                stop_quiet = k;
+                break;
+            }
+
+            out[O_N_UNDERLYING][k] = underlying;
+            out[O_BORROWED][k] = *debt * (growth[k + 1] / growth[t]);
+            out[O_LEVERAGE][k] = leverage;
+            out[O_LTV][k] = ltv;
+        }
+
+        *debt = *debt * (growth[stop_quiet] / growth[t]);
+
+        if (stop_quiet < end) {
+            return stop_quiet;
+        }
+
+        t = stop_quiet;
+
+        size *= 2;
+    }
+
+    return t;
+}
+
+/* core.simulate_leveraged_token for a constant product pool, without an
+ * event log or optimal trade splits. out holds the zeroed state arrays,
+ * float_state and int_state the carried state, updated on return. */
+int simulate(int64_t nt, const double *price, const double *pool_x,
+             const double *pool_y, const double *n_tokens,
+             const double *hourly_rate, const double *growth,
+             const double *swap_fee, const double *params,
+             double *float_state, int64_t *int_state, double **out)
+{
+    double underlying = float_state[F_UNDERLYING];
+    double debt = float_state[F_DEBT];
+    double impact_x = float_state[F_IMPACT_X];
+    double impact_y = float_state[F_IMPACT_Y];
+    int64_t last_rebalanced = int_state[I_LAST_REBALANCED];
+    int64_t exceedance = int_state[I_EXCEEDANCE];
+    int64_t impact_time = int_state[I_IMPACT_TIME];
+    int cascade = params[P_LIQUIDATION_CASCADE] != 0;
+    double rebalance_interval = params[P_REBALANCE_INTERVAL];
+    double trade[5];
+    int64_t t = 0;
+
+    while (t < nt) {
+        double *n_underlying = out[O_N_UNDERLYING];
+        double *borrowed = out[O_BORROWED];
+        double *leverage = out[O_LEVERAGE];
+        double *target_rebalance_amount = out[O_TARGET_REBALANCE_AMOUNT];
+        double *rebalance_amount = out[O_REBALANCE_AMOUNT];
+        double *offered_amount = out[O_OFFERED_AMOUNT];
+        double *ltv = out[O_LTV];
+        double current_value, delta_debt, delta_underlying, interest;
+        int outside_lev_range, emergency_rebal_allowed;
+        int periodic_rebal_allowed, rebal_allowed;
+
+        /* step through timesteps where no liquidation or rebalance can
+         * occur in a single pass, only accruing interest */
+        if ((double)last_rebalanced + rebalance_interval - (double)t >= MIN_QUIET_STEPS
+                && exceedance == 0 && underlying > 0
+                && params[P_N_TOKENS_ISSUED] != 0) {
+            /* no periodic rebalance is due if the interval is infinite */
+            double next = ceil((double)last_rebalanced + rebalance_interval);
+            int64_t next_periodic = next < (double)nt ? (int64_t)next : nt;
+
+            t = accrue_quiet(t, next_periodic, underlying, &debt, price,
+                             growth, params, out);
+
+            if (t == nt) {
+                break;
+            }
+        }
+
+        n_underlying[t] = underlying;
+
+        borrowed[t] = debt;
+
+        if (borrowed[t] > 0) {
+            ltv[t] = borrowed[t] / (n_underlying[t] * price[t]);
+        } else {
+            ltv[t] = NAN;
+        }
+
+        /* liquidation logic */
+        if (ltv[t] >= params[P_LIQ_THRESH] / 100) {
+            double collateral_before = n_underlying[t] * price[t] - borrowed[t];
+            double collateral_after;
+
+            out[O_LIQUIDATION_AMOUNT][t] = collateral_before * params[P_LIQ_PREMIUM] / 100;
+
+            collateral_after = collateral_before - out[O_LIQUIDATION_AMOUNT][t];
+
+            if (cascade) {
+                double seized = py_min(n_underlying[t] * price[t],
+                                       borrowed[t] + py_max(out[O_LIQUIDATION_AMOUNT][t], 0));
+                double decay = pow(params[P_IMPACT_DECAY], (double)(t - impact_time));
+                double pool_x_t = pool_x[t] + impact_x * decay;
+                double pool_y_t = pool_y[t] + impact_y * decay;
+
+                if (execute_trades(-n_tokens[t] * seized,
+                                   params[P_MAX_TRADE_EMERGENCY],
+                                   params[P_LIQ_PREMIUM],
+                                   params[P_TRADE_DELAY_EMERGENCY],
+                                   params[P_ARB_EFFECTIVENESS],
+                                   params[P_ARB_TIME], pool_x_t, pool_y_t,
+                                   swap_fee[t], trade) != OK) {
+                    return UNSUPPORTED;
+                }
+
+                out[O_LIQUIDATION_VOLUME][t] = -trade[1];
+
+                impact_x = impact_x * decay + trade[0];
+
+                impact_y = impact_y * decay
+                           + out[O_LIQUIDATION_VOLUME][t] / (pool_x_t / pool_y_t);
+
+                impact_time = t;
+            }
+
+            if (collateral_after <= 0) {
+                n_underlying[t] = 0;
+                borrowed[t] = 0;
+
+                if (cascade) {
+                    underlying = debt = 0;
+                }
+            } else {
+                n_underlying[t] = underlying = collateral_after / price[t];
+                borrowed[t] = debt = 0;
+            }
+        }
+
+        current_value = n_underlying[t] * price[t];
+
+        leverage[t] = current_value / (current_value - borrowed[t]);
+
+        outside_lev_range = (leverage[t] < params[P_MIN_LEVERAGE])
+                            | (leverage[t] > params[P_MAX_LEVERAGE]);
+
+        if (outside_lev_range) {
+            exceedance += 1;
+        } else {
+            exceedance = 0;
+        }
+
+        out[O_EXCEEDANCE_TIME][t] = (double)exceedance;
+
+        emergency_rebal_allowed = outside_lev_range
+                                  & (out[O_EXCEEDANCE_TIME][t] >= params[P_CONGESTION_TIME]);
+
+        periodic_rebal_allowed = (double)t >= (double)last_rebalanced + rebalance_interval;
+
+        rebal_allowed = (leverage[t] != params[P_TARGET_LEVERAGE])
+                        && (n_tokens[t] > 0)
+                        && (n_underlying[t] > 1e-3)
+                        && (emergency_rebal_allowed || periodic_rebal_allowed);
+
+        if (rebal_allowed) {
+            double recentering_speed, rebalance_leverage, delta_borrow;
+            double pool_x_t = pool_x[t], pool_y_t = pool_y[t];
+            const double *trade_params;
+            double target = params[P_TARGET_LEVERAGE];
+
+            if (emergency_rebal_allowed) {
+                trade_params = &params[P_MAX_TRADE_EMERGENCY];
+                recentering_speed = params[P_SPEED_EMERGENCY];
+
+                out[O_EMERGENCY_REBALANCES][t] = 1;
+            } else {
+                trade_params = &params[P_MAX_TRADE_PERIODIC];
+                recentering_speed = params[P_SPEED_PERIODIC];
+
+                out[O_PERIODIC_REBALANCES][t] = 1;
+                last_rebalanced = t;
+            }
+
+            /* core.calc_rebal_lev */
+            if (leverage[t] > target) {
+                rebalance_leverage = py_max(target, leverage[t] - recentering_speed);
+            } else {
+                rebalance_leverage = py_min(target, leverage[t] + recentering_speed);
+            }
+
+            delta_borrow = rebalance_leverage * (current_value - borrowed[t])
+                           - current_value;
+
+            if (cascade && (impact_x || impact_y)) {
+                double decay = pow(params[P_IMPACT_DECAY], (double)(t - impact_time));
+
+                pool_x_t += impact_x * decay;
+
+                pool_y_t += impact_y * decay;
+            }
+
+            target_rebalance_amount[t] = n_tokens[t] * delta_borrow;
+
+            if (execute_trades(target_rebalance_amount[t], trade_params[0],
+                               trade_params[1], trade_params[2],
+                               params[P_ARB_EFFECTIVENESS], params[P_ARB_TIME],
+                               pool_x_t, pool_y_t, swap_fee[t], trade) != OK) {
+                return UNSUPPORTED;
+            }
+
+            rebalance_amount[t] = trade[0];
+            offered_amount[t] = trade[1];
+            out[O_SWAP_FEES][t] = trade[2];
+            out[O_SWAP_SPREAD][t] = trade[3];
+            out[O_MAX_SWAP_PERC_SPREAD][t] = trade[4];
+        }
+
+        if (target_rebalance_amount[t] > 0) {
+            delta_debt = offered_amount[t] / n_tokens[t];
+
+            delta_underlying = rebalance_amount[t] / n_tokens[t] / price[t];
+        } else {
+            delta_debt = rebalance_amount[t] / n_tokens[t];
+
+            delta_underlying = offered_amount[t] / n_tokens[t] / price[t];
+        }
+
+        borrowed[t] += delta_debt;
+
+        debt += delta_debt;
+
+        n_underlying[t] += delta_underlying;
+
+        underlying += delta_underlying;
+
+        /* hourly debt interest accrual */
+        interest = hourly_rate[t] * borrowed[t];
+
+        borrowed[t] += interest;
+
+        debt += interest;
+
+        t += 1;
+    }
+
+    float_state[F_UNDERLYING] = underlying;
+    float_state[F_DEBT] = debt;
+    float_state[F_IMPACT_X] = impact_x;
+    float_state[F_IMPACT_Y] = impact_y;
+    int_state[I_LAST_REBALANCED] = last_rebalanced;
+    int_state[I_EXCEEDANCE] = exceedance;
+    int_state[I_IMPACT_TIME] = impact_time;
+
+    return OK;
+}
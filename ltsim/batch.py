@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import hash_inputs
+from .core import simulate_leveraged_token
+from .inputs import ModelInputs
+from .optimize import summary_metrics
+from .parallel import SharedModelData, attach, model_args, window_args
+
+class BatchStore:
+    """
+    Append-only store of batch results on disk, which can be reopened to
+    resume an interrupted batch.
+
+    Each result is a row of scalar metrics. Every metric column is stored in
+    its own file of float64 values, and a manifest (one JSON line per row)
+    records which task each row belongs to. Columns are written before the
+    manifest line, so a row only counts as complete once its manifest line
+    is written. Partly written rows left by an interrupted run are truncated
+    when the store is reopened.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to store results in. Created if it does not exist.
+    sync : bool
+        Whether to fsync after each row, so completed rows survive a system
+        crash as well as the process dying.
+    """
+
+    def __init__(self, directory, sync=True):
+        self.directory = directory
+        self.sync = sync
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.columns = None
+
+        schema_path = os.path.join(directory, 'schema.json')
+
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                self.columns = json.load(f)
+
+        self.tasks = self._recover()
+
+        self._files = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _column_path(self, column):
+        return self._path(f'{column}.f8')
+
+    def _recover(self):
+        """
+        Reads the manifest, dropping any torn last line, and truncates column
+        files to the number of complete rows.
+        """
+        tasks = []
+
+        valid_bytes = 0
+
+        path = self._path('manifest.jsonl')
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        tasks.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_bytes += len(line)
+
+            os.truncate(path, valid_bytes)
+
+        for column in self.columns or ():
+            column_path = self._column_path(column)
+            if os.path.exists(column_path):
+                os.truncate(column_path, min(os.path.getsize(column_path),
+                                             8 * len(tasks)))
+
+        return tasks
+
+    @property
+    def done(self):
+        """
+        Set of keys of completed tasks.
+        """
+        return {task['key'] for task in self.tasks}
+
+    def _open(self, metrics):
+        if self.columns is None:
+            self.columns = list(metrics)
+
+            tmp_path = self._path('schema.json.tmp')
+
+            with open(tmp_path, 'w') as f:
+                json.dump(self.columns, f)
+
+            os.replace(tmp_path, self._path('schema.json'))
+
+        elif list(metrics) != self.columns:
+            raise ValueError(f'Result columns {list(metrics)} do not match the '
+                             f'stored columns {self.columns}')
+
+        self._files = [open(self._column_path(column), 'ab')
+                       for column in self.columns]
+
+        self._files.append(open(self._path('manifest.jsonl'), 'ab'))
+
+    def append(self, task, metrics):
+        """
+        Appends a row of metrics for a completed task.
+
+        Parameters
+        ----------
+        task : dict
+            JSON serialisable description of the task, including a unique
+            'key'.
+        metrics : dict
+            Scalar metrics keyed by column name. All rows must have the same
+            columns.
+        """
+        if self._files is None:
+            self._open(metrics)
+
+        *column_files, manifest = self._files
+
+        for column, f in zip(self.columns, column_files):
+            f.write(np.float64(metrics[column]).tobytes())
+
+        # columns must be on disk before the manifest marks the row complete
+        for f in column_files:
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+
+        manifest.write(json.dumps(task).encode() + b'\n')
+
+        manifest.flush()
+
+        if self.sync:
+            os.fsync(manifest.fileno())
+
+        self.tasks.append(task)
+
+    def read(self):
+        """
+        Returns all completed rows as a DataFrame of task details and metrics.
+        """
+        results = pd.DataFrame(self.tasks)
+
+        n_rows = len(self.tasks)
+
+        for column in self.columns or ():
+            results[column] = np.fromfile(self._column_path(column),
+                                          dtype=np.float64, count=n_rows)
+
+        return results
+
+    def close(self):
+        if self._files is not None:
+            for f in self._files:
+                f.close()
+            self._files = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _run_task(arrays, window, model_params, reduce_fn):
+    if window is not None:
+        arrays = tuple(array[slice(*window)] for array in arrays)
+        model_params = window_args(model_params, *window)
+
+    state = simulate_leveraged_token(*arrays, *model_params)
+
+    return reduce_fn(arrays[0], state)
+
+# shared arrays of each path attached by each worker process
+_worker_data = None
+
+def _init_worker(handles, reduce_fn):
+    global _worker_data
+
+    attached = [attach(handle) for handle in handles]
+
+    _worker_data = attached, reduce_fn
+
+def _run_worker_task(item):
+    task, model_params = item
+
+    attached, reduce_fn = _worker_data
+
+    return task, _run_task(attached[task['path']][1], task['window'],
+                           model_params, reduce_fn)
+
+def run_batch(directory, paths, param_sets, windows=None,
+              reduce_fn=summary_metrics, processes=None, chunksize=1):
+    """
+    Runs every combination of parameter set, window and price path, writing
+    each result to a BatchStore as soon as it completes. If the directory
+    already holds results from an interrupted run of the same batch, only
+    the missing tasks are run.
+
+    Tasks are identified by a content hash of the path arrays, window and
+    parameters, so changing any input reruns the affected tasks rather than
+    reusing stale results.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to store results in.
+    paths : list
+        List of ModelInputs or (price, pool_x, pool_y) array tuples, e.g.
+        historical data and Monte Carlo paths.
+    param_sets : list
+        List of dictionaries of leveraged_token_model parameters.
+    windows : list
+        Optional list of (start, stop) timestep ranges to simulate each path
+        over. Defaults to the full paths.
+    reduce_fn : function
+        Picklable function reduce_fn(price, state) returning a dictionary of
+        scalar metrics for a run. Defaults to summary_metrics.
+    processes : int
+        If given, tasks are run across this many worker processes sharing
+        the path arrays. Otherwise tasks are run in turn.
+    chunksize : int
+        Number of tasks sent to a worker at a time.
+
+    Returns
+    -------
+    results : pd.DataFrame
+        Task details (key, param_set, path, window) and metrics of all
+        completed tasks.
+    """
+    paths = [path.arrays if isinstance(path, ModelInputs) else
+             tuple(np.asarray(array, dtype=float) for array in path)
+             for path in paths]
+
+    path_hashes = [hash_inputs(*path) for path in paths]
+
+    arg_sets = [model_args(params) for params in param_sets]
+
+    pending = []
+
+    with BatchStore(directory) as store:
+        done = store.done
+
+        for (i, args), window, path in itertools.product(
+                enumerate(arg_sets), windows or [None], range(len(paths))):
+            window = list(window) if window is not None else None
+            key = hash_inputs(path_hashes[path], window, args)
+            if key not in done:
+                task = {'key': key, 'param_set': i, 'path': path,
+                        'window': window}
+                pending.append((task, args))
+
+        if processes is None:
+            for task, args in pending:
+                store.append(task, _run_task(paths[task['path']], task['window'],
+                                             args, reduce_fn))
+
+        elif pending:
+            shared = [SharedModelData(*path) for path in paths]
+
+            try:
+                with multiprocessing.Pool(
+                        processes, initializer=_init_worker,
+                        initargs=([data.handle for data in shared], reduce_fn)) as pool:
+                    for task, metrics in pool.imap_unordered(_run_worker_task,
+                                                             pending, chunksize):
+                        store.append(task, metrics)
+            finally:
+                for data in shared:
+                    data.close()
+
+        return store.read()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import inspect
+import os
+import tempfile
+
+import numpy as np
+
+from .core import simulate_leveraged_token
+
+# included in every key, increment when model results change for the same
+# inputs so that stale results are not reused.
+cache_version = 2
+
+def _hash_value(h, value):
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update(f'array{value.dtype.str}{value.shape}'.encode())
+        h.update(value.data)
+    elif isinstance(value, (tuple, list)):
+        h.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _hash_value(h, item)
+    elif isinstance(value, dict):
+        h.update(f'dict{len(value)}'.encode())
+        for name in sorted(value):
+            _hash_value(h, name)
+            _hash_value(h, value[name])
+    else:
+        h.update(repr(value).encode())
+
+def hash_inputs(*values):
+    """
+    Content hash of model inputs. Arrays are hashed by their values, other
+    parameters (including pool curves) by their repr.
+    """
+    h = hashlib.sha256()
+
+    _hash_value(h, cache_version)
+
+    for value in values:
+        _hash_value(h, value)
+
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of model results on disk, keyed by a content hash of
+    the price and pool balance arrays and all model parameters.
+
+    Results are stored compressed, one file per entry. When the total size
+    exceeds max_bytes, the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to store cached results in. Created if it does not exist.
+    max_bytes : int
+        Maximum total size of cached results.
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, key):
+        """
+        Returns the cached dictionary of arrays for key, or None.
+        """
+        path = self._path(key)
+
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # modification time tracks recent use for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a dictionary of arrays under key, evicting least recently used
+        entries if the cache exceeds max_bytes.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **result)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def simulate(self, price, pool_x, pool_y, *model_params, **model_kwargs):
+        """
+        Cached version of simulate_leveraged_token. Returns stored results
+        if the same arrays and parameters have been simulated before. As
+        for simulate_leveraged_token, results are stored in the out buffers
+        if given, including stored results.
+        """
+        # key on the full set of arguments, however they were passed
+        arguments = inspect.signature(simulate_leveraged_token).bind(
+            price, pool_x, pool_y, *model_params, **model_kwargs)
+
+        arguments.apply_defaults()
+
+        # trades are only logged by running the model
+        if arguments.arguments['event_log'] is not None:
+            return simulate_leveraged_token(price, pool_x, pool_y,
+                                            *model_params, **model_kwargs)
+
+        key = hash_inputs({name: value for name, value in arguments.arguments.items()
+                           if name != 'out'})
+
+        state = self.get(key)
+
+        if state is None:
+            state = simulate_leveraged_token(price, pool_x, pool_y,
+                                             *model_params, **model_kwargs)
+            self.put(key, state)
+
+        elif arguments.arguments['out'] is not None:
+            out = arguments.arguments['out']
+
+            for name, values in state.items():
+                buffer = out[name][:len(values)]
+
+                buffer[:] = values
+
+                state[name] = buffer
+
+        return state
+
+    def stats(self):
+        """
+        Returns a dictionary of cache statistics. hits, misses and evictions
+        count lookups made through this object, while entries and size_bytes
+        describe the cache directory.
+        """
+        entries = self._entries()
+
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'size_bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes}
+
+    def clear(self):
+        """
+        Removes all cached results.
+        """
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
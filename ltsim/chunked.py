@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+
+from .core import SimState, allocate_buffers, postprocess, simulate_leveraged_token
+from .inputs import _float_array
+from .parallel import model_args, window_args
+
+def open_outputs(directory, names=None):
+    """
+    Returns the outputs of run_chunked stored in directory, as a dictionary
+    of read only memory mapped arrays keyed by output name. names selects
+    the outputs to open, by default every .npy file in directory.
+    """
+    if names is None:
+        names = [name[:-4] for name in sorted(os.listdir(directory))
+                 if name.endswith('.npy')]
+
+    return {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in names}
+
+def _create_npy(path, nt):
+    """
+    Writes the header of a float64 .npy file of nt values, returning the
+    file open for appending the values.
+    """
+    f = open(path, 'wb')
+
+    np.lib.format.write_array_header_1_0(f, {'descr': '<f8',
+                                             'fortran_order': False,
+                                             'shape': (nt,)})
+
+    return f
+
+def run_chunked(price, pool_x, pool_y, model_params, directory,
+                chunk_size=2 ** 16, outputs=None):
+    """
+    Runs the leveraged token model over a long series in chunks, streaming
+    the outputs to disk, so memory use depends on chunk_size rather than
+    the length of the series.
+
+    Inputs are read (and validated) one chunk at a time, so they can be
+    memory mapped, e.g. np.load(path, mmap_mode='r') of .npy files. The
+    model state (see SimState) is carried across chunk boundaries, so the
+    outputs are the same as from a single run.
+
+    Parameters
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    pool_x : np.ndarray
+        UST pool balance at each timestep.
+    pool_y : np.ndarray
+        Token pool balance at each timestep.
+    model_params : dict
+        Dictionary of leveraged_token_model parameters, keyed by name.
+        borrow_rate and swap_fee schedules are read in chunks as well.
+    directory : str
+        Directory to write outputs to, one .npy file per output. Created if
+        it does not exist.
+    chunk_size : int
+        Number of timesteps simulated at a time.
+    outputs : list
+        Names of the outputs to write (see leveraged_token_model). Defaults
+        to all outputs.
+
+    Returns
+    -------
+    results : dict
+        Read only memory mapped arrays of the outputs written, keyed by
+        output name.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    nt = len(price)
+
+    args = model_args(model_params)
+
+    # intermediate arrays reused for every chunk
+    buffers = allocate_buffers(min(chunk_size, nt))
+
+    carry = SimState()
+
+    files = None
+
+    try:
+        for start in range(0, nt, chunk_size):
+            stop = min(nt, start + chunk_size)
+
+            chunk_price = _float_array(price[start:stop], 'price', start)
+
+            chunk_pool_x = _float_array(pool_x[start:stop], 'pool_x', start)
+
+            chunk_pool_y = _float_array(pool_y[start:stop], 'pool_y', start)
+
+            state = simulate_leveraged_token(chunk_price, chunk_pool_x,
+                                             chunk_pool_y,
+                                             *window_args(args, start, stop),
+                                             out=buffers, carry=carry)
+
+            results = postprocess(chunk_price, state,
+                                  model_params['min_leverage'],
+                                  model_params['max_leverage'], buffers, carry)
+
+            if files is None:
+                files = {name: _create_npy(os.path.join(directory, f'{name}.npy'), nt)
+                         for name in outputs or results}
+
+            # outputs are appended with plain writes rather than through a
+            # memory map, so written chunks are not kept resident
+            for name, f in files.items():
+                f.write(np.ascontiguousarray(results[name], dtype=np.float64).tobytes())
+    finally:
+        for f in (files or {}).values():
+            f.close()
+
+    # only the outputs of this run, not other files in the directory
+    return open_outputs(directory, list(files or ()))
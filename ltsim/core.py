@@ -0,0 +1,767 @@
+# -*- coding: utf-8 -*-
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import kernel
+from .pools import CONSTANT_PRODUCT
+from .trade_sim import execute_trades
+
+# arrays stepped through time by simulate_leveraged_token
+state_names = ['n_tokens', 'n_underlying', 'borrowed', 'leverage',
+               'target_rebalance_amount', 'rebalance_amount', 'offered_amount',
+               'swap_fees', 'swap_spread', 'max_swap_perc_spread',
+               'emergency_rebalances', 'periodic_rebalances',
+               'exceedance_time', 'ltv', 'liquidation_amount',
+               'liquidation_volume']
+
+# arrays derived from the model state by postprocess
+output_names = ['leveraged_token_value', 'drawdown_underlying',
+                'drawdown_leveraged', 'underlying_value_per_lt',
+                'total_underlying_value', 'total_debt', 'hourly_return',
+                'hourly_return_perc', 'cummulative_return',
+                'cummulative_return_perc', 'rebalance_shortfall',
+                'total_liquidation_amount', 'min_leverage_arr',
+                'max_leverage_arr']
+
+def allocate_buffers(nt):
+    """
+    Allocates arrays for all model state and output variables, which can be
+    passed as the out argument of simulate_leveraged_token and postprocess
+    (or the buffers argument of leveraged_token_model) to reuse memory
+    across runs. Runs over fewer than nt timesteps use the start of each
+    array.
+
+    Results returned by a run (including the DataFrame of
+    leveraged_token_model) are views of the buffers, and are overwritten
+    by the next run using them.
+    """
+    return {name: np.empty(nt) for name in state_names + output_names}
+
+def _zeros(out, name, nt):
+    if out is None:
+        return np.zeros(nt)
+
+    buffer = out[name][:nt]
+
+    buffer.fill(0)
+
+    return buffer
+
+def _empty(out, name, nt):
+    if out is None:
+        return np.empty(nt)
+
+    return out[name][:nt]
+
+def calc_drawdown(data, out=None, running_max=None):
+    """
+    Running drawdown of data, relative to its highest previous value.
+    running_max optionally gives the highest value before the start of data,
+    e.g. from a previous chunk of a series.
+    """
+    data = np.asarray(data, dtype=float)
+
+    # running maximum, ignoring missing values
+    out = np.fmax.accumulate(data, out=out)
+
+    if running_max is not None:
+        np.fmax(out, running_max, out=out)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(data, out, out=out)
+
+    out -= 1
+
+    return out
+
+def calc_rebal_lev(leverage, target_leverage, recentering_speed):
+
+    if leverage > target_leverage:
+        rebalance_leverage = max(target_leverage, leverage - recentering_speed)
+    else:
+        rebalance_leverage = min(target_leverage, leverage + recentering_speed)
+
+    return rebalance_leverage
+
+def is_periodic_rebal_allowed(t, last_rebalanced, rebalance_interval):
+    return t >= last_rebalanced + rebalance_interval
+
+@dataclass
+class SimState:
+    """
+    Model state carried from the end of one chunk of a price series to the
+    start of the next, so a long series can be simulated (and post
+    processed) in chunks with the same results as in a single run.
+
+    Pass the same SimState as the carry argument of simulate_leveraged_token
+    and postprocess for each chunk in turn, starting from SimState(). Each
+    call updates it to the end of its chunk.
+
+    Attributes
+    ----------
+    underlying, debt : float
+        Underlying tokens and debt per leveraged token carried into the
+        next timestep.
+    last_rebalanced : int
+        Timestep of the last periodic rebalance, relative to the start of
+        the next chunk.
+    exceedance : float
+        Duration leverage bounds have been exceeded for.
+    impact_x, impact_y : float
+        Change in pool balances from liquidations as of impact_time,
+        relative to the start of the next chunk.
+    price_max, value_max : float
+        Highest underlying price and leveraged token value so far.
+    initial_value, last_value : float
+        First and most recent leveraged token value.
+    """
+    underlying: float = None
+    debt: float = None
+    last_rebalanced: int = 0
+    exceedance: float = 0
+    impact_x: float = 0
+    impact_y: float = 0
+    impact_time: int = 0
+    price_max: float = None
+    value_max: float = None
+    initial_value: float = None
+    last_value: float = None
+
+def _running_max(values, previous=None):
+    # highest value ignoring missing values, including any previous maximum
+    return np.fmax.reduce(values, initial=np.nan if previous is None else previous)
+
+def _schedule(values, nt, name):
+    """
+    Broadcasts a scalar or per timestep parameter to an array of nt values.
+    """
+    values = np.asarray(values, dtype=float)
+
+    if values.ndim > 0 and values.shape != (nt,):
+        raise ValueError(f'{name} must be a scalar or have one value per '
+                         f'timestep ({nt}), not shape {values.shape}')
+
+    return np.broadcast_to(values, (nt,))
+
+# minimum number of timesteps before the next periodic rebalance for
+# simulate_leveraged_token to try stepping through them in a single pass
+_min_quiet_steps = 8
+
+def _accrue_quiet(t, stop, underlying, debt, price, growth, min_leverage,
+                  max_leverage, liq_thresh, n_underlying, borrowed, leverage,
+                  ltv):
+    """
+    Steps through timesteps from t (up to stop) until liquidation or an
+    emergency rebalance could be triggered, with the position only changing
+    by interest accrued. Timesteps are checked in windows of increasing
+    size, with debt at each timestep from the compounded interest growth.
+
+    Returns the first timestep that must be stepped through individually,
+    and the debt at the start of it.
+    """
+    size = 16
+
+    while t < stop:
+        end = min(stop, t + size)
+
+        # debt at the start of each timestep
+        debt_start = debt * (growth[t:end] / growth[t])
+
+        value = underlying * price[t:end]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            window_ltv = np.where(debt_start > 0, debt_start / value, np.nan)
+
+            window_leverage = value / (value - debt_start)
+
+        quiet = ~(window_ltv >= liq_thresh / 100)
+
+        quiet &= ~((window_leverage < min_leverage)
+                   | (window_leverage > max_leverage))
+
+        n_quiet = end - t if quiet.all() else int(quiet.argmin())
+
+        stop_quiet = t + n_quiet
+
+        n_underlying[t:stop_quiet] = underlying
+
+        borrowed[t:stop_quiet] = debt * (growth[t + 1:stop_quiet + 1] / growth[t])
+
+        leverage[t:stop_quiet] = window_leverage[:n_quiet]
+
+        ltv[t:stop_quiet] = window_ltv[:n_quiet]
+
+        debt = debt * (growth[stop_quiet] / growth[t])
+
+        if stop_quiet < end:
+            return stop_quiet, debt
+
+        t = stop_quiet
+
+        size *= 2
+
+    return t, debt
+
+def simulate_leveraged_token(price, pool_x, pool_y,
+                             target_leverage, min_leverage,
+                             max_leverage, congestion_time,
+                             rebalance_interval, recentering_speed_periodic,
+                             recentering_speed_emergency,
+                             trade_params_periodic, trade_params_emergency,
+                             borrow_rate, liq_thresh, liq_premium,
+                             n_tokens_issued, swap_fee, arb_params,
+                             pool_curve=CONSTANT_PRODUCT, optimal_split=False,
+                             liquidation_cascade=False, event_log=None,
+                             out=None, carry=None):
+    """
+    Numeric core of leveraged_token_model. Steps the leveraged token position
+    through each timestep of the price and pool balance arrays, applying
+    liquidation and rebalancing rules.
+
+    Only depends on numpy, see leveraged_token_model for a description of
+    the parameters. Runs with a constant product pool, without optimal
+    splits or an event log, use the compiled kernel of ltsim.kernel if it
+    can be built (with identical results).
+
+    Parameters
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    pool_x : np.ndarray
+        UST pool balance at each timestep.
+    pool_y : np.ndarray
+        Token pool balance at each timestep.
+    event_log : TradeLog
+        Optional log to record every rebalancing and liquidation trade in.
+    out : dict
+        Optional buffers (see allocate_buffers) to store the model state in,
+        instead of allocating new arrays.
+    carry : SimState
+        Optional state carried from the previous chunk of the series. It is
+        updated to the state at the end of this chunk.
+
+    Returns
+    -------
+    state : dict
+        Dictionary of arrays for each model variable at each timestep.
+
+    """
+    nt = len(price)
+
+    # total (net) number of leveraged tokens issued over time
+    # equal to expected cummulative (subscriptions - redemptions)
+    n_tokens = _zeros(out, 'n_tokens', nt)
+
+    n_tokens += n_tokens_issued
+
+    # number of underlying tokens per leveraged token
+    n_underlying = _zeros(out, 'n_underlying', nt)
+
+    # amount borrowed ($) per leveraged token
+    borrowed = _zeros(out, 'borrowed', nt)
+
+    # actual leverage ratio per leveraged token
+    leverage = _zeros(out, 'leverage', nt)
+
+    # target rebalance amount ($) for all issued leveraged tokens
+    target_rebalance_amount = _zeros(out, 'target_rebalance_amount', nt)
+
+    # amount received for sucessful rebalancing trades ($),
+    # for all issued leveraged tokens
+    rebalance_amount = _zeros(out, 'rebalance_amount', nt)
+    
+    # amount offered for sucessful rebalancing trades ($),
+    # for all issued leveraged tokens
+    offered_amount = _zeros(out, 'offered_amount', nt)
+
+    # swap fees paid ($) for all issued leveraged tokens
+    swap_fees = _zeros(out, 'swap_fees', nt)
+
+    # spread value ($) for all issued leveraged tokens
+    swap_spread = _zeros(out, 'swap_spread', nt)
+
+    # highest percentage spread (%) at each timestep
+    max_swap_perc_spread = _zeros(out, 'max_swap_perc_spread', nt)
+
+    # boolean variable tracking if emergency rebalance was executed
+    emergency_rebalances = _zeros(out, 'emergency_rebalances', nt)
+
+    # boolean variable tracking if periodic rebalance was executed
+    periodic_rebalances = _zeros(out, 'periodic_rebalances', nt)
+
+    # cummulative duration of time where leverage remains out of bounds
+    exceedance_time = _zeros(out, 'exceedance_time', nt)
+
+    # loan to value ratio
+    ltv = _zeros(out, 'ltv', nt)
+
+    # amount liquidated
+    liquidation_amount = _zeros(out, 'liquidation_amount', nt)
+
+    # value of collateral sold into the pool by liquidators ($)
+    liquidation_volume = _zeros(out, 'liquidation_volume', nt)
+
+    # interest rate (per timestep) and swap fee at each timestep
+    hourly_rate = _schedule(borrow_rate, nt, 'borrow_rate') / 100 / 365 / 24
+
+    swap_fee = _schedule(swap_fee, nt, 'swap_fee')
+
+    # interest growth compounded from the first timestep to the start of
+    # each timestep
+    growth = np.ones(nt + 1)
+
+    np.cumprod(1 + hourly_rate, out=growth[1:])
+
+    # position carried into the next timestep. Changes at a timestep apply
+    # to all later timesteps, except a total liquidation which only zeroes
+    # the position at its own timestep (unless liquidation_cascade, where
+    # the seized position is gone).
+    if carry is None or carry.underlying is None:
+        underlying = target_leverage
+
+        debt = price[0] * (target_leverage - 1)
+    else:
+        underlying, debt = carry.underlying, carry.debt
+
+    last_rebalanced = carry.last_rebalanced if carry is not None else 0
+
+    # duration leverage bounds have been exceeded for, up to the previous
+    # timestep
+    exceedance = carry.exceedance if carry is not None else 0
+
+    # change in pool balances from liquidations, as of timestep impact_time.
+    # Arbitrage removes a share of the remaining impact each hour.
+    if carry is not None:
+        impact_x, impact_y, impact_time = (carry.impact_x, carry.impact_y,
+                                           carry.impact_time)
+    else:
+        impact_x = impact_y = impact_time = 0
+
+    if liquidation_cascade:
+        arb_effectiveness, arb_time = arb_params
+
+        # share of the impact remaining after each hour (arbitrage is
+        # instant if arb_time is 0)
+        impact_decay = 1 - (min(1, 60 * 60 / arb_time) if arb_time > 0 else 1) \
+            * arb_effectiveness / 100
+    else:
+        impact_decay = 0
+
+    t = 0
+
+    # the compiled kernel steps through all timesteps without holding the
+    # GIL where it supports the inputs, otherwise the loop below does
+    if kernel.supports(pool_curve, optimal_split, event_log):
+        position = kernel.simulate(
+            price, pool_x, pool_y, n_tokens,
+            [n_underlying, borrowed, leverage, target_rebalance_amount,
+             rebalance_amount, offered_amount, swap_fees, swap_spread,
+             max_swap_perc_spread, emergency_rebalances, periodic_rebalances,
+             exceedance_time, ltv, liquidation_amount, liquidation_volume],
+            hourly_rate, growth, swap_fee,
+            (target_leverage, min_leverage, max_leverage, congestion_time,
+             rebalance_interval, recentering_speed_periodic,
+             recentering_speed_emergency, trade_params_periodic,
+             trade_params_emergency, liq_thresh, liq_premium,
+             n_tokens_issued, arb_params, impact_decay, liquidation_cascade),
+            (underlying, debt, last_rebalanced, exceedance, impact_x,
+             impact_y, impact_time))
+
+        if position is not None:
+            underlying, debt, last_rebalanced, exceedance, impact_x, \
+                impact_y, impact_time = position
+
+            t = nt
+
+    while t < nt:
+
+        # step through timesteps where no liquidation or rebalance can occur
+        # in a single pass, only accruing interest
+        if (last_rebalanced + rebalance_interval - t >= _min_quiet_steps
+                and exceedance == 0 and underlying > 0
+                and n_tokens_issued != 0):
+            # no periodic rebalance is due if the interval is infinite
+            next_periodic = last_rebalanced + rebalance_interval
+
+            if math.isfinite(next_periodic):
+                next_periodic = min(nt, math.ceil(next_periodic))
+            else:
+                next_periodic = nt
+
+            t, debt = _accrue_quiet(t, next_periodic, underlying, debt, price,
+                                    growth, min_leverage, max_leverage,
+                                    liq_thresh, n_underlying, borrowed,
+                                    leverage, ltv)
+            if t == nt:
+                break
+
+        n_underlying[t] = underlying
+
+        borrowed[t] = debt
+
+        if borrowed[t] > 0:
+            ltv[t] = borrowed[t] / (n_underlying[t] * price[t])
+        else:
+            ltv[t] = np.nan
+
+        # liquidation logic
+        if ltv[t] >= liq_thresh / 100:
+
+            # balance before liquidation
+            collateral_before = n_underlying[t] * price[t] - borrowed[t]
+
+            # premium amount claimed by liquidators
+            liquidation_amount[t] = collateral_before * liq_premium / 100
+
+            # remaining balance after liquidation
+            collateral_after = collateral_before - liquidation_amount[t]
+
+            if liquidation_cascade:
+                # liquidators sell the collateral repaying the debt and
+                # premium into the pool, which moves the pool balances.
+                # Trades are accepted while slippage is within the premium.
+                seized = min(n_underlying[t] * price[t],
+                             borrowed[t] + max(liquidation_amount[t], 0))
+
+                decay = impact_decay ** (t - impact_time)
+
+                pool_x_t = pool_x[t] + impact_x * decay
+
+                pool_y_t = pool_y[t] + impact_y * decay
+
+                max_trade, _, trade_delay = trade_params_emergency
+
+                if event_log is not None:
+                    event_log.hour, event_log.kind = t, 'liquidation'
+
+                trade = execute_trades(-n_tokens[t] * seized,
+                                       max_trade,
+                                       liq_premium,
+                                       trade_delay,
+                                       *arb_params,
+                                       {'pool_x_i': pool_x_t, 'pool_y_i': pool_y_t},
+                                       swap_fee[t],
+                                       pool_curve,
+                                       optimal_split,
+                                       event_log)
+
+                liquidation_volume[t] = -trade[1]
+
+                # tokens offered enter the pool and UST received leaves it
+                # (fees remain in the pool)
+                impact_x = impact_x * decay + trade[0]
+
+                impact_y = (impact_y * decay + liquidation_volume[t]
+                            / pool_curve.spot_price(pool_x_t, pool_y_t))
+
+                impact_time = t
+
+            if collateral_after <= 0:
+                # all issued leveraged tokens are now worth 0 and removed
+                n_underlying[t] = 0
+                borrowed[t] = 0
+
+                if liquidation_cascade:
+                    # the collateral has been seized and sold, so the
+                    # position is not liquidated (and sold) again
+                    underlying = debt = 0
+            else:
+                # % of position value is liquidated and lost.
+                # remaining is used to reconstruct tokens based on target leverage
+                n_underlying[t] = underlying = collateral_after / price[t]
+                borrowed[t] = debt = 0
+
+        current_value = n_underlying[t] * price[t]
+
+        leverage[t] = current_value / (current_value - borrowed[t])
+
+        outside_lev_range = (leverage[t] < min_leverage) | (leverage[t] > max_leverage)
+
+        # Continuous duration that leverage bounds are exceeded for
+        if outside_lev_range:
+            exceedance += 1
+        else:
+            exceedance = 0
+
+        exceedance_time[t] = exceedance
+
+        emergency_rebal_allowed = (outside_lev_range
+                                   & (exceedance_time[t] >= congestion_time))
+
+        periodic_rebal_allowed = is_periodic_rebal_allowed(t, last_rebalanced,
+                                                           rebalance_interval)
+
+        rebal_allowed = ((leverage[t] != target_leverage)
+                         and (n_tokens[t] > 0)
+                         and (n_underlying[t] > 1e-3)
+                         and (emergency_rebal_allowed or periodic_rebal_allowed))
+
+        if rebal_allowed:
+            if emergency_rebal_allowed:
+                trade_params = trade_params_emergency
+                recentering_speed = recentering_speed_emergency
+                kind = 'emergency'
+
+                emergency_rebalances[t] = 1
+            elif periodic_rebal_allowed:
+                trade_params = trade_params_periodic
+                recentering_speed = recentering_speed_periodic
+                kind = 'periodic'
+
+                periodic_rebalances[t] = 1
+                last_rebalanced = t
+
+            # leverage target for rebalancing
+            rebalance_leverage = calc_rebal_lev(leverage[t], target_leverage,
+                                                recentering_speed)
+
+            # required change in borrowing for rebalancing
+            delta_borrow = (rebalance_leverage * (current_value - borrowed[t])
+                            - current_value)
+
+            pool_liquidity = {'pool_x_i': pool_x[t], 'pool_y_i': pool_y[t]}
+
+            if liquidation_cascade and (impact_x or impact_y):
+                decay = impact_decay ** (t - impact_time)
+
+                pool_liquidity['pool_x_i'] += impact_x * decay
+
+                pool_liquidity['pool_y_i'] += impact_y * decay
+
+            target_rebalance_amount[t] = n_tokens[t] * delta_borrow
+
+            if event_log is not None:
+                event_log.hour, event_log.kind = t, kind
+
+            trade = execute_trades(target_rebalance_amount[t],
+                                   *trade_params,
+                                   *arb_params,
+                                   pool_liquidity,
+                                   swap_fee[t],
+                                   pool_curve,
+                                   optimal_split,
+                                   event_log)
+
+            rebalance_amount[t] = trade[0]
+            
+            offered_amount[t] = trade[1]
+
+            swap_fees[t] = trade[2]
+
+            swap_spread[t] = trade[3]
+
+            max_swap_perc_spread[t] = trade[4]
+
+        if target_rebalance_amount[t] > 0:
+            # Debt increased by the amount offered for successful trades.
+            # Borrowed UST is swapped for tokens (amount received is lower
+            # due to fees + spread).
+            delta_debt = offered_amount[t] / n_tokens[t]
+
+            delta_underlying = rebalance_amount[t] / n_tokens[t] / price[t]
+
+        else:
+            # Underlying tokens are swapped for UST and used to decrease debt.
+            delta_debt = rebalance_amount[t] / n_tokens[t]
+
+            delta_underlying = offered_amount[t] / n_tokens[t] / price[t]
+
+        borrowed[t] += delta_debt
+
+        debt += delta_debt
+
+        n_underlying[t] += delta_underlying
+
+        underlying += delta_underlying
+
+        # Hourly debt interest accural
+        interest = hourly_rate[t] * borrowed[t]
+
+        borrowed[t] += interest
+
+        debt += interest
+
+        t += 1
+
+    if carry is not None:
+        carry.underlying, carry.debt = underlying, debt
+        carry.last_rebalanced = last_rebalanced - nt
+        carry.exceedance = exceedance
+        carry.impact_x, carry.impact_y = impact_x, impact_y
+        carry.impact_time = impact_time - nt
+
+    return {'n_tokens': n_tokens,
+            'n_underlying': n_underlying,
+            'borrowed': borrowed,
+            'leverage': leverage,
+            'target_rebalance_amount': target_rebalance_amount,
+            'rebalance_amount': rebalance_amount,
+            'offered_amount': offered_amount,
+            'swap_fees': swap_fees,
+            'swap_spread': swap_spread,
+            'max_swap_perc_spread': max_swap_perc_spread,
+            'emergency_rebalances': emergency_rebalances,
+            'periodic_rebalances': periodic_rebalances,
+            'exceedance_time': exceedance_time,
+            'ltv': ltv,
+            'liquidation_amount': liquidation_amount,
+            'liquidation_volume': liquidation_volume}
+
+def postprocess(price, state, min_leverage, max_leverage, out=None,
+                carry=None):
+    """
+    Computes the model outputs (token value, drawdowns, returns, totals)
+    from the model state returned by simulate_leveraged_token.
+
+    Parameters
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    state : dict
+        Model state arrays from simulate_leveraged_token.
+    min_leverage : float
+        Minimum allowable leverage before emergency rebalance is triggered.
+    max_leverage : float
+        Maximum allowable leverage before emergency rebalance is triggered.
+    out : dict
+        Optional buffers (see allocate_buffers) to store the outputs in,
+        instead of allocating new arrays.
+    carry : SimState
+        Optional state carried from the previous chunk of the series, for
+        drawdowns and returns relative to earlier values. It is updated to
+        the end of this chunk.
+
+    Returns
+    -------
+    results : dict
+        Dictionary of output arrays, keyed by leveraged_token_model output
+        names.
+    """
+    nt = len(price)
+
+    n_tokens = state['n_tokens']
+
+    n_underlying = state['n_underlying']
+
+    borrowed = state['borrowed']
+
+    # value of underlying tokens per leveraged token
+    underlying_value = np.multiply(n_underlying, price,
+                                   out=_empty(out, 'underlying_value_per_lt', nt))
+
+    # hourly value of the leveraged token
+    lt_value = np.subtract(underlying_value, borrowed,
+                           out=_empty(out, 'leveraged_token_value', nt))
+
+    # values carried from previous chunks
+    previous = carry if carry is not None else SimState()
+
+    # running drawdown for underlying token price
+    drawdown_underlying = calc_drawdown(price, _empty(out, 'drawdown_underlying', nt),
+                                        previous.price_max)
+
+    # running drawdown for leveraged token value
+    drawdown_lt = calc_drawdown(lt_value, _empty(out, 'drawdown_leveraged', nt),
+                                previous.value_max)
+
+    total_underlying_value = np.multiply(n_tokens, n_underlying,
+                                         out=_empty(out, 'total_underlying_value', nt))
+
+    total_underlying_value *= price
+
+    total_debt = np.multiply(n_tokens, borrowed, out=_empty(out, 'total_debt', nt))
+
+    # hour on hour change in leveraged token value
+    hourly_return = _zeros(out, 'hourly_return', nt)
+
+    # percentage hourly return
+    hourly_return_perc = _zeros(out, 'hourly_return_perc', nt)
+
+    # cummulative change in leveraged token value
+    cummulative_return = _zeros(out, 'cummulative_return', nt)
+
+    # percentage cummulative change
+    cummulative_return_perc = _zeros(out, 'cummulative_return_perc', nt)
+
+    # returns at the first timestep are zero, unless continuing from a
+    # previous chunk
+    if previous.last_value is None:
+        start, previous_value = 1, lt_value[:-1]
+    else:
+        start, previous_value = 0, np.concatenate([[previous.last_value],
+                                                   lt_value[:-1]])
+
+    if previous.initial_value is None:
+        initial_value = lt_value[0]
+    else:
+        initial_value = previous.initial_value
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.subtract(lt_value[start:], previous_value, out=hourly_return[start:])
+
+        np.divide(hourly_return[start:], previous_value,
+                  out=hourly_return_perc[start:])
+
+        np.subtract(lt_value[start:], initial_value,
+                    out=cummulative_return[start:])
+
+        np.divide(cummulative_return[start:], initial_value,
+                  out=cummulative_return_perc[start:])
+
+    if carry is not None and nt:
+        carry.price_max = _running_max(price, carry.price_max)
+        carry.value_max = _running_max(lt_value, carry.value_max)
+        carry.initial_value = initial_value
+        carry.last_value = lt_value[-1]
+
+    # |target| - (|received| + fees + spread)
+    rebalance_shortfall = np.abs(state['rebalance_amount'],
+                                 out=_empty(out, 'rebalance_shortfall', nt))
+
+    rebalance_shortfall += state['swap_fees']
+
+    rebalance_shortfall += state['swap_spread']
+
+    np.subtract(np.abs(state['target_rebalance_amount']), rebalance_shortfall,
+                out=rebalance_shortfall)
+
+    liquidation_amount = np.multiply(n_tokens, state['liquidation_amount'],
+                                     out=_empty(out, 'total_liquidation_amount', nt))
+
+    min_leverage_arr = _empty(out, 'min_leverage_arr', nt)
+
+    min_leverage_arr.fill(min_leverage)
+
+    max_leverage_arr = _empty(out, 'max_leverage_arr', nt)
+
+    max_leverage_arr.fill(max_leverage)
+
+    return {'leveraged_token_value': lt_value,
+            'drawdown_underlying': drawdown_underlying,
+            'drawdown_leveraged': drawdown_lt,
+            'n_tokens_per_lt': n_underlying,
+            'underlying_value_per_lt': underlying_value,
+            'debt_per_lt': borrowed,
+            'leverage': state['leverage'],
+            'total_underlying_value': total_underlying_value,
+            'total_debt': total_debt,
+            'hourly_return': hourly_return,
+            'hourly_return_perc': hourly_return_perc,
+            'cummulative_return': cummulative_return,
+            'cummulative_return_perc': cummulative_return_perc,
+            'target_rebalance_amount': state['target_rebalance_amount'],
+            'rebalance_amount': state['rebalance_amount'],
+            'offered_amount': state['offered_amount'],
+            'swap_fees': state['swap_fees'],
+            'swap_spread': state['swap_spread'],
+            'max_swap_perc_spread': state['max_swap_perc_spread'],
+            'rebalance_shortfall': rebalance_shortfall,
+            'loan_to_value_ratio': state['ltv'],
+            'liquidation_amount': liquidation_amount,
+            'liquidation_volume': state['liquidation_volume'],
+            'emergency_rebalance': state['emergency_rebalances'],
+            'periodic_rebalance': state['periodic_rebalances'],
+            'min_leverage_arr': min_leverage_arr,
+            'max_leverage_arr': max_leverage_arr}
@@ -1,25 +1,38 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import datetime
 import os
 import pathlib
 import pandas as pd
 
-import ssl
+from .fetch import DataClient, FetchError, run_sync
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
 data_dir = os.path.join(dir_path, 'data')
 
-pathlib.Path(data_dir).mkdir(parents=True, exist_ok=True)
-
 token_pools = {'LUNA': 'LUNA-UST',
                'MIR': 'MIR-UST',
                'ANC': 'ANC-UST'}
-    
-def read_data_from_api(api_url, data_file='data', proccess_fn=None):
+
+prices_url = ('https://api.flipsidecrypto.com/api/v2/queries/'
+              '2aca3d2a-fe73-4726-90f1-26e89076617e/data/latest')
+
+liquidity_url = ('https://api.flipsidecrypto.com/api/v2/queries/'
+                 'd4dcdfbe-f25c-4617-a572-e914f1aa21e5/data/latest')
+
+# columns (and their types) decoded from each API response
+prices_schema = {'DATE': 'datetime', 'SYMBOL': 'str', 'PRICE': 'float'}
+
+liquidity_schema = {'DATE': 'datetime', 'CURRENCY': 'str', 'POOL_NAME': 'str',
+                    'BALANCE': 'float'}
+
+async def _read_data_from_api(api_url, data_file, proccess_fn, schema, client):
 
     today = datetime.datetime.utcnow().strftime('%m-%d')
 
+    pathlib.Path(data_dir).mkdir(parents=True, exist_ok=True)
+
     files = os.listdir(data_dir)
 
     exisiting_files = [file for file in files if data_file in file]
@@ -29,26 +42,73 @@ def read_data_from_api(api_url, data_file='data', proccess_fn=None):
     else:
         data_existing = None
 
+    if f'{data_file}_{today}.csv' in files:
+        return pd.read_csv(os.path.join(data_dir, f'{data_file}_{today}.csv'))
+
     try:
-        if f'{data_file}_{today}.csv' in files:
-            data = pd.read_csv(os.path.join(data_dir, f'{data_file}_{today}.csv'))
-        else:
-            data = pd.read_json(api_url)
-            if proccess_fn is not None:
-                data = proccess_fn(data)
-            data.to_csv(os.path.join(data_dir, f'{data_file}_{today}.csv'))
-            # delete existing data
-            if data_existing is not None:
-                if os.path.exists(os.path.join(data_dir, data_existing)):
-                    os.remove(os.path.join(data_dir, data_existing))
-            # TODO: add in another case to just read in a non dated file?
-           
-    except:
+        data = await client.fetch_frame(api_url, schema)
+    except FetchError as e:
         # could not access API - revert to last save.
-        data = pd.read_csv(os.path.join(data_dir, data_existing))
+        if data_existing is None:
+            raise FetchError(f'Could not read {data_file} from API and no '
+                             'previously saved data exists') from e
+
+        return pd.read_csv(os.path.join(data_dir, data_existing))
+
+    if proccess_fn is not None:
+        data = proccess_fn(data)
+
+    data.to_csv(os.path.join(data_dir, f'{data_file}_{today}.csv'))
+
+    # delete existing data
+    if data_existing is not None:
+        if os.path.exists(os.path.join(data_dir, data_existing)):
+            os.remove(os.path.join(data_dir, data_existing))
 
     return data
 
+async def _read_with_client(client, *readers):
+    """
+    Runs each reader coroutine function concurrently with a shared client.
+    A client is created (and closed) if one is not provided.
+    """
+    own_client = client is None
+
+    if own_client:
+        client = DataClient()
+
+    try:
+        return await asyncio.gather(*[reader(client) for reader in readers])
+    finally:
+        if own_client:
+            client.close()
+
+def read_data_from_api(api_url, data_file='data', proccess_fn=None, schema=None,
+                       client=None):
+    """
+    Reads a JSON dataset from an API endpoint, saving a copy each day. Falls
+    back to the last saved copy if the API can not be accessed.
+
+    Parameters
+    ----------
+    api_url : str
+        URL of the endpoint returning a JSON array of records.
+    data_file : str
+        Name used for saved copies of the data.
+    proccess_fn : function
+        Optional function applied to the data before saving.
+    schema : dict
+        Optional mapping of column names to types ('datetime', 'float' or
+        'str'). Only these columns are decoded.
+    client : DataClient
+        Client used for downloads. Defaults to a new DataClient.
+    """
+    async def reader(client):
+        return await _read_data_from_api(api_url, data_file, proccess_fn,
+                                         schema, client)
+
+    return run_sync(_read_with_client(client, reader))[0]
+
 def process_price_data(price_data):
     
     tokens = list(price_data['SYMBOL'].unique())
@@ -77,22 +137,22 @@ def process_price_data(price_data):
     
     return price_data
 
-def read_prices_from_api():
-    """
-    Reads daily token price data from a Flipside Crypto API endpoint.
-    """
-    
-    ssl._create_default_https_context = ssl._create_unverified_context
-    
-    url = ('https://api.flipsidecrypto.com/api/v2/queries/'
-           '2aca3d2a-fe73-4726-90f1-26e89076617e/data/latest')
-    
-    price_data = read_data_from_api(url, 'token_prices', process_price_data)
+async def _read_prices(client):
+
+    price_data = await _read_data_from_api(prices_url, 'token_prices',
+                                           process_price_data, prices_schema,
+                                           client)
 
     price_data['DATE'] = pd.to_datetime(price_data['DATE'], utc=True)
 
     return price_data[['DATE','SYMBOL','PRICE']]
 
+def read_prices_from_api(client=None):
+    """
+    Reads daily token price data from a Flipside Crypto API endpoint.
+    """
+    return run_sync(_read_with_client(client, _read_prices))[0]
+
 def get_token_prices(price_data, token, min_date=None, max_date=None):
     """
     Gets hourly price data for the specified token. Optionally filters
@@ -153,23 +213,23 @@ def process_liquididty_data(pool_data):
     
     return pool_data
 
-def read_liquidity_from_api():
-    """
-    Reads in daily token balances from a Flipside endpoint and converts
-    to hourly data (assuming constant balance within each day).
-    """
-    ssl._create_default_https_context = ssl._create_unverified_context
-    
-    url = ('https://api.flipsidecrypto.com/api/v2/queries/'
-           'd4dcdfbe-f25c-4617-a572-e914f1aa21e5/data/latest')
-    
-    pool_data = read_data_from_api(url, 'pool_balances', process_liquididty_data)
+async def _read_liquidity(client):
+
+    pool_data = await _read_data_from_api(liquidity_url, 'pool_balances',
+                                          process_liquididty_data,
+                                          liquidity_schema, client)
 
     pool_data['DATE'] = pd.to_datetime(pool_data['DATE'], utc=True)
-        
 
     return pool_data
 
+def read_liquidity_from_api(client=None):
+    """
+    Reads in daily token balances from a Flipside endpoint and converts
+    to hourly data (assuming constant balance within each day).
+    """
+    return run_sync(_read_with_client(client, _read_liquidity))[0]
+
 
 def get_pool_liquidity(pool_data, pool, min_date=None, max_date=None):
     """
@@ -186,12 +246,14 @@ def get_pool_liquidity(pool_data, pool, min_date=None, max_date=None):
     return pool_data[['DATE', 'pool_x_i','pool_y_i']]
 
 
-def get_all_model_data(min_date=None, max_date=None):
-        
-    all_token_prices = read_prices_from_api()
-        
-    all_pool_liquidity = read_liquidity_from_api()
-       
+def get_all_model_data(min_date=None, max_date=None, client=None):
+    """
+    Reads hourly price and pool balance data for all tokens. Both datasets
+    are downloaded concurrently.
+    """
+    all_token_prices, all_pool_liquidity = run_sync(
+        _read_with_client(client, _read_prices, _read_liquidity))
+
     return all_token_prices, all_pool_liquidity
 
 
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import reference
+from .model import leveraged_token_model
+from .trade_sim import execute_trades, sim_trades
+
+# names of the outputs compared for engines returning tuples
+trade_output_names = {'sim_trades': ['trade_actual', 'swap_fees',
+                                     'swap_spread', 'swap_perc_spread'],
+                      'execute_trades': ['received', 'offered', 'fees',
+                                         'spread', 'max_perc_spread']}
+
+# (rtol, atol) overriding the default tolerances of some columns.
+# rebalance_shortfall is a small difference of amounts of up to millions of
+# USD, so rounding differences remain as absolute errors of up to ~1e-7.
+default_column_tolerances = {'rebalance_shortfall': (1e-9, 1e-6)}
+
+# scenario kinds generated in turn for each engine
+scenario_kinds = ['random', 'liquidation', 'zero_slippage', 'shallow_pool',
+                  'no_fees']
+
+# rebalance intervals of model scenarios, including never rebalancing
+# periodically (an infinite interval)
+rebalance_intervals = [0, 1, 4, 24, 10 ** 9, np.inf]
+
+def _random_trade_params(rng, kind):
+    # (max_trade, max_slippage, trade_delay) for one scenario kind
+    max_slippage = 0 if kind == 'zero_slippage' else rng.uniform(0.5, 10)
+
+    return (rng.choice([1e4, 2e5, 1e6, 1e9]), max_slippage,
+            rng.choice([1, 5, 30, 300]))
+
+def random_pools(rng, price, kind):
+    """
+    Random UST (x) and token (y) pool balances following price, deep or
+    shallow (kind 'shallow_pool').
+    """
+    depth = 3e5 if kind == 'shallow_pool' else rng.uniform(1e6, 1e8)
+
+    pool_x = depth * np.exp(rng.normal(0, 0.1, len(price)))
+
+    return pool_x, pool_x / price
+
+def random_model_scenario(rng, nt, kind):
+    """
+    Random inputs of leveraged_token_model for one scenario kind.
+
+    'liquidation' scenarios crash the price at high leverage, 'zero_slippage'
+    scenarios reject every trade, 'shallow_pool' scenarios trade against
+    shallow pools and 'no_fees' scenarios have no swap fee or interest.
+
+    Returns
+    -------
+    price_data : pd.DataFrame
+    pool_liquidity : pd.DataFrame
+    model_params : dict
+    """
+    log_returns = rng.normal(0, rng.uniform(0.005, 0.05), nt)
+
+    if kind == 'liquidation':
+        # crash of 30-90% over a few hours
+        start = rng.integers(0, nt)
+        log_returns[start:start + 4] += np.log(1 - rng.uniform(0.3, 0.9)) / 4
+
+    price = rng.uniform(1, 100) * np.exp(np.cumsum(log_returns))
+
+    pool_x, pool_y = random_pools(rng, price, kind)
+
+    dates = pd.date_range('2021-01-01', periods=nt, freq='h', tz='UTC')
+
+    price_data = pd.DataFrame({'DATE': dates, 'PRICE': price})
+
+    pool_liquidity = pd.DataFrame({'DATE': dates, 'pool_x_i': pool_x,
+                                   'pool_y_i': pool_y})
+
+    target_leverage = rng.uniform(1.5, 5 if kind == 'liquidation' else 3)
+
+    band = rng.uniform(0.01, 1)
+
+    model_params = {'target_leverage': target_leverage,
+                    'min_leverage': max(1.01, target_leverage - band),
+                    'max_leverage': target_leverage + band,
+                    'congestion_time': int(rng.integers(0, 4)),
+                    'rebalance_interval':
+                        rebalance_intervals[rng.integers(len(rebalance_intervals))],
+                    'recentering_speed_periodic': rng.uniform(0.1, 1),
+                    'recentering_speed_emergency': rng.uniform(0.1, 2),
+                    'trade_params_periodic': _random_trade_params(rng, kind),
+                    'trade_params_emergency': _random_trade_params(rng, kind),
+                    'borrow_rate': 0 if kind == 'no_fees' else rng.uniform(0, 200),
+                    'liq_thresh': rng.uniform(60, 95),
+                    'liq_premium': rng.choice([5, 20, 120]),
+                    'n_tokens_issued': rng.choice([1000, 1e5]),
+                    'swap_fee': 0 if kind == 'no_fees' else 0.3,
+                    'arb_params': (rng.uniform(0, 100), rng.choice([1, 30, 3600]))}
+
+    return price_data, pool_liquidity, model_params
+
+def random_trade_scenario(rng, kind, zero_volume=True):
+    """
+    Random inputs of execute_trades for one scenario kind, as a tuple of
+    positional arguments. Zero trade volumes are included if zero_volume
+    (sim_trades is only defined for non zero trades).
+    """
+    price = rng.uniform(1, 100, 1)
+
+    pool_x, pool_y = random_pools(rng, price, kind)
+
+    trade_vol = rng.choice([0, 1, -1] if zero_volume else [1, -1]) * rng.uniform(1e3, 1e7)
+
+    return (trade_vol, *_random_trade_params(rng, kind),
+            rng.uniform(0, 100), rng.choice([1, 30, 3600]),
+            {'pool_x_i': pool_x[0], 'pool_y_i': pool_y[0]},
+            0 if kind == 'no_fees' else 0.3)
+
+def _sim_trades_args(execute_args):
+    # equal sized trades of execute_trades arguments, as sim_trades arguments
+    trade_vol, max_trade, max_slippage, trade_delay, arb_effectiveness, \
+        arb_time, pool_liquidity, swap_fee = execute_args
+
+    n = max(1, int(min(abs(trade_vol) // max_trade, 1000)))
+
+    trades = np.full(n, trade_vol / n)
+
+    return (trades, max_slippage, trade_delay, arb_effectiveness, arb_time,
+            pool_liquidity['pool_x_i'], pool_liquidity['pool_y_i'], swap_fee)
+
+def compare_outputs(expected, actual, rtol=1e-9, atol=1e-9,
+                    column_tolerances=None):
+    """
+    Compares each output column of a reference engine with a candidate.
+
+    Parameters
+    ----------
+    expected, actual : pd.DataFrame or dict
+        Outputs of the reference and candidate engines, keyed by column
+        name. Only the columns of expected are compared.
+    rtol, atol : float
+        Relative and absolute tolerances, as for np.allclose. NaN values
+        must match.
+    column_tolerances : dict
+        (rtol, atol) of columns with other tolerances, keyed by column name.
+        Defaults to default_column_tolerances.
+
+    Returns
+    -------
+    errors : dict
+        Maximum absolute difference of each column, or np.inf if the
+        column is missing or has a different shape.
+    mismatched : list
+        Names of columns outside the tolerances.
+    """
+    if column_tolerances is None:
+        column_tolerances = default_column_tolerances
+
+    errors = {}
+
+    mismatched = []
+
+    for name in expected:
+        x = np.asarray(expected[name])
+
+        if name not in actual or np.shape(actual[name]) != x.shape:
+            errors[name] = np.inf
+            mismatched.append(name)
+            continue
+
+        y = np.asarray(actual[name])
+
+        if not (np.issubdtype(x.dtype, np.number)
+                or np.issubdtype(x.dtype, np.bool_)):
+            equal = np.array_equal(x, y)
+            errors[name] = 0 if equal else np.inf
+        else:
+            x, y = x.astype(float), y.astype(float)
+
+            column_rtol, column_atol = column_tolerances.get(name, (rtol, atol))
+
+            equal = np.allclose(x, y, rtol=column_rtol, atol=column_atol,
+                                equal_nan=True)
+
+            with np.errstate(invalid='ignore'):
+                diff = np.abs(x - y)
+
+            errors[name] = np.nanmax(diff) if np.isfinite(diff).any() else 0
+
+        if not equal:
+            mismatched.append(name)
+
+    return errors, mismatched
+
+def _timed(fn, args):
+    start = time.perf_counter()
+
+    with np.errstate(all='ignore'):
+        result = fn(*args)
+
+    return result, time.perf_counter() - start
+
+def check_equivalence(n_scenarios=20, n_steps=500, seed=0, rtol=1e-9,
+                      atol=1e-9, candidates=None):
+    """
+    Checks that candidate engines match the frozen reference engines (see
+    ltsim.reference) over randomized scenarios, and times both.
+
+    Scenarios cycle through scenario_kinds, covering random price paths and
+    pool depths, liquidations, trades rejected at zero slippage, shallow
+    pools and runs without fees or interest.
+
+    Parameters
+    ----------
+    n_scenarios : int
+        Number of scenarios for each engine.
+    n_steps : int
+        Number of hourly timesteps in each leveraged_token_model scenario.
+    seed : int
+        Seed of the scenario generator.
+    rtol, atol : float
+        Relative and absolute tolerances for each output column, except
+        those in default_column_tolerances.
+    candidates : dict
+        Candidate engines keyed by reference engine name
+        ('leveraged_token_model', 'sim_trades' or 'execute_trades'), with
+        the reference signature. Defaults to the engines of this package.
+        Only engines given are checked.
+
+    Returns
+    -------
+    report : pd.DataFrame
+        One row for each engine and scenario, with the scenario kind,
+        whether all columns matched, the mismatched columns, the largest
+        absolute difference, the reference and candidate run times and the
+        speedup.
+    """
+    if candidates is None:
+        candidates = {'leveraged_token_model': leveraged_token_model,
+                      'sim_trades': sim_trades,
+                      'execute_trades': execute_trades}
+
+    rng = np.random.default_rng(seed)
+
+    rows = []
+
+    for engine, candidate in candidates.items():
+        for i in range(n_scenarios):
+            kind = scenario_kinds[i % len(scenario_kinds)]
+
+            if engine == 'leveraged_token_model':
+                price_data, pool_liquidity, model_params = \
+                    random_model_scenario(rng, n_steps, kind)
+
+                args = (price_data, pool_liquidity, *model_params.values())
+            elif engine == 'execute_trades':
+                args = random_trade_scenario(rng, kind)
+            else:
+                args = _sim_trades_args(random_trade_scenario(rng, kind, False))
+
+            expected, reference_time = _timed(getattr(reference, engine), args)
+
+            actual, candidate_time = _timed(candidate, args)
+
+            if engine in trade_output_names:
+                expected = dict(zip(trade_output_names[engine], expected))
+                actual = dict(zip(trade_output_names[engine], actual))
+
+            errors, mismatched = compare_outputs(expected, actual, rtol, atol)
+
+            rows.append({'engine': engine,
+                         'scenario': i,
+                         'kind': kind,
+                         'passed': not mismatched,
+                         'mismatched': ', '.join(mismatched),
+                         'max_abs_error': max(errors.values()),
+                         'reference_time': reference_time,
+                         'time': candidate_time,
+                         'speedup': reference_time / candidate_time})
+
+    return pd.DataFrame(rows)
+
+def summarize(report):
+    """
+    Summary of an equivalence report for each engine: the number of
+    scenarios and failures, the largest absolute difference and the
+    speedup over all scenarios.
+    """
+    summary = report.groupby('engine', sort=False).agg(
+        n_scenarios=('passed', 'size'),
+        n_failed=('passed', lambda passed: int((~passed).sum())),
+        max_abs_error=('max_abs_error', 'max'),
+        reference_time=('reference_time', 'sum'),
+        time=('time', 'sum'))
+
+    summary['speedup'] = summary['reference_time'] / summary['time']
+
+    return summary
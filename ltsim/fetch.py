@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import codecs
+import http.client
+import io
+import json
+import socket
+import ssl
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+class FetchError(Exception):
+    """
+    Raised when a dataset could not be downloaded or decoded.
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Transport:
+    """
+    Base class for transports used to download datasets. Subclasses
+    implement open, returning a readable binary stream for the url body.
+    Transports may be called from several threads at once.
+    """
+
+    def open(self, url, timeout):
+        raise NotImplementedError
+
+    def abort(self, stream):
+        """
+        Stops a download in progress on another thread, e.g. once it has
+        timed out, so the thread is not left waiting on the server.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class _PooledResponse(io.RawIOBase):
+    """
+    Response body stream that hands its connection back to the pool once the
+    body has been read to the end.
+    """
+
+    def __init__(self, response, release, sock):
+        self._response = response
+        self._release = release
+        self._sock = sock
+        self._aborted = False
+
+    def readable(self):
+        return True
+
+    def abort(self):
+        # shutting the socket down wakes a read blocked in another thread
+        self._aborted = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def readinto(self, buffer):
+        n = self._response.readinto(buffer)
+        if self._aborted:
+            raise FetchError('download aborted')
+        if n == 0 and self._release is not None:
+            self._release(reuse=True)
+            self._release = None
+        return n
+
+    def close(self):
+        if self._release is not None:
+            # partially read responses can't be reused
+            self._response.close()
+            self._release(reuse=False)
+            self._release = None
+        super().close()
+
+
+class HTTPTransport(Transport):
+    """
+    HTTP(S) transport keeping a pool of persistent connections per host.
+
+    Parameters
+    ----------
+    max_connections : int
+        Maximum number of idle connections kept per host.
+    verify_ssl : bool
+        Whether to verify server certificates. Only applies to this
+        transport, not to the rest of the process.
+    max_redirects : int
+        Maximum number of redirects followed for each request.
+    """
+
+    def __init__(self, max_connections=4, verify_ssl=True, max_redirects=5):
+        self.max_connections = max_connections
+        self.max_redirects = max_redirects
+
+        if verify_ssl:
+            self.ssl_context = ssl.create_default_context()
+        else:
+            self.ssl_context = ssl._create_unverified_context()
+
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc, timeout):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc), [])
+            conn = idle.pop() if idle else None
+
+        if conn is None:
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(netloc, timeout=timeout,
+                                                   context=self.ssl_context)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=timeout)
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+
+        return conn
+
+    def _release(self, scheme, netloc, conn, reuse):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if reuse and len(idle) < self.max_connections:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def open(self, url, timeout):
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            conn = self._acquire(parts.scheme, parts.netloc, timeout)
+
+            try:
+                conn.request('GET', path, headers={'Accept': 'application/json'})
+                # the connection drops its socket if the response closes it
+                sock = conn.sock
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+
+            def release(reuse, scheme=parts.scheme, netloc=parts.netloc,
+                        conn=conn, response=response):
+                self._release(scheme, netloc, conn,
+                              reuse and not response.will_close)
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                release(reuse=True)
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            if response.status != 200:
+                response.read()
+                release(reuse=True)
+                raise FetchError(f'{url} returned HTTP {response.status}',
+                                 retryable=(response.status >= 500
+                                            or response.status == 429))
+
+            return io.BufferedReader(_PooledResponse(response, release, sock))
+
+        raise FetchError(f'{url} exceeded {self.max_redirects} redirects',
+                         retryable=False)
+
+    def abort(self, stream):
+        stream.raw.abort()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class StaticTransport(Transport):
+    """
+    Transport serving fixed response bodies, for use as a local stand-in
+    for the real endpoints (e.g. in tests or offline runs).
+
+    Parameters
+    ----------
+    responses : dict
+        Mapping of url to response body (bytes or str).
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def open(self, url, timeout):
+        if url not in self.responses:
+            raise FetchError(f'{url} not found', retryable=False)
+
+        body = self.responses[url]
+        if isinstance(body, str):
+            body = body.encode()
+
+        return io.BytesIO(body)
+
+
+def iter_json_records(stream, chunk_size=1 << 16):
+    """
+    Incrementally decodes the records of a top level JSON array from a
+    binary stream, without holding the full document in memory.
+    """
+    decoder = json.JSONDecoder()
+
+    # chunks may split multi-byte characters
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # skip whitespace and separators between records
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise FetchError('expected a JSON array', retryable=False)
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # record is incomplete, read more data unless at the end
+                if eof:
+                    raise FetchError('truncated JSON response')
+            else:
+                yield record
+                pos = end
+                continue
+        elif eof:
+            raise FetchError('truncated JSON response')
+
+        chunk = stream.read(chunk_size)
+
+        if not chunk:
+            eof = True
+
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+
+def records_to_frame(records, schema=None):
+    """
+    Builds a DataFrame from an iterable of JSON records. If a schema mapping
+    column names to types ('datetime', 'float', 'str') is given, only those
+    columns are kept and each is converted to its type.
+    """
+    if schema is None:
+        return pd.DataFrame(list(records))
+
+    columns = {name: [] for name in schema}
+
+    for record in records:
+        for name, values in columns.items():
+            values.append(record.get(name))
+
+    data = {}
+
+    for name, kind in schema.items():
+        if kind == 'datetime':
+            data[name] = pd.to_datetime(columns[name])
+        elif kind == 'float':
+            data[name] = np.array(columns[name], dtype=float)
+        else:
+            data[name] = pd.Series(columns[name], dtype=object)
+
+    return pd.DataFrame(data)
+
+
+class DataClient:
+    """
+    Downloads JSON datasets concurrently, with a timeout and bounded retry
+    for each dataset.
+
+    Parameters
+    ----------
+    transport : Transport
+        Transport used for requests. Defaults to a pooled HTTPTransport.
+    timeout : float
+        Seconds allowed for each download attempt (connection and body).
+        Each connection and read also times out after this long, and a
+        download still running when its attempt times out is aborted, so
+        timed out downloads do not keep holding a worker thread.
+    retries : int
+        Number of times a failed download is retried.
+    backoff : float
+        Seconds to wait before the first retry, doubling for each retry.
+    max_connections : int
+        Maximum number of concurrent downloads.
+    """
+
+    def __init__(self, transport=None, timeout=60, retries=2, backoff=1,
+                 max_connections=4):
+        if transport is None:
+            transport = HTTPTransport(max_connections)
+
+        self.transport = transport
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+
+        self._executor = ThreadPoolExecutor(max_connections)
+
+        self._abort_lock = threading.Lock()
+
+    def _download(self, url, schema, attempt):
+        # attempt is shared with fetch_frame, which aborts the stream if
+        # the attempt times out
+        with self.transport.open(url, self.timeout) as stream:
+            with self._abort_lock:
+                if attempt.get('timed_out'):
+                    raise FetchError(f'{url} timed out')
+                attempt['stream'] = stream
+
+            return records_to_frame(iter_json_records(stream), schema)
+
+    def _abort(self, attempt):
+        with self._abort_lock:
+            attempt['timed_out'] = True
+            stream = attempt.get('stream')
+
+        if stream is not None:
+            self.transport.abort(stream)
+
+    async def fetch_frame(self, url, schema=None):
+        """
+        Downloads and decodes the JSON array at url into a DataFrame.
+        """
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(self.retries + 1):
+            state = {}
+
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, self._download, url,
+                                         schema, state),
+                    self.timeout)
+            except asyncio.TimeoutError:
+                self._abort(state)
+
+                if attempt == self.retries:
+                    raise FetchError(f'could not download {url}: timed out '
+                                     f'after {self.timeout}s')
+            except FetchError as e:
+                if not e.retryable or attempt == self.retries:
+                    raise
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise FetchError(f'could not download {url}: {e!r}') from e
+
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def fetch_frames(self, requests):
+        """
+        Downloads several datasets concurrently. requests is a list of
+        (url, schema) tuples. Failed downloads are returned as FetchError
+        instances rather than raised.
+        """
+        return await asyncio.gather(*[self.fetch_frame(url, schema)
+                                      for url, schema in requests],
+                                    return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code, including from
+    within a running event loop (e.g. a notebook).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+
+import numpy as np
+
+@dataclass(frozen=True, eq=False, repr=False)
+class ModelInputs:
+    """
+    Validated model inputs, as contiguous read only float64 arrays. Created
+    by prepare_inputs and reusable across any number of model runs, which
+    then skip validation and conversion.
+
+    Attributes
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    pool_x : np.ndarray
+        UST pool balance at each timestep.
+    pool_y : np.ndarray
+        Token pool balance at each timestep.
+    dates : np.ndarray
+        Timestamp of each timestep, or the timestep index if the price data
+        has no DATE column.
+    hours : np.ndarray
+        Hour of the day of each timestep, or zeros if the price data has no
+        DATE column.
+    """
+    price: np.ndarray
+    pool_x: np.ndarray
+    pool_y: np.ndarray
+    dates: np.ndarray
+    hours: np.ndarray
+
+    def __len__(self):
+        return len(self.price)
+
+    def __repr__(self):
+        return (f'{type(self).__name__}(n_steps={len(self)}, '
+                f'dates={self.dates[0] if len(self) else None} to '
+                f'{self.dates[-1] if len(self) else None})')
+
+    @property
+    def arrays(self):
+        """
+        Tuple of (price, pool_x, pool_y), the arrays used by
+        simulate_leveraged_token.
+        """
+        return self.price, self.pool_x, self.pool_y
+
+    def window(self, start, stop):
+        """
+        Inputs over timesteps start to stop. Arrays are views, so no
+        validation or copying is repeated.
+        """
+        return ModelInputs(*(values[start:stop] for values in
+                             (self.price, self.pool_x, self.pool_y,
+                              self.dates, self.hours)))
+
+
+def _own_array(values, dtype=None):
+    # contiguous array of values, copied unless conversion already copied
+    # it, so marking it read only never affects the caller's data
+    array = np.ascontiguousarray(values, dtype=dtype)
+
+    if np.may_share_memory(array, values):
+        array = array.copy()
+
+    return array
+
+def _float_array(values, name, offset=0):
+    # offset is the timestep of the first value, for error messages
+    array = _own_array(values, np.float64)
+
+    if array.ndim != 1:
+        raise ValueError(f'{name} must be one dimensional')
+
+    # invalid values are located in a single vectorised pass
+    invalid = ~(array > 0) | ~np.isfinite(array)
+
+    if invalid.any():
+        t = np.flatnonzero(invalid)[0] + offset
+        raise ValueError(f'{name} must be finite and positive, found '
+                         f'{array[t - offset]} at timestep {t} '
+                         f'({np.count_nonzero(invalid)} invalid values)')
+
+    array.flags.writeable = False
+
+    return array
+
+def _read_only(array):
+    array = _own_array(array)
+
+    array.flags.writeable = False
+
+    return array
+
+def prepare_inputs(price_data, pool_liquidity_data=None):
+    """
+    Validates the price and pool balance data once and converts it to the
+    arrays used by the model.
+
+    Checks that prices and pool balances are finite and positive, that both
+    datasets have the same number of timesteps (and the same dates, if both
+    have a DATE column) and that dates are strictly increasing. Timesteps
+    are usually hourly, but any spacing (e.g. daily) is accepted.
+
+    Parameters
+    ----------
+    price_data : pd.DataFrame or ModelInputs
+        Ordered token prices at each timestep, with an optional DATE column.
+        ModelInputs are returned unchanged.
+    pool_liquidity_data : pd.DataFrame
+        Ordered UST and token pool balances at each timestep.
+
+    Returns
+    -------
+    inputs : ModelInputs
+    """
+    if isinstance(price_data, ModelInputs):
+        return price_data
+
+    if pool_liquidity_data is None:
+        raise ValueError('pool_liquidity_data is required unless price_data '
+                         'is a ModelInputs')
+
+    price = _float_array(price_data['PRICE'].values, 'PRICE')
+
+    pool_x = _float_array(pool_liquidity_data['pool_x_i'].values, 'pool_x_i')
+
+    pool_y = _float_array(pool_liquidity_data['pool_y_i'].values, 'pool_y_i')
+
+    if not len(price) == len(pool_x) == len(pool_y):
+        raise ValueError(f'price_data has {len(price)} timesteps but '
+                         f'pool_liquidity_data has {len(pool_x)}')
+
+    if 'DATE' in price_data:
+        dates = price_data['DATE'].values
+
+        if not np.issubdtype(dates.dtype, np.datetime64):
+            raise ValueError(f'DATE must be datetimes, not {dates.dtype}')
+
+        steps = np.diff(dates)
+
+        if len(steps) and not (steps > np.timedelta64(0)).all():
+            t = np.flatnonzero(~(steps > np.timedelta64(0)))[0] + 1
+            raise ValueError(f'DATE must be strictly increasing, found '
+                             f'{dates[t - 1]} followed by {dates[t]} at '
+                             f'timestep {t}')
+
+        if 'DATE' in pool_liquidity_data:
+            pool_dates = pool_liquidity_data['DATE'].values
+            if not np.array_equal(dates, pool_dates):
+                raise ValueError('DATE of price_data and pool_liquidity_data '
+                                 'do not match')
+
+        hours = price_data['DATE'].dt.hour.values
+    else:
+        dates = np.arange(0, len(price))
+        hours = np.zeros(len(price))
+
+    return ModelInputs(price, pool_x, pool_y, _read_only(dates),
+                       _read_only(hours))
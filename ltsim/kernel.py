@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+import atexit
+import ctypes
+import hashlib
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+from .pools import ConstantProductCurve
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+
+# C source of the compiled simulation kernel, built on first use
+source_path = os.path.join(dir_path, '_kernel.c')
+
+# whether simulate_leveraged_token uses the compiled kernel where possible.
+# Setting the LTSIM_KERNEL environment variable to 0 disables it.
+enabled = os.environ.get('LTSIM_KERNEL', '1') != '0'
+
+# compiler flags. Floating point contraction (fused multiply adds) and fast
+# math would change rounding, so results would differ from numpy.
+compile_flags = ['-O2', '-shared', '-fPIC', '-std=c99', '-ffp-contract=off',
+                 '-fno-fast-math']
+
+_lock = threading.Lock()
+
+_library = None
+
+_loaded = False
+
+def _cache_dir():
+    # per user directory the kernel is built into and reused from
+    cache_home = (os.environ.get('XDG_CACHE_HOME')
+                  or os.path.join(os.path.expanduser('~'), '.cache'))
+
+    return os.path.join(cache_home, 'ltsim')
+
+def _is_private(path, mode_mask):
+    # whether path is owned by this user (and not a symbolic link), with
+    # none of the mode_mask permission bits set
+    info = os.lstat(path)
+
+    if stat.S_ISLNK(info.st_mode):
+        return False
+
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        return False
+
+    return not info.st_mode & mode_mask
+
+def _build_dir():
+    """
+    Directory to build the kernel in. Libraries are only loaded from
+    directories other users cannot write to: the per user cache directory
+    (created with mode 0700), or a new temporary directory for this process
+    if the cache directory is not private or cannot be created.
+    """
+    cache_dir = _cache_dir()
+
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+
+        if _is_private(cache_dir, 0o077):
+            return cache_dir
+    except OSError:
+        pass
+
+    build_dir = tempfile.mkdtemp(prefix='ltsim-')
+
+    atexit.register(shutil.rmtree, build_dir, ignore_errors=True)
+
+    return build_dir
+
+def _build(path):
+    # compiled to a temporary name first, so concurrent builds never load
+    # a partially written library
+    fd, tmp_path = tempfile.mkstemp(suffix='.so', dir=os.path.dirname(path))
+
+    os.close(fd)
+
+    try:
+        subprocess.run([os.environ.get('CC', 'cc'), *compile_flags, '-o',
+                        tmp_path, source_path, '-lm'],
+                       check=True, capture_output=True)
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load():
+    """
+    Loads the compiled kernel, compiling it with the C compiler (cc, or the
+    CC environment variable) if it has not been built for the current
+    source yet.
+
+    Returns
+    -------
+    library : ctypes.CDLL
+        The kernel library, or None if it could not be built (e.g. without
+        a C compiler), in which case the numpy implementation is used.
+    """
+    global _library, _loaded
+
+    with _lock:
+        if _loaded:
+            return _library
+
+        _loaded = True
+
+        with open(source_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:12]
+
+        name = f'_kernel-{digest}.so'
+
+        try:
+            path = os.path.join(_build_dir(), name)
+
+            # a library replaced by another user is rebuilt
+            if not os.path.exists(path) or not _is_private(path, 0o022):
+                _build(path)
+
+            library = ctypes.CDLL(path)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        library.simulate.restype = ctypes.c_int
+
+        library.simulate.argtypes = [ctypes.c_int64, *[ctypes.c_void_p] * 11]
+
+        _library = library
+
+        return _library
+
+def available():
+    """
+    Whether the compiled kernel is enabled and could be built.
+    """
+    return enabled and load() is not None
+
+def supports(pool_curve, optimal_split, event_log):
+    """
+    Whether a run with these options can use the compiled kernel, which
+    implements constant product pools without optimal trade splits or
+    trade logging.
+    """
+    return (type(pool_curve) is ConstantProductCurve and not optimal_split
+            and event_log is None and available())
+
+def _float_params(target_leverage, min_leverage, max_leverage,
+                  congestion_time, rebalance_interval,
+                  recentering_speed_periodic, recentering_speed_emergency,
+                  trade_params_periodic, trade_params_emergency, liq_thresh,
+                  liq_premium, n_tokens_issued, arb_params, impact_decay,
+                  liquidation_cascade):
+    # scalar parameters in the order of the C kernel, or None if any is not
+    # a number (the numpy implementation then raises the usual error)
+    if (len(trade_params_periodic) != 3 or len(trade_params_emergency) != 3
+            or len(arb_params) != 2):
+        return None
+
+    try:
+        return np.array([target_leverage, min_leverage, max_leverage,
+                         congestion_time, rebalance_interval,
+                         recentering_speed_periodic,
+                         recentering_speed_emergency, *trade_params_periodic,
+                         *trade_params_emergency, liq_thresh, liq_premium,
+                         n_tokens_issued, *arb_params, impact_decay,
+                         bool(liquidation_cascade)], dtype=float)
+    except (TypeError, ValueError):
+        return None
+
+def _is_int(value):
+    try:
+        return int(value) == value
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+def simulate(price, pool_x, pool_y, n_tokens, outputs, hourly_rate, growth,
+             swap_fee, params, position):
+    """
+    Runs the simulate_leveraged_token loop in the compiled kernel, which
+    releases the GIL while it runs. Results are identical to the numpy
+    implementation.
+
+    Parameters
+    ----------
+    price, pool_x, pool_y : np.ndarray
+        Token price and pool balances at each timestep.
+    n_tokens : np.ndarray
+        Number of leveraged tokens issued at each timestep.
+    outputs : list
+        Zeroed arrays of the other state variables, in the order of
+        core.state_names.
+    hourly_rate, growth, swap_fee : np.ndarray
+        Interest rate, compounded interest growth and swap fee schedules.
+    params : tuple
+        Scalar parameters of simulate_leveraged_token, see _float_params.
+    position : tuple
+        Carried (underlying, debt, last_rebalanced, exceedance, impact_x,
+        impact_y, impact_time) at the start of the run.
+
+    Returns
+    -------
+    position : tuple
+        Carried state at the end of the run, or None if the inputs are not
+        supported by the kernel. The output arrays are then zeroed again.
+    """
+    library = load()
+
+    nt = len(n_tokens)
+
+    params = _float_params(*params)
+
+    underlying, debt, last_rebalanced, exceedance, impact_x, impact_y, \
+        impact_time = position
+
+    if (library is None or params is None
+            or not all(_is_int(value) for value in (last_rebalanced,
+                                                    exceedance, impact_time))):
+        return None
+
+    arrays = [np.ascontiguousarray(array, dtype=float)
+              for array in (price, pool_x, pool_y)]
+
+    # shorter inputs make the numpy implementation raise an IndexError
+    if any(array.ndim != 1 or len(array) < nt for array in arrays):
+        return None
+
+    swap_fee = np.ascontiguousarray(swap_fee)
+
+    for array in (n_tokens, *outputs, hourly_rate, growth):
+        if (array.dtype != np.float64 or not array.flags.c_contiguous
+                or not array.flags.writeable):
+            return None
+
+    float_state = np.array([underlying, debt, impact_x, impact_y], dtype=float)
+
+    int_state = np.array([last_rebalanced, exceedance, impact_time],
+                         dtype=np.int64)
+
+    output_pointers = (ctypes.c_void_p * len(outputs))(
+        *[array.ctypes.data for array in outputs])
+
+    status = library.simulate(nt, *[array.ctypes.data for array in arrays],
+                              n_tokens.ctypes.data, hourly_rate.ctypes.data,
+                              growth.ctypes.data, swap_fee.ctypes.data,
+                              params.ctypes.data, float_state.ctypes.data,
+                              int_state.ctypes.data,
+                              ctypes.addressof(output_pointers))
+
+    if status != 0:
+        for array in outputs:
+            array.fill(0)
+
+        return None
+
+    return (float(float_state[0]), float(float_state[1]), int(int_state[0]),
+            int(int_state[1]), float(float_state[2]), float(float_state[3]),
+            int(int_state[2]))
@@ -1,33 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
 
-import numpy as np
 import pandas as pd
 
-from .trade_sim import execute_trades
+from .core import (calc_drawdown, calc_rebal_lev, is_periodic_rebal_allowed,
+                   postprocess, simulate_leveraged_token)
+from .inputs import prepare_inputs
+from .pools import CONSTANT_PRODUCT
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
-def calc_drawdown(data):
-
-    data = pd.Series(data)
-
-    cummax_data = data.cummax()
-
-    return (data - cummax_data) / cummax_data
-
-def calc_rebal_lev(leverage, target_leverage, recentering_speed):
-
-    if leverage > target_leverage:
-        rebalance_leverage = max(target_leverage, leverage - recentering_speed)
-    else:
-        rebalance_leverage = min(target_leverage, leverage + recentering_speed)
-
-    return rebalance_leverage
-
-def is_periodic_rebal_allowed(t, last_rebalanced, rebalance_interval):
-    return t >= last_rebalanced + rebalance_interval
-
 def leveraged_token_model(price_data, pool_liquidity_data,
                           target_leverage, min_leverage,
                           max_leverage, congestion_time,
@@ -35,17 +17,22 @@ def leveraged_token_model(price_data, pool_liquidity_data,
                           recentering_speed_emergency,
                           trade_params_periodic, trade_params_emergency,
                           borrow_rate, liq_thresh, liq_premium,
-                          n_tokens_issued, swap_fee, arb_params):
+                          n_tokens_issued, swap_fee, arb_params,
+                          pool_curve=CONSTANT_PRODUCT, optimal_split=False,
+                          liquidation_cascade=False, event_log=None,
+                          buffers=None, cache=None):
     """
     Simulates the performance of leveraged tokens managed through a combination
     of periodic and emergency leverage rebalancing rules.
 
     Parameters
     ----------
-    price_data : pd.DataFrame
-        Ordered token prices at each timestep.
+    price_data : pd.DataFrame or ModelInputs
+        Ordered token prices at each timestep, or inputs already validated
+        by prepare_inputs (which skips validation and conversion).
     pool_liquidity_data : pd.DataFrame
-        Ordered UST and token pool balances at each timestep.
+        Ordered UST and token pool balances at each timestep. Not used if
+        price_data is a ModelInputs.
     target_leverage : float
         Target leverage for the leveraged token to maintain.
     min_leverage : float
@@ -66,18 +53,48 @@ def leveraged_token_model(price_data, pool_liquidity_data,
     trade_params_emergency : tuple
         A tuple with the parameters (max_trade_vol, max_slippage, trade_delay)
         for emergency rebalancing.
-    borrow_rate : float
-        Annual percentage borrowing rate.
+    borrow_rate : float or np.ndarray
+        Annual percentage borrowing rate, either constant or for each
+        timestep.
     liq_thresh : float
         Loan to value threshold before position is liquidated.
     liq_premium : float
         Percentage of collateral that is forfeit as premium to liquidators.
     n_tokens_issued : int
         Number of leveraged tokens on issue (constant over time).
-    swap_fee : float
-        Percentage fee charged by the DEX for swaps.
+    swap_fee : float or np.ndarray
+        Percentage fee charged by the DEX for swaps, either constant or for
+        each timestep.
     arb_params : tuple
         A tuple containing the params (arb_effectiveness, arb_time).
+    pool_curve : PoolCurve
+        Pricing curve of the AMM pool used for rebalancing swaps. Defaults to
+        constant product (Terra Swap).
+    optimal_split : bool
+        Whether rebalancing trades are sized to maximise executed volume
+        (see optimal_trade_split), instead of being split into max_trade_vol
+        sized trades.
+    liquidation_cascade : bool
+        Whether collateral seized on liquidation (the debt repaid plus the
+        liquidation premium) is sold into the pool by liquidators, in trades
+        of the emergency max_trade_vol and trade_delay, accepting slippage
+        up to liq_premium. The change in pool balances carries
+        forward to later rebalances, reduced each hour by arbitrage. A
+        totally liquidated position is removed, so it is only liquidated
+        once.
+    event_log : TradeLog
+        Optional log to record every attempted rebalancing and liquidation
+        trade in, with its timing, pool balances and outcome. Runs are not
+        cached while logging.
+    buffers : dict
+        Optional arrays from allocate_buffers, reused to hold results
+        instead of allocating new arrays for each run. The returned
+        DataFrame is built on the buffers without copying, so the buffers
+        can only be reused once the previous DataFrame is no longer needed
+        (or has been copied with res.copy()).
+    cache : ResultCache
+        Optional cache of model results. If the same price and pool data and
+        parameters have been run before, stored results are reused.
 
     Returns
     -------
@@ -85,247 +102,46 @@ def leveraged_token_model(price_data, pool_liquidity_data,
         Dataframe containing key model variables.
 
     """
-    price = price_data['PRICE'].values
-
-    try:
-        dates = price_data['DATE'].values
-    except:
-        dates = np.arange(0, len(price))
-
-    try:
-        hours = price_data['DATE'].dt.hour.values
-    except:
-        hours = np.zeros(len(price))
-
-    nt = len(price)
-
-    # total (net) number of leveraged tokens issued over time
-    # equal to expected cummulative (subscriptions - redemptions)
-    n_tokens = np.zeros(nt) + n_tokens_issued
-
-    # number of underlying tokens per leveraged token
-    n_underlying = np.zeros(nt)
-
-    # amount borrowed ($) per leveraged token
-    borrowed = np.zeros(nt)
-
-    # actual leverage ratio per leveraged token
-    leverage = np.zeros(nt)
-
-    # target rebalance amount ($) for all issued leveraged tokens
-    target_rebalance_amount = np.zeros(nt)
-
-    # amount received for sucessful rebalancing trades ($),
-    # for all issued leveraged tokens
-    rebalance_amount = np.zeros(nt)
-    
-    # amount offered for sucessful rebalancing trades ($),
-    # for all issued leveraged tokens
-    offered_amount = np.zeros(nt)
-
-    # swap fees paid ($) for all issued leveraged tokens
-    swap_fees = np.zeros(nt)
-
-    # spread value ($) for all issued leveraged tokens
-    swap_spread = np.zeros(nt)
-
-    # highest percentage spread (%) at each timestep
-    max_swap_perc_spread = np.zeros(nt)
-
-    # boolean variable tracking if emergency rebalance was executed
-    emergency_rebalances = np.zeros(nt)
-
-    # boolean variable tracking if periodic rebalance was executed
-    periodic_rebalances = np.zeros(nt)
-
-    # cummulative duration of time where leverage remains out of bounds
-    exceedance_time = np.zeros(nt)
-
-    # loan to value ratio
-    ltv = np.zeros(nt)
-
-    # amount liquidated
-    liquidation_amount = np.zeros(nt)
-
-    n_underlying[0:] = target_leverage
-
-    borrowed[0:] = price[0] * (target_leverage - 1)
-
-    last_rebalanced = 0
-
-    for t in range(nt):
-
-        if borrowed[t] > 0:
-            ltv[t] = borrowed[t] / (n_underlying[t] * price[t])
-        else:
-            ltv[t] = np.nan
-
-        # liquidation logic
-        if ltv[t] >= liq_thresh / 100:
-
-            # balance before liquidation
-            collateral_before = n_underlying[t] * price[t] - borrowed[t]
-
-            # premium amount claimed by liquidators
-            liquidation_amount[t] = collateral_before * liq_premium / 100
-
-            # remaining balance after liquidation
-            collateral_after = collateral_before - liquidation_amount[t]
-
-            if collateral_after <= 0:
-                # all issued leveraged tokens are now worth 0 and removed
-                n_underlying[t] = 0
-                borrowed[t] = 0
-            else:
-                # % of position value is liquidated and lost.
-                # remaining is used to reconstruct tokens based on target leverage
-                n_underlying[t:] = collateral_after / price[t]
-                borrowed[t:] = 0
-
-        current_value = n_underlying[t] * price[t]
+    inputs = prepare_inputs(price_data, pool_liquidity_data)
 
-        leverage[t] = current_value / (current_value - borrowed[t])
+    price = inputs.price
 
-        outside_lev_range = (leverage[t] < min_leverage) | (leverage[t] > max_leverage)
-
-        # Continuous duration that leverage bounds are exceeded for
-        if outside_lev_range:
-            exceedance_time[t] = 1 + exceedance_time[t-1]
-        else:
-            exceedance_time[t] = 0
-
-        emergency_rebal_allowed = (outside_lev_range
-                                   & (exceedance_time[t] >= congestion_time))
-
-        periodic_rebal_allowed = is_periodic_rebal_allowed(t, last_rebalanced,
-                                                           rebalance_interval)
-
-        rebal_allowed = ((leverage[t] != target_leverage)
-                         and (n_tokens[t] > 0)
-                         and (n_underlying[t] > 1e-3)
-                         and (emergency_rebal_allowed or periodic_rebal_allowed))
-
-        if rebal_allowed:
-            if emergency_rebal_allowed:
-                trade_params = trade_params_emergency
-                recentering_speed = recentering_speed_emergency
-
-                emergency_rebalances[t] = 1
-            elif periodic_rebal_allowed:
-                trade_params = trade_params_periodic
-                recentering_speed = recentering_speed_periodic
-
-                periodic_rebalances[t] = 1
-                last_rebalanced = t
-
-            # leverage target for rebalancing
-            rebalance_leverage = calc_rebal_lev(leverage[t], target_leverage,
-                                                recentering_speed)
-
-            # required change in borrowing for rebalancing
-            delta_borrow = (rebalance_leverage * (current_value - borrowed[t])
-                            - current_value)
-
-            pool_liquidity = pool_liquidity_data.iloc[t][['pool_x_i','pool_y_i']].to_dict()
-
-            target_rebalance_amount[t] = n_tokens[t] * delta_borrow
-
-            trade = execute_trades(target_rebalance_amount[t],
-                                   *trade_params,
-                                   *arb_params,
-                                   pool_liquidity,
-                                   swap_fee)
-
-            rebalance_amount[t] = trade[0]
-            
-            offered_amount[t] = trade[1]
-
-            swap_fees[t] = trade[2]
-
-            swap_spread[t] = trade[3]
-
-            max_swap_perc_spread[t] = trade[4]
-
-        if target_rebalance_amount[t] > 0:
-            # Debt increased by the amount offered for successful trades.
-            # Borrowed UST is swapped for tokens (amount received is lower
-            # due to fees + spread).
-            borrowed[t:] += offered_amount[t] / n_tokens[t]
-
-            n_underlying[t:] += rebalance_amount[t] / n_tokens[t] / price[t]
-
-        else:
-            # Underlying tokens are swapped for UST and used to decrease debt.
-            borrowed[t:] += rebalance_amount[t] / n_tokens[t]
-
-            n_underlying[t:] += offered_amount[t] / n_tokens[t] / price[t]
-
-        # Hourly debt interest accural
-        borrowed[t:] += (borrow_rate / 100 / 365 / 24) * borrowed[t]
-
-    # hourly value of the leveraged token
-    lt_value = (n_underlying * price - borrowed)
-
-    # running drawdown for underlying token price
-    drawdown_underlying = calc_drawdown(price)
-
-    # running drawdown for leveraged token value
-    drawdown_lt = calc_drawdown(lt_value)
-
-    min_leverage_arr = np.zeros(nt) + min_leverage
-
-    max_leverage_arr = np.zeros(nt) + max_leverage
-
-    # hour on hour change in leveraged token value
-    hourly_return = np.zeros(len(lt_value))
-
-    # percentage daily return
-    hourly_return_perc = np.zeros(len(lt_value))
-
-    # cummulative change in leveraged token value
-    cummulative_return = np.zeros(len(lt_value))
-
-    # percentage cummulative change
-    cummulative_return_perc = np.zeros(len(lt_value))
-
-    hourly_return[1:] = (lt_value[1:] - lt_value[:-1])
-
-    hourly_return_perc[1:] = (lt_value[1:] - lt_value[:-1]) / lt_value[:-1]
-
-    cummulative_return[1:] = (lt_value[1:] - lt_value[0])
-
-    cummulative_return_perc[1:] = (lt_value[1:] - lt_value[0]) / lt_value[0]
-
-    rebalance_shortfall = (abs(target_rebalance_amount)
-                           - (abs(rebalance_amount) + swap_fees + swap_spread))
+    if cache is not None:
+        simulate = cache.simulate
+    else:
+        simulate = simulate_leveraged_token
+
+    state = simulate(price,
+                     inputs.pool_x,
+                     inputs.pool_y,
+                     target_leverage,
+                     min_leverage,
+                     max_leverage,
+                     congestion_time,
+                     rebalance_interval,
+                     recentering_speed_periodic,
+                     recentering_speed_emergency,
+                     trade_params_periodic,
+                     trade_params_emergency,
+                     borrow_rate,
+                     liq_thresh,
+                     liq_premium,
+                     n_tokens_issued,
+                     swap_fee,
+                     arb_params,
+                     pool_curve=pool_curve,
+                     optimal_split=optimal_split,
+                     liquidation_cascade=liquidation_cascade,
+                     event_log=event_log,
+                     out=buffers)
+
+    results = postprocess(price, state, min_leverage, max_leverage, buffers)
+
+    # output arrays are used without copying. The inputs are read only and
+    # may be shared across runs, so they are copied.
+    res = pd.DataFrame({'date': inputs.dates.copy(),
+                        'hour': inputs.hours.copy(),
+                        'underlying_token_price': price.copy(),
+                        **results}, copy=False)
 
-    res = pd.DataFrame({'date': dates,
-                        'hour': hours,
-                        'underlying_token_price': price,
-                        'leveraged_token_value': lt_value,
-                        'drawdown_underlying': drawdown_underlying,
-                        'drawdown_leveraged': drawdown_lt,
-                        'n_tokens_per_lt': n_underlying,
-                        'underlying_value_per_lt': n_underlying * price,
-                        'debt_per_lt': borrowed,
-                        'leverage': leverage,
-                        'total_underlying_value': n_tokens * n_underlying * price,
-                        'total_debt': n_tokens * borrowed,
-                        'hourly_return': hourly_return,
-                        'hourly_return_perc': hourly_return_perc,
-                        'cummulative_return': cummulative_return,
-                        'cummulative_return_perc': cummulative_return_perc,
-                        'target_rebalance_amount': target_rebalance_amount,
-                        'rebalance_amount': rebalance_amount,
-                        'offered_amount': offered_amount,
-                        'swap_fees' : swap_fees,
-                        'swap_spread': swap_spread,
-                        'max_swap_perc_spread': max_swap_perc_spread,
-                        'rebalance_shortfall': rebalance_shortfall,
-                        'loan_to_value_ratio': ltv,
-                        'liquidation_amount': n_tokens * liquidation_amount,
-                        'emergency_rebalance': emergency_rebalances,
-                        'periodic_rebalance': periodic_rebalances,
-                        'min_leverage_arr': min_leverage_arr,
-                        'max_leverage_arr': max_leverage_arr})
     return res
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import dataclasses
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from .core import SimState, _running_max, calc_drawdown, simulate_leveraged_token
+from .inputs import prepare_inputs
+from .parallel import SharedModelData, attach, model_args, window_args
+
+def summary_metrics(price, state):
+    """
+    Summary metrics of a model run, used as the input to optimisation
+    objectives.
+
+    Returns
+    -------
+    metrics : dict
+        final_value, total_return (fraction), max_drawdown (negative
+        fraction), n_liquidations, liquidation_amount, rebalance_shortfall,
+        swap_costs (fees and spread) and n_rebalances.
+    """
+    lt_value = state['n_underlying'] * price - state['borrowed']
+
+    shortfall = (np.abs(state['target_rebalance_amount'])
+                 - (np.abs(state['rebalance_amount']) + state['swap_fees']
+                    + state['swap_spread']))
+
+    return {'final_value': lt_value[-1],
+            'total_return': lt_value[-1] / lt_value[0] - 1,
+            'max_drawdown': np.nanmin(calc_drawdown(lt_value)),
+            'n_liquidations': int(np.count_nonzero(state['liquidation_amount'])),
+            'liquidation_amount': (state['n_tokens'] * state['liquidation_amount']).sum(),
+            'rebalance_shortfall': shortfall.sum(),
+            'swap_costs': (state['swap_fees'] + state['swap_spread']).sum(),
+            'n_rebalances': int(state['emergency_rebalances'].sum()
+                                + state['periodic_rebalances'].sum())}
+
+def _accumulate(totals, price, state):
+    """
+    Adds a continued segment of a run to the running totals of its summary
+    metrics (see summary_metrics), returning the new totals.
+    """
+    lt_value = state['n_underlying'] * price - state['borrowed']
+
+    shortfall = (np.abs(state['target_rebalance_amount'])
+                 - (np.abs(state['rebalance_amount']) + state['swap_fees']
+                    + state['swap_spread']))
+
+    if totals is None:
+        totals = {'initial_value': lt_value[0], 'value_max': None,
+                  'max_drawdown': np.nan, 'n_liquidations': 0,
+                  'liquidation_amount': 0, 'rebalance_shortfall': 0,
+                  'swap_costs': 0, 'n_rebalances': 0}
+
+    drawdown = calc_drawdown(lt_value, running_max=totals['value_max'])
+
+    return {'initial_value': totals['initial_value'],
+            'final_value': lt_value[-1],
+            'value_max': _running_max(lt_value, totals['value_max']),
+            'max_drawdown': np.fmin.reduce(drawdown, initial=totals['max_drawdown']),
+            'n_liquidations': totals['n_liquidations']
+                              + int(np.count_nonzero(state['liquidation_amount'])),
+            'liquidation_amount': totals['liquidation_amount']
+                                  + (state['n_tokens'] * state['liquidation_amount']).sum(),
+            'rebalance_shortfall': totals['rebalance_shortfall'] + shortfall.sum(),
+            'swap_costs': totals['swap_costs']
+                          + (state['swap_fees'] + state['swap_spread']).sum(),
+            'n_rebalances': totals['n_rebalances']
+                            + int(state['emergency_rebalances'].sum()
+                                  + state['periodic_rebalances'].sum())}
+
+def _totals_metrics(totals):
+    # summary_metrics from the running totals of a run
+    return {'final_value': totals['final_value'],
+            'total_return': totals['final_value'] / totals['initial_value'] - 1,
+            'max_drawdown': totals['max_drawdown'],
+            'n_liquidations': totals['n_liquidations'],
+            'liquidation_amount': totals['liquidation_amount'],
+            'rebalance_shortfall': totals['rebalance_shortfall'],
+            'swap_costs': totals['swap_costs'],
+            'n_rebalances': totals['n_rebalances']}
+
+def _continue_run(arrays, task):
+    """
+    Continues a candidate's run over timesteps start to stop, from its state
+    (carry) and metric totals at start. Returns the state and totals at
+    stop.
+    """
+    start, stop, carry, totals, model_params = task
+
+    price, pool_x, pool_y = (array[start:stop] for array in arrays)
+
+    carry = dataclasses.replace(carry)
+
+    state = simulate_leveraged_token(price, pool_x, pool_y,
+                                     *window_args(model_params, start, stop),
+                                     carry=carry)
+
+    return carry, _accumulate(totals, price, state)
+
+# shared arrays attached by each worker process
+_worker_data = None
+
+def _init_worker(handle):
+    global _worker_data
+
+    _worker_data = attach(handle)
+
+def _run_worker_task(task):
+    _, arrays = _worker_data
+
+    return _continue_run(arrays, task)
+
+def _sample(search_space, rng):
+    """
+    Draws a random value for each parameter. Bounds given as integers are
+    sampled as integers, lists as a choice of values.
+    """
+    params = {}
+
+    for name, space in search_space.items():
+        if isinstance(space, list):
+            params[name] = space[rng.integers(len(space))]
+        else:
+            low, high = space
+            if isinstance(low, int) and isinstance(high, int):
+                params[name] = int(rng.integers(low, high + 1))
+            else:
+                params[name] = float(rng.uniform(low, high))
+
+    return params
+
+def _leverage_ordered(params):
+    return params['min_leverage'] <= params['target_leverage'] <= params['max_leverage']
+
+def optimize_parameters(price_data, pool_liquidity_data, model_params,
+                        search_space, objective, n_candidates=64,
+                        stages=(0.25, 0.5, 1), keep_fraction=0.5,
+                        constraint=_leverage_ordered, processes=None,
+                        seed=None):
+    """
+    Random search over model parameters, with early stopping of poorly
+    performing candidates (successive halving).
+
+    All candidates are first evaluated over the first part of the price
+    history. Only the best keep_fraction of candidates at each stage go on
+    to be evaluated over a longer part of the history, up to the full
+    history in the last stage. Each remaining candidate's run continues
+    from its state at the end of the previous stage, rather than starting
+    again from the first timestep.
+
+    Parameters
+    ----------
+    price_data : pd.DataFrame or ModelInputs
+        Ordered token prices at each timestep, or validated inputs.
+    pool_liquidity_data : pd.DataFrame
+        Ordered UST and token pool balances at each timestep. Not used if
+        price_data is a ModelInputs.
+    model_params : dict
+        Dictionary of leveraged_token_model parameters, keyed by name. Used
+        for all parameters not in search_space.
+    search_space : dict
+        Mapping of parameter name to a (low, high) tuple (sampled as integers
+        if both are integers) or a list of values to choose from, e.g.
+        {'min_leverage': (1.5, 2.0), 'rebalance_interval': (1, 24)}.
+    objective : function
+        Function of the summary_metrics dictionary, returning a score to
+        maximise.
+    n_candidates : int
+        Number of random candidates.
+    stages : tuple
+        Increasing fractions of the price history to evaluate candidates
+        over. The last stage should be 1 (full history).
+    keep_fraction : float
+        Fraction of candidates kept after each stage (at least one).
+    constraint : function
+        Function of a full parameter dictionary returning whether it is
+        valid. Invalid samples are redrawn. Defaults to requiring
+        min_leverage <= target_leverage <= max_leverage.
+    processes : int
+        Optional number of worker processes to evaluate candidates across,
+        sharing the price and pool arrays (see SharedModelData).
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    best_params : dict
+        Full parameter dictionary of the best candidate.
+    results : pd.DataFrame
+        Sampled parameters, stage reached, score and summary metrics of each
+        candidate (from the last stage it was evaluated in), best first.
+    """
+    rng = np.random.default_rng(seed)
+
+    candidates = []
+
+    for _ in range(100 * n_candidates):
+        if len(candidates) == n_candidates:
+            break
+        params = {**model_params, **_sample(search_space, rng)}
+        if constraint is None or constraint(params):
+            candidates.append(params)
+
+    if not candidates:
+        raise ValueError('No valid candidates could be sampled from search_space')
+
+    arrays = prepare_inputs(price_data, pool_liquidity_data).arrays
+
+    nt = len(arrays[0])
+
+    scores = np.full(len(candidates), -np.inf)
+
+    metrics = [None] * len(candidates)
+
+    stage_reached = np.zeros(len(candidates), dtype=int)
+
+    active = np.arange(len(candidates))
+
+    # model state and metric totals of each candidate at the end of the
+    # timesteps run so far
+    carries = [SimState() for _ in candidates]
+
+    totals = [None] * len(candidates)
+
+    args = [model_args(params) for params in candidates]
+
+    start = 0
+
+    data = pool = None
+
+    if processes is not None:
+        data = SharedModelData(*arrays)
+
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(data.handle,))
+
+    try:
+        for stage, fraction in enumerate(stages):
+            n_steps = max(start, 1, int(round(nt * fraction)))
+
+            if n_steps > start:
+                tasks = [(start, n_steps, carries[i], totals[i], args[i])
+                         for i in active]
+
+                if pool is None:
+                    results = [_continue_run(arrays, task) for task in tasks]
+                else:
+                    results = pool.map(_run_worker_task, tasks)
+
+                for i, (carry, candidate_totals) in zip(active, results):
+                    carries[i], totals[i] = carry, candidate_totals
+
+                start = n_steps
+
+            for i in active:
+                metrics[i] = _totals_metrics(totals[i])
+                scores[i] = objective(metrics[i])
+                stage_reached[i] = stage
+
+            if stage < len(stages) - 1:
+                # prune all but the best candidates
+                n_keep = max(1, int(np.ceil(len(active) * keep_fraction)))
+
+                order = np.argsort(-np.nan_to_num(scores[active], nan=-np.inf),
+                                   kind='stable')
+
+                active = active[order[:n_keep]]
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if data is not None:
+            data.close()
+
+    results = pd.DataFrame([{name: candidates[i][name] for name in search_space}
+                            for i in range(len(candidates))])
+
+    results['stage'] = stage_reached
+
+    results['score'] = scores
+
+    results = pd.concat([results, pd.DataFrame(metrics)], axis=1)
+
+    # candidates reaching later stages rank first, then by score
+    results = results.sort_values(['stage', 'score'], ascending=False,
+                                  kind='stable')
+
+    return candidates[results.index[0]], results.reset_index(drop=True)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .core import allocate_buffers, simulate_leveraged_token
+from .inputs import prepare_inputs
+
+# model parameters following the price and pool arrays, in order
+_param_names = [name for name in
+                list(inspect.signature(simulate_leveraged_token).parameters)[3:]
+                if name not in ('event_log', 'out', 'carry')]
+
+# parameters which may be given for each timestep
+_schedule_names = ('borrow_rate', 'swap_fee')
+
+def model_args(model_params):
+    """
+    Converts a dictionary of model parameters (keyed by name) to a tuple of
+    positional arguments for simulate_leveraged_token following the arrays,
+    as used for the parameter sets of run_parallel.
+    """
+    arguments = inspect.signature(simulate_leveraged_token).bind_partial(
+        **model_params)
+
+    arguments.apply_defaults()
+
+    return tuple(arguments.arguments[name] for name in _param_names)
+
+def window_args(model_params, start, stop):
+    """
+    Slices any per timestep parameters (borrow_rate and swap_fee schedules)
+    in a tuple of model arguments to timesteps start to stop, to match
+    arrays sliced to the same window.
+    """
+    return tuple(value[start:stop]
+                 if name in _schedule_names and np.ndim(value) > 0 else value
+                 for name, value in zip(_param_names, model_params))
+
+class SharedModelData:
+    """
+    Price and pool balance arrays published once in shared memory, so that
+    worker processes can attach to them without copying or pickling.
+
+    The shared memory is released when the object is closed, or on leaving
+    a with block.
+
+    Parameters
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    pool_x : np.ndarray
+        UST pool balance at each timestep.
+    pool_y : np.ndarray
+        Token pool balance at each timestep.
+    """
+
+    def __init__(self, price, pool_x, pool_y):
+        arrays = np.vstack([price, pool_x, pool_y]).astype(float)
+
+        self._shm = shared_memory.SharedMemory(create=True, size=arrays.nbytes)
+
+        self.shape = arrays.shape
+
+        np.ndarray(self.shape, dtype=float, buffer=self._shm.buf)[:] = arrays
+
+    @classmethod
+    def from_frames(cls, price_data, pool_liquidity_data=None):
+        """
+        Publishes the arrays used by the model from price and pool balance
+        DataFrames, or from ModelInputs.
+        """
+        return cls(*prepare_inputs(price_data, pool_liquidity_data).arrays)
+
+    @property
+    def handle(self):
+        """
+        Small picklable reference passed to worker processes to attach.
+        """
+        return self._shm.name, self.shape
+
+    @property
+    def arrays(self):
+        """
+        Tuple of (price, pool_x, pool_y) views of the shared arrays.
+        """
+        return tuple(np.ndarray(self.shape, dtype=float, buffer=self._shm.buf))
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach(handle):
+    """
+    Attaches to arrays published by SharedModelData in another process.
+
+    Returns
+    -------
+    shm : SharedMemory
+        Shared memory block. Must be kept alive while the arrays are used.
+    arrays : tuple
+        Read only (price, pool_x, pool_y) views of the shared arrays.
+    """
+    name, shape = handle
+
+    shm = shared_memory.SharedMemory(name=name)
+
+    data = np.ndarray(shape, dtype=float, buffer=shm.buf)
+
+    data.flags.writeable = False
+
+    return shm, tuple(data)
+
+
+# shared arrays attached by each worker process
+_worker_data = None
+
+def _init_worker(handle, reduce_fn, n_steps):
+    global _worker_data
+
+    shm, arrays = attach(handle)
+
+    if n_steps is not None:
+        arrays = tuple(array[:n_steps] for array in arrays)
+
+    _worker_data = shm, arrays, reduce_fn
+
+def _run_task(model_params):
+    _, arrays, reduce_fn = _worker_data
+
+    model_params = window_args(model_params, 0, len(arrays[0]))
+
+    state = simulate_leveraged_token(*arrays, *model_params)
+
+    if reduce_fn is not None:
+        return reduce_fn(arrays[0], state)
+
+    return state
+
+def run_parallel(data, param_sets, processes=None, reduce_fn=None, chunksize=1,
+                 n_steps=None):
+    """
+    Runs simulate_leveraged_token for each set of model parameters across a
+    pool of worker processes. Workers attach to the shared price and pool
+    arrays once, and each task only sends its parameters.
+
+    Parameters
+    ----------
+    data : SharedModelData
+        Shared price and pool balance arrays.
+    param_sets : list
+        List of tuples of parameters following the arrays in
+        simulate_leveraged_token, i.e. (target_leverage, min_leverage, ...,
+        arb_params).
+    processes : int
+        Number of worker processes. Defaults to the number of CPUs.
+    reduce_fn : function
+        Optional picklable function reduce_fn(price, state) applied to each
+        result within the worker, e.g. to return summary metrics rather than
+        full arrays.
+    chunksize : int
+        Number of tasks sent to a worker at a time.
+    n_steps : int
+        Optional number of timesteps to simulate, from the start of the
+        arrays.
+
+    Returns
+    -------
+    results : list
+        Model state dictionaries (or reduce_fn results) for each parameter
+        set, in order.
+    """
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(data.handle, reduce_fn, n_steps)) as pool:
+        return pool.map(_run_task, param_sets, chunksize)
+
+def run_threaded(data, param_sets, threads=None, reduce_fn=None, n_steps=None):
+    """
+    Runs simulate_leveraged_token for each set of model parameters across a
+    pool of threads in this process. Threads share the read only price and
+    pool arrays, so there is no process startup, pickling or shared memory
+    overhead, which suits many short runs.
+
+    Runs supported by the compiled kernel (see ltsim.kernel) step through
+    all timesteps without holding the GIL, so threads run them
+    concurrently. Other runs (e.g. with other pool curves) only release the
+    GIL within numpy operations over whole arrays, so run_parallel scales
+    further for them.
+
+    Parameters
+    ----------
+    data : ModelInputs or SharedModelData
+        Price and pool balance arrays.
+    param_sets : list
+        List of tuples of parameters following the arrays in
+        simulate_leveraged_token, as for run_parallel.
+    threads : int
+        Number of threads. Defaults to the number of CPUs.
+    reduce_fn : function
+        Optional function reduce_fn(price, state) applied to each result
+        within its thread. The state arrays are then reused by the next run
+        on the same thread, so reduce_fn must not return them.
+    n_steps : int
+        Optional number of timesteps to simulate, from the start of the
+        arrays.
+
+    Returns
+    -------
+    results : list
+        Model state dictionaries (or reduce_fn results) for each parameter
+        set, in order.
+    """
+    arrays = tuple(array[:n_steps] for array in data.arrays)
+
+    nt = len(arrays[0])
+
+    # state buffers of each thread, only reused when results are reduced
+    local = threading.local()
+
+    def run(model_params):
+        model_params = window_args(model_params, 0, nt)
+
+        if reduce_fn is None:
+            return simulate_leveraged_token(*arrays, *model_params)
+
+        if not hasattr(local, 'buffers'):
+            local.buffers = allocate_buffers(nt)
+
+        state = simulate_leveraged_token(*arrays, *model_params,
+                                         out=local.buffers)
+
+        return reduce_fn(arrays[0], state)
+
+    with ThreadPoolExecutor(threads or os.cpu_count()) as executor:
+        return list(executor.map(run, param_sets))
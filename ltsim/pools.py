@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+class PoolCurve:
+    """
+    Base class for AMM pool pricing curves.
+
+    Subclasses only need to implement amount_out, which maps an input amount
+    and the reserves on either side of the swap to the output amount, using
+    plain arithmetic so it accepts either scalars or numpy arrays. swap
+    quotes a single trade, while quote and apply_trade are vectorised over
+    many trades at once.
+    """
+
+    def __repr__(self):
+        params = ', '.join(f'{name}={value!r}'
+                           for name, value in sorted(vars(self).items()))
+        return f'{type(self).__name__}({params})'
+
+    def amount_out(self, amount_in, reserve_in, reserve_out):
+        """
+        Amount of the output token received (before fees) for offering
+        amount_in of the input token.
+
+        Parameters
+        ----------
+        amount_in : float or np.ndarray
+            Amount of the token being offered.
+        reserve_in : float or np.ndarray
+            Pool balance of the token being offered.
+        reserve_out : float or np.ndarray
+            Pool balance of the token being received.
+        """
+        raise NotImplementedError
+
+    def spot_price(self, pool_x, pool_y):
+        """
+        Marginal price of token y in units of token x.
+        """
+        return pool_x / pool_y
+
+    def swap(self, delta_x, delta_y, pool_x, pool_y, swap_fee, return_usd=True):
+        """
+        Computes the expected receive, spread and commision amounts for a
+        single swap against the pool. Scalar counterpart of quote, used by
+        the trade simulations.
+
+        Parameters
+        ----------
+        delta_x : float
+            Amount of token x being offered. If positive swapping x for y. If
+            negative swapping y for x.
+        delta_y : float
+            Amount of token y being offered.
+        pool_x : float
+            Balance (number of tokens) for token x.
+        pool_y : float
+            Balance (number of tokens) for token y.
+        swap_fee : float
+            Percentage fee charged by AMM for swap execution.
+        return_usd : bool
+            Whether or not to convert token values to USD.
+        """
+        if delta_x > 0:
+            ask = abs(delta_y)
+            out = self.amount_out(delta_x, pool_x, pool_y)
+        elif delta_x < 0:
+            ask = abs(delta_x)
+            out = self.amount_out(delta_y, pool_y, pool_x)
+
+        if return_usd and delta_x > 0:
+            ask *= self.spot_price(pool_x, pool_y)
+            out *= self.spot_price(pool_x, pool_y)
+
+        fee = out * swap_fee / 100
+
+        spread = ask - out
+
+        perc_spread = spread / ask * 100
+
+        received = out - fee
+
+        return received, fee, spread, perc_spread
+
+    def quote(self, delta_x, delta_y, pool_x, pool_y, swap_fee, return_usd=True):
+        """
+        Computes the expected receive, spread and commision amounts for a
+        batch of swaps against the pool. Follows the same conventions as
+        swap.
+
+        Parameters
+        ----------
+        delta_x : np.ndarray
+            Amounts of token x being offered. If positive swapping x for y.
+            If negative swapping y for x.
+        delta_y : np.ndarray
+            Amounts of token y being offered.
+        pool_x : float or np.ndarray
+            Balance (number of tokens) for token x.
+        pool_y : float or np.ndarray
+            Balance (number of tokens) for token y.
+        swap_fee : float or np.ndarray
+            Percentage fee charged by AMM for swap execution.
+        return_usd : bool
+            Whether or not to convert token values to USD.
+
+        Returns
+        -------
+        received, fee, spread, perc_spread : float or np.ndarray
+        """
+        # swap direction as 1 (x for y) or 0 (y for x). Both directions are
+        # blended arithmetically so mixed direction batches need no branching.
+        buy = np.asarray(delta_x) > 0
+
+        sell = 1 - buy
+
+        ask = buy * abs(delta_y) + sell * abs(delta_x)
+
+        out = self.amount_out(buy * delta_x + sell * delta_y,
+                              buy * pool_x + sell * pool_y,
+                              buy * pool_y + sell * pool_x)
+
+        if return_usd:
+            to_usd = buy * self.spot_price(pool_x, pool_y) + sell
+
+            ask = ask * to_usd
+
+            out = out * to_usd
+
+        fee = out * swap_fee / 100
+
+        spread = ask - out
+
+        perc_spread = spread / ask * 100
+
+        received = out - fee
+
+        return received, fee, spread, perc_spread
+
+    def apply_trade(self, delta_x, delta_y, pool_x, pool_y, fraction=1):
+        """
+        Returns pool balances after a fraction of the offered (delta_x) and
+        asked (delta_y) amounts have been added to the pool.
+        """
+        return pool_x + delta_x * fraction, pool_y + delta_y * fraction
+
+
+class ConstantProductCurve(PoolCurve):
+    """
+    Terra Swap style (x * y = k) pools. Based on
+    https://docs.terraswap.io/docs/introduction/mechanism/
+    """
+
+    def amount_out(self, amount_in, reserve_in, reserve_out):
+        return amount_in * reserve_out / (amount_in + reserve_in)
+
+
+class StableSwapCurve(PoolCurve):
+    """
+    Two token stableswap (Curve style) pools with amplification coefficient
+    amp. The invariant is pegged at the current pool price, so the pool is
+    treated as balanced before each swap and amp controls how flat the curve
+    is around that price (amp -> 0 approaches constant product, large amp
+    approaches constant sum).
+
+    Parameters
+    ----------
+    amp : float
+        Amplification coefficient.
+    """
+
+    def __init__(self, amp=100):
+        self.amp = amp
+
+    def amount_out(self, amount_in, reserve_in, reserve_out):
+        # in units of the input token both balances equal reserve_in, so the
+        # invariant D is simply the sum of the balances.
+        d = 2 * reserve_in
+
+        x = reserve_in + amount_in
+
+        # solve the invariant 4A(x + y) + D = 4AD + D^3 / 4xy for y
+        b = x + d / (4 * self.amp) - d
+
+        c = d ** 3 / (16 * self.amp * x)
+
+        y = (-b + (b * b + 4 * c) ** 0.5) / 2
+
+        return (reserve_in - y) * reserve_out / reserve_in
+
+
+class ConcentratedLiquidityCurve(PoolCurve):
+    """
+    Concentrated liquidity (Uniswap v3 style) pools, with all liquidity
+    provided over a price range of [price / range_factor,
+    price * range_factor] around the current pool price.
+
+    Within the range trades follow a constant product curve over virtual
+    reserves, with output limited to the real pool balance.
+
+    Parameters
+    ----------
+    range_factor : float
+        Ratio between the upper price bound and the current price. Must be
+        greater than 1.
+    """
+
+    def __init__(self, range_factor=2):
+        if range_factor <= 1:
+            raise ValueError('range_factor must be greater than 1')
+
+        self.range_factor = range_factor
+
+    @property
+    def amplification(self):
+        """
+        Ratio of virtual to real reserves.
+        """
+        return 1 / (1 - self.range_factor ** -0.5)
+
+    def amount_out(self, amount_in, reserve_in, reserve_out):
+        virtual_in = reserve_in * self.amplification
+
+        virtual_out = reserve_out * self.amplification
+
+        out = amount_in * virtual_out / (amount_in + virtual_in)
+
+        return np.minimum(out, reserve_out)
+
+
+# default curve used by the trade and leveraged token simulations
+CONSTANT_PRODUCT = ConstantProductCurve()
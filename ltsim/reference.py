@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+"""
+Frozen reference implementations of sim_swap, sim_trades, execute_trades
+and leveraged_token_model, as first released and before any performance
+work. They are only used as the baseline for the equivalence harness
+(ltsim/equivalence.py) and must not be changed.
+"""
+import numpy as np
+import pandas as pd
+
+def sim_swap(delta_x, delta_y, pool_x, pool_y, swap_fee, return_usd=True):
+    """
+    Computes the expected receive, spread and commision amounts for
+    Terra Swap style pools (constant product). Based on
+    https://docs.terraswap.io/docs/introduction/mechanism/
+
+
+    Parameters
+    ----------
+    delta_x : float
+        Amount of token x being offered. If positive swapping x for y. If
+        negative swapping y for x.
+    delta_y : float
+        Amount of token y being offered.
+    pool_x : float
+        Balance (number of tokens) for token x.
+    pool_y : float
+        Balance (number of tokens) for token y.
+    swap_fee : float
+        Percentage fee charged by AMM for swap execution.
+    convert_to_usd : bool
+        Whether or not to convert token values to USD.
+    """
+
+    if delta_x > 0:
+        ask = abs(delta_y)
+        out = delta_x * pool_y / (delta_x + pool_x)
+    elif delta_x < 0:
+        ask = abs(delta_x)
+        out = delta_y * pool_x / (delta_y + pool_y)
+
+    if return_usd and delta_x > 0:
+        ask *= pool_x / pool_y
+        out *= pool_x / pool_y
+
+    fee = out * swap_fee / 100
+
+    spread = ask - out
+
+    perc_spread = spread / ask * 100
+
+    received = out - fee
+
+    return received, fee, spread, perc_spread
+
+def sim_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
+               pool_x_i, pool_y_i, swap_fee):
+    """
+    Simulates executing a series of trades, while accounting for AMM
+    conditions throughout the time of swapping.
+
+    Parameters
+    ----------
+    delta_x : float
+        Amount of token x to swap for token y. If negative, it assumes that
+        the equivalent value of token y is traded for token x.
+    max_slippage : float
+        Maximum acceptable slippage for accepting each trade.
+    time_delay : float
+        Time between each trade.
+    arb_effectiveness : float
+        Maximum effectiveness of arbitrage bots in restoring AMM price to its
+        pre trade level.
+    arb_time : float
+        Time taken for arbitrage bots to restore AMM price by
+        arb_effectiveness.
+    pool_x_i : float
+        Initial token balance for pool token x.
+    pool_y_i : float
+        Initial token balance for pool token y.
+    swap_fee : float
+        Percentage fee charged by AMM for swap execution.
+
+    Returns
+    -------
+    trade_actual : float
+        USD value of tokens received for executing each trade.
+
+    """
+
+    # number of timesteps with duration time_delay within each hour
+    nt = int((60 * 60) // time_delay)
+
+    # not all trades may able to be executed due to time delay alone
+    if len(delta_x) > nt:
+        delta_x = delta_x[0:nt]
+
+    # target number of trades to execute
+    nte = len(delta_x)
+
+    # number of trades executed
+    ne = 0
+
+    # USD value of trade to execute at each timestep
+    delta_xt = np.concatenate([delta_x, np.zeros(nt - nte)])
+
+    # Number of tokens being asked (at AMM price)
+    delta_yt = np.zeros(nt)
+
+    # UST (x) and token (y) bool balances before each trade
+    pool_x = np.zeros(nt) + pool_x_i
+
+    pool_y = np.zeros(nt) + pool_y_i
+
+    # trade volume executed at each timestep
+    trade_actual = np.zeros(nt)
+
+    # spread for all trades at each timestep
+    swap_spread = np.zeros(nt)
+
+    # maximum percentage spread across all trades at each timestep
+    swap_perc_spread = np.zeros(nt)
+
+    # swap fees paid for all trades at each timestep
+    swap_fees = np.zeros(nt)
+
+    # no. timesteps to complete arb
+    narb = int(np.ceil(arb_time/time_delay))
+
+    # arb effectiveness in each timestep
+    arb_offset = np.minimum(1, np.linspace(1, narb, narb) * time_delay / arb_time) * arb_effectiveness / 100
+
+    narb_left = 0
+
+    t = 0
+
+    while (ne < nte) and (t < nt):
+
+        delta_yt[t] = - delta_xt[t] / (pool_x[t] / pool_y[t])
+
+        swap = sim_swap(delta_xt[t], delta_yt[t], pool_x[t], pool_y[t], swap_fee)
+
+        perc_spread = swap[3]
+
+        swap_perc_spread[t] = perc_spread
+
+        # slippage will always exceed max slippage & all trades will fail
+        if ((t == 0) or (narb_left == 0)) and (perc_spread > max_slippage):
+            break
+
+        if perc_spread < max_slippage:
+            pool_x[t:] += delta_xt[t] * (1 - arb_offset[0])
+
+            pool_y[t:] += delta_yt[t] * (1 - arb_offset[0])
+
+            narb_left = narb - 1
+
+            trade_actual[t] = swap[0]
+
+            swap_fees[t] = swap[1]
+
+            swap_spread[t] = swap[2]
+
+            ne += 1
+        else:
+            # trade is rejected due to slippage exceeding acceptable level.
+            # trades are shifted by a length of time equal to time_delay
+
+            if narb_left > 0:
+                # arbitrage continues, if time delay is smaller
+                # than arb time.
+                pool_x[t:] -= delta_xt[t-1] * arb_offset[narb-narb_left]
+
+                pool_y[t:] -= delta_yt[t-1] * arb_offset[narb-narb_left]
+
+                narb_left -= 1
+
+            delta_xt[t+1:] = delta_xt[t:nt-1]
+
+            delta_yt[t+1:] = delta_yt[t:nt-1]
+
+        t += 1
+
+    return trade_actual, swap_fees, swap_spread, swap_perc_spread
+
+def execute_trades(trade_vol, max_trade, max_slippage, trade_delay,
+                   arb_effectiveness, arb_time, pool_liquidity, swap_fee):
+    """
+    Divides trade_vol into a number of equally sized trades for execution.
+    Actual swap volumes reflect market conditions including spread and
+    arbitrage.
+
+
+    Parameters
+    ----------
+    trade_vol : float
+        Total value of swaps required to execute. Can be either positive
+        or negative (indicates direction of trade).
+    max_trade : float
+        Maximum value per swap.
+    max_slippage : float
+        Maximum acceptable slippage for accepting each trade.
+    time_delay : float
+        Time between each trade.
+    arb_effectiveness : float
+        Maximum effectiveness of arbitrage bots in restoring AMM price to its
+        pre trade level.
+    arb_time : float
+        Time taken for arbitrage bots to restore AMM price by
+        arb_effectiveness.
+    pool_liquidity : float
+        Dictionary of initial pool token balances.
+    swap_fee : float
+        Percentage fee charged by AMM for swap execution.
+
+    """
+    if trade_vol == 0:
+        return 0, 0, 0, 0, 0
+
+    # swap direction:
+    # if +ve: borrowing more UST and swapping UST for token
+    # if -ve: borrowing less UST and swapping token for UST
+    direction = abs(trade_vol) / trade_vol
+
+    # number of max_volume trades
+    n = int(abs(trade_vol) // max_trade)
+
+    # remainder volume (assume to be last trade)
+    rem_vol = abs(trade_vol) - max_trade * n
+
+    # array of desired USD swap volumes to execute
+    if rem_vol > 0:
+        trades = direction * np.array([max_trade] * n + [rem_vol])
+    else:
+        trades = direction * np.array([max_trade] * n)
+
+    # Value of swaps executed. Not all trades may execute
+    # due to maximum slippage, or not enough time due to trade delay.
+    received, fees, spread, perc_spread = sim_trades(trades, max_slippage, trade_delay,
+                                                     arb_effectiveness, arb_time,
+                                                     pool_liquidity['pool_x_i'],
+                                                     pool_liquidity['pool_y_i'],
+                                                     swap_fee)
+
+    received_tot = direction * received.sum()
+    
+    offered_tot = direction * (received + fees + spread).sum()
+    
+    return received_tot, offered_tot, fees.sum(), spread.sum(), perc_spread.max()
+
+def calc_drawdown(data):
+
+    data = pd.Series(data)
+
+    cummax_data = data.cummax()
+
+    return (data - cummax_data) / cummax_data
+
+def calc_rebal_lev(leverage, target_leverage, recentering_speed):
+
+    if leverage > target_leverage:
+        rebalance_leverage = max(target_leverage, leverage - recentering_speed)
+    else:
+        rebalance_leverage = min(target_leverage, leverage + recentering_speed)
+
+    return rebalance_leverage
+
+def is_periodic_rebal_allowed(t, last_rebalanced, rebalance_interval):
+    return t >= last_rebalanced + rebalance_interval
+
+def leveraged_token_model(price_data, pool_liquidity_data,
+                          target_leverage, min_leverage,
+                          max_leverage, congestion_time,
+                          rebalance_interval, recentering_speed_periodic,
+                          recentering_speed_emergency,
+                          trade_params_periodic, trade_params_emergency,
+                          borrow_rate, liq_thresh, liq_premium,
+                          n_tokens_issued, swap_fee, arb_params):
+    """
+    Simulates the performance of leveraged tokens managed through a combination
+    of periodic and emergency leverage rebalancing rules.
+
+    Parameters
+    ----------
+    price_data : pd.DataFrame
+        Ordered token prices at each timestep.
+    pool_liquidity_data : pd.DataFrame
+        Ordered UST and token pool balances at each timestep.
+    target_leverage : float
+        Target leverage for the leveraged token to maintain.
+    min_leverage : float
+        Minimum allowable leverage before emergency rebalance is triggered.
+    max_leverage : float
+        Maximum allowable leverage before emergency rebalance is triggered.
+    congestion_time : float
+        Minimum number of timesteps before emergency rebalance is executed.
+    rebalance_interval : int
+        Number of timesteps between periodic rebalances.
+    recentering_speed_periodic : float
+        Absolute change in leverage for each periodic rebalance.
+    recentering_speed_emergency : float
+        Absolute change in leverage for each emergency rebalance.
+    trade_params_periodic : tuple
+        A tuple with the parameters (max_trade_vol, max_slippage, trade_delay)
+        for periodic rebalancing.
+    trade_params_emergency : tuple
+        A tuple with the parameters (max_trade_vol, max_slippage, trade_delay)
+        for emergency rebalancing.
+    borrow_rate : float
+        Annual percentage borrowing rate.
+    liq_thresh : float
+        Loan to value threshold before position is liquidated.
+    liq_premium : float
+        Percentage of collateral that is forfeit as premium to liquidators.
+    n_tokens_issued : int
+        Number of leveraged tokens on issue (constant over time).
+    swap_fee : float
+        Percentage fee charged by the DEX for swaps.
+    arb_params : tuple
+        A tuple containing the params (arb_effectiveness, arb_time).
+
+    Returns
+    -------
+    data : pd.DataFrame
+        Dataframe containing key model variables.
+
+    """
+    price = price_data['PRICE'].values
+
+    try:
+        dates = price_data['DATE'].values
+    except:
+        dates = np.arange(0, len(price))
+
+    try:
+        hours = price_data['DATE'].dt.hour.values
+    except:
+        hours = np.zeros(len(price))
+
+    nt = len(price)
+
+    # total (net) number of leveraged tokens issued over time
+    # equal to expected cummulative (subscriptions - redemptions)
+    n_tokens = np.zeros(nt) + n_tokens_issued
+
+    # number of underlying tokens per leveraged token
+    n_underlying = np.zeros(nt)
+
+    # amount borrowed ($) per leveraged token
+    borrowed = np.zeros(nt)
+
+    # actual leverage ratio per leveraged token
+    leverage = np.zeros(nt)
+
+    # target rebalance amount ($) for all issued leveraged tokens
+    target_rebalance_amount = np.zeros(nt)
+
+    # amount received for sucessful rebalancing trades ($),
+    # for all issued leveraged tokens
+    rebalance_amount = np.zeros(nt)
+    
+    # amount offered for sucessful rebalancing trades ($),
+    # for all issued leveraged tokens
+    offered_amount = np.zeros(nt)
+
+    # swap fees paid ($) for all issued leveraged tokens
+    swap_fees = np.zeros(nt)
+
+    # spread value ($) for all issued leveraged tokens
+    swap_spread = np.zeros(nt)
+
+    # highest percentage spread (%) at each timestep
+    max_swap_perc_spread = np.zeros(nt)
+
+    # boolean variable tracking if emergency rebalance was executed
+    emergency_rebalances = np.zeros(nt)
+
+    # boolean variable tracking if periodic rebalance was executed
+    periodic_rebalances = np.zeros(nt)
+
+    # cummulative duration of time where leverage remains out of bounds
+    exceedance_time = np.zeros(nt)
+
+    # loan to value ratio
+    ltv = np.zeros(nt)
+
+    # amount liquidated
+    liquidation_amount = np.zeros(nt)
+
+    n_underlying[0:] = target_leverage
+
+    borrowed[0:] = price[0] * (target_leverage - 1)
+
+    last_rebalanced = 0
+
+    for t in range(nt):
+
+        if borrowed[t] > 0:
+            ltv[t] = borrowed[t] / (n_underlying[t] * price[t])
+        else:
+            ltv[t] = np.nan
+
+        # liquidation logic
+        if ltv[t] >= liq_thresh / 100:
+
+            # balance before liquidation
+            collateral_before = n_underlying[t] * price[t] - borrowed[t]
+
+            # premium amount claimed by liquidators
+            liquidation_amount[t] = collateral_before * liq_premium / 100
+
+            # remaining balance after liquidation
+            collateral_after = collateral_before - liquidation_amount[t]
+
+            if collateral_after <= 0:
+                # all issued leveraged tokens are now worth 0 and removed
+                n_underlying[t] = 0
+                borrowed[t] = 0
+            else:
+                # % of position value is liquidated and lost.
+                # remaining is used to reconstruct tokens based on target leverage
+                n_underlying[t:] = collateral_after / price[t]
+                borrowed[t:] = 0
+
+        current_value = n_underlying[t] * price[t]
+
+        leverage[t] = current_value / (current_value - borrowed[t])
+
+        outside_lev_range = (leverage[t] < min_leverage) | (leverage[t] > max_leverage)
+
+        # Continuous duration that leverage bounds are exceeded for
+        if outside_lev_range:
+            exceedance_time[t] = 1 + exceedance_time[t-1]
+        else:
+            exceedance_time[t] = 0
+
+        emergency_rebal_allowed = (outside_lev_range
+                                   & (exceedance_time[t] >= congestion_time))
+
+        periodic_rebal_allowed = is_periodic_rebal_allowed(t, last_rebalanced,
+                                                           rebalance_interval)
+
+        rebal_allowed = ((leverage[t] != target_leverage)
+                         and (n_tokens[t] > 0)
+                         and (n_underlying[t] > 1e-3)
+                         and (emergency_rebal_allowed or periodic_rebal_allowed))
+
+        if rebal_allowed:
+            if emergency_rebal_allowed:
+                trade_params = trade_params_emergency
+                recentering_speed = recentering_speed_emergency
+
+                emergency_rebalances[t] = 1
+            elif periodic_rebal_allowed:
+                trade_params = trade_params_periodic
+                recentering_speed = recentering_speed_periodic
+
+                periodic_rebalances[t] = 1
+                last_rebalanced = t
+
+            # leverage target for rebalancing
+            rebalance_leverage = calc_rebal_lev(leverage[t], target_leverage,
+                                                recentering_speed)
+
+            # required change in borrowing for rebalancing
+            delta_borrow = (rebalance_leverage * (current_value - borrowed[t])
+                            - current_value)
+
+            pool_liquidity = pool_liquidity_data.iloc[t][['pool_x_i','pool_y_i']].to_dict()
+
+            target_rebalance_amount[t] = n_tokens[t] * delta_borrow
+
+            trade = execute_trades(target_rebalance_amount[t],
+                                   *trade_params,
+                                   *arb_params,
+                                   pool_liquidity,
+                                   swap_fee)
+
+            rebalance_amount[t] = trade[0]
+            
+            offered_amount[t] = trade[1]
+
+            swap_fees[t] = trade[2]
+
+            swap_spread[t] = trade[3]
+
+            max_swap_perc_spread[t] = trade[4]
+
+        if target_rebalance_amount[t] > 0:
+            # Debt increased by the amount offered for successful trades.
+            # Borrowed UST is swapped for tokens (amount received is lower
+            # due to fees + spread).
+            borrowed[t:] += offered_amount[t] / n_tokens[t]
+
+            n_underlying[t:] += rebalance_amount[t] / n_tokens[t] / price[t]
+
+        else:
+            # Underlying tokens are swapped for UST and used to decrease debt.
+            borrowed[t:] += rebalance_amount[t] / n_tokens[t]
+
+            n_underlying[t:] += offered_amount[t] / n_tokens[t] / price[t]
+
+        # Hourly debt interest accural
+        borrowed[t:] += (borrow_rate / 100 / 365 / 24) * borrowed[t]
+
+    # hourly value of the leveraged token
+    lt_value = (n_underlying * price - borrowed)
+
+    # running drawdown for underlying token price
+    drawdown_underlying = calc_drawdown(price)
+
+    # running drawdown for leveraged token value
+    drawdown_lt = calc_drawdown(lt_value)
+
+    min_leverage_arr = np.zeros(nt) + min_leverage
+
+    max_leverage_arr = np.zeros(nt) + max_leverage
+
+    # hour on hour change in leveraged token value
+    hourly_return = np.zeros(len(lt_value))
+
+    # percentage daily return
+    hourly_return_perc = np.zeros(len(lt_value))
+
+    # cummulative change in leveraged token value
+    cummulative_return = np.zeros(len(lt_value))
+
+    # percentage cummulative change
+    cummulative_return_perc = np.zeros(len(lt_value))
+
+    hourly_return[1:] = (lt_value[1:] - lt_value[:-1])
+
+    hourly_return_perc[1:] = (lt_value[1:] - lt_value[:-1]) / lt_value[:-1]
+
+    cummulative_return[1:] = (lt_value[1:] - lt_value[0])
+
+    cummulative_return_perc[1:] = (lt_value[1:] - lt_value[0]) / lt_value[0]
+
+    rebalance_shortfall = (abs(target_rebalance_amount)
+                           - (abs(rebalance_amount) + swap_fees + swap_spread))
+
+    res = pd.DataFrame({'date': dates,
+                        'hour': hours,
+                        'underlying_token_price': price,
+                        'leveraged_token_value': lt_value,
+                        'drawdown_underlying': drawdown_underlying,
+                        'drawdown_leveraged': drawdown_lt,
+                        'n_tokens_per_lt': n_underlying,
+                        'underlying_value_per_lt': n_underlying * price,
+                        'debt_per_lt': borrowed,
+                        'leverage': leverage,
+                        'total_underlying_value': n_tokens * n_underlying * price,
+                        'total_debt': n_tokens * borrowed,
+                        'hourly_return': hourly_return,
+                        'hourly_return_perc': hourly_return_perc,
+                        'cummulative_return': cummulative_return,
+                        'cummulative_return_perc': cummulative_return_perc,
+                        'target_rebalance_amount': target_rebalance_amount,
+                        'rebalance_amount': rebalance_amount,
+                        'offered_amount': offered_amount,
+                        'swap_fees' : swap_fees,
+                        'swap_spread': swap_spread,
+                        'max_swap_perc_spread': max_swap_perc_spread,
+                        'rebalance_shortfall': rebalance_shortfall,
+                        'loan_to_value_ratio': ltv,
+                        'liquidation_amount': n_tokens * liquidation_amount,
+                        'emergency_rebalance': emergency_rebalances,
+                        'periodic_rebalance': periodic_rebalances,
+                        'min_leverage_arr': min_leverage_arr,
+                        'max_leverage_arr': max_leverage_arr})
+    return res
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from .core import calc_drawdown, simulate_leveraged_token
+from .data import get_model_data, token_pools
+from .inputs import ModelInputs, prepare_inputs
+from .optimize import summary_metrics
+from .parallel import model_args
+
+_array_names = ('price', 'pool_x', 'pool_y', 'dates', 'hours')
+
+class ScenarioLibrary:
+    """
+    Library of historical scenarios (e.g. crash windows) stored on disk.
+
+    Each scenario holds the validated, aligned price and pool balance arrays
+    of every token over its window, as one .npy file per array. Scenarios
+    are loaded as memory mapped ModelInputs, so replays skip the DataFrame
+    slicing and validation, and worker processes share the same pages.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to store scenarios in. Created if it does not exist.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._index_path = os.path.join(directory, 'scenarios.json')
+
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def __contains__(self, name):
+        return name in self.index
+
+    @property
+    def names(self):
+        """
+        Names of all stored scenarios.
+        """
+        return list(self.index)
+
+    def tokens(self, name):
+        """
+        Tokens with data over the window of scenario name.
+        """
+        return list(self.index[name]['tokens'])
+
+    def _token_dir(self, name, token):
+        return os.path.join(self.directory, name, token)
+
+    def _write_index(self):
+        tmp_path = self._index_path + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=1)
+
+        os.replace(tmp_path, self._index_path)
+
+    def add(self, name, min_date, max_date, all_token_prices,
+            all_pool_liquidity, tokens=None):
+        """
+        Extracts and stores the data of each token between min_date and
+        max_date as scenario name, replacing any existing scenario of the
+        same name. Tokens without data over the window are skipped.
+
+        Parameters
+        ----------
+        name : str
+            Scenario name, e.g. 'may_2021_crash'.
+        min_date, max_date : str or pd.Timestamp
+            Start and end of the scenario window.
+        all_token_prices : pd.DataFrame
+            Price data of all tokens, from get_all_model_data.
+        all_pool_liquidity : pd.DataFrame
+            Pool balance data of all tokens, from get_all_model_data.
+        tokens : list
+            Tokens to store. Defaults to all tokens in token_pools.
+
+        Returns
+        -------
+        tokens : list
+            Tokens stored.
+        """
+        stored = []
+
+        for token in tokens or token_pools:
+            price_data, pool_liquidity = get_model_data(
+                all_token_prices, all_pool_liquidity, token, min_date, max_date)
+
+            if len(price_data) == 0:
+                continue
+
+            inputs = prepare_inputs(price_data, pool_liquidity)
+
+            token_dir = self._token_dir(name, token)
+
+            os.makedirs(token_dir, exist_ok=True)
+
+            for array_name in _array_names:
+                np.save(os.path.join(token_dir, f'{array_name}.npy'),
+                        getattr(inputs, array_name))
+
+            stored.append(token)
+
+        self.index[name] = {'min_date': str(min_date),
+                            'max_date': str(max_date),
+                            'tokens': stored}
+
+        self._write_index()
+
+        return stored
+
+    def load(self, name, token):
+        """
+        Returns the ModelInputs of token over scenario name, memory mapped
+        from disk.
+        """
+        if token not in self.index[name]['tokens']:
+            raise KeyError(f'No data for {token} in scenario {name!r}')
+
+        token_dir = self._token_dir(name, token)
+
+        return ModelInputs(*(np.load(os.path.join(token_dir, f'{array_name}.npy'),
+                                     mmap_mode='r')
+                             for array_name in _array_names))
+
+
+def _replay_metrics(inputs, model_params):
+    state = simulate_leveraged_token(*inputs.arrays, *model_params)
+
+    metrics = summary_metrics(inputs.price, state)
+
+    metrics['max_drawdown_underlying'] = np.nanmin(calc_drawdown(inputs.price))
+
+    return metrics
+
+# library opened by each worker process, and its loaded scenarios
+_worker_library = None
+
+_worker_inputs = {}
+
+def _init_worker(directory):
+    global _worker_library
+
+    _worker_library = ScenarioLibrary(directory)
+
+def _run_worker_task(task):
+    name, token, model_params = task
+
+    if (name, token) not in _worker_inputs:
+        _worker_inputs[name, token] = _worker_library.load(name, token)
+
+    return _replay_metrics(_worker_inputs[name, token], model_params)
+
+def replay_scenarios(library, configs, scenarios=None, tokens=None,
+                     processes=None, chunksize=1):
+    """
+    Replays every combination of scenario, token and model configuration,
+    returning a comparison table of liquidations, rebalance shortfall and
+    drawdown.
+
+    Parameters
+    ----------
+    library : ScenarioLibrary
+        Library of stored scenarios.
+    configs : dict
+        Mapping of configuration name to a dictionary of
+        leveraged_token_model parameters.
+    scenarios : list
+        Names of scenarios to replay. Defaults to all scenarios in library.
+    tokens : list
+        Tokens to replay. Defaults to all tokens stored for each scenario.
+    processes : int
+        If given, replays are run across this many worker processes, which
+        memory map the scenario arrays from disk. Otherwise replays are run
+        in turn.
+    chunksize : int
+        Number of replays sent to a worker at a time.
+
+    Returns
+    -------
+    table : pd.DataFrame
+        One row for each scenario, token and configuration, with the
+        number and total amount of liquidations, total rebalance shortfall,
+        maximum drawdown of the leveraged and underlying tokens (negative
+        fractions) and total return.
+    """
+    keys = [(name, token, config) for name in scenarios or library.names
+            for token, config in itertools.product(library.tokens(name), configs)
+            if tokens is None or token in tokens]
+
+    tasks = [(name, token, model_args(configs[config]))
+             for name, token, config in keys]
+
+    if processes is None:
+        metrics = [_replay_metrics(library.load(name, token), model_params)
+                   for name, token, model_params in tasks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(library.directory,)) as pool:
+            metrics = pool.map(_run_worker_task, tasks, chunksize)
+
+    table = pd.DataFrame(keys, columns=['scenario', 'token', 'config'])
+
+    metrics = pd.DataFrame(metrics, columns=['n_liquidations',
+                                             'liquidation_amount',
+                                             'rebalance_shortfall',
+                                             'max_drawdown',
+                                             'max_drawdown_underlying',
+                                             'total_return'])
+
+    return pd.concat([table, metrics], axis=1)
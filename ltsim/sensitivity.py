@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+import dataclasses
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from .core import SimState, calc_drawdown, simulate_leveraged_token
+from .inputs import prepare_inputs
+from .parallel import SharedModelData, attach, model_args, window_args
+
+# parameters analysed by default. leverage_band is the width of the
+# (min_leverage, max_leverage) band, widened equally on both sides.
+sensitivity_params = ('borrow_rate', 'swap_fee', 'liq_thresh', 'leverage_band')
+
+def _base_value(model_params, name):
+    if name == 'leverage_band':
+        return model_params['max_leverage'] - model_params['min_leverage']
+    # schedules are perturbed by shifting every value, relative to the mean
+    return np.mean(model_params[name])
+
+def _perturb(model_params, name, step):
+    params = dict(model_params)
+
+    if name == 'leverage_band':
+        params['min_leverage'] -= step / 2
+        params['max_leverage'] += step / 2
+    else:
+        params[name] = params[name] + step
+
+    return params
+
+def value_metrics(lt_value):
+    """
+    Final leveraged token value and maximum drawdown (as a negative
+    fraction) of a series of leveraged token values.
+    """
+    return lt_value[-1], np.nanmin(calc_drawdown(lt_value))
+
+def case_metrics(price, state):
+    """
+    Final leveraged token value and maximum drawdown (as a negative
+    fraction) from a model state.
+    """
+    return value_metrics(state['n_underlying'] * price - state['borrowed'])
+
+def divergence_step(state, base_params, case_params):
+    """
+    First timestep at which a run with case_params can differ from the base
+    run with base_params, given the base run's model state. Up to this
+    timestep both runs make the same liquidation and rebalancing decisions,
+    so they have the same state.
+
+    Differences in liq_thresh only matter once the loan to value ratio is
+    between the two thresholds, differences in min_leverage or max_leverage
+    once the leverage is between the two bounds, swap_fee at the first
+    trade and borrow_rate once there is debt. Runs differing in any other
+    parameter diverge at the first timestep.
+
+    Returns
+    -------
+    step : int
+        Timestep of divergence, or the number of timesteps if the runs
+        never differ.
+    """
+    nt = len(state['ltv'])
+
+    changed = [name for name in case_params
+               if not np.array_equal(case_params[name], base_params[name])]
+
+    # timesteps where the runs may differ, for each changed parameter
+    differs = np.zeros(nt, dtype=bool)
+
+    for name in changed:
+        if name == 'liq_thresh':
+            ltv = state['ltv']
+            differs |= ((ltv >= base_params[name] / 100)
+                        != (ltv >= case_params[name] / 100))
+        elif name in ('min_leverage', 'max_leverage'):
+            leverage = state['leverage']
+            differs |= ((leverage < base_params[name])
+                        != (leverage < case_params[name]))
+            differs |= ((leverage > base_params[name])
+                        != (leverage > case_params[name]))
+        elif name == 'swap_fee':
+            differs |= state['target_rebalance_amount'] != 0
+            if base_params.get('liquidation_cascade'):
+                differs |= state['liquidation_amount'] != 0
+        elif name == 'borrow_rate':
+            differs |= state['borrowed'] != 0
+        else:
+            return 0
+
+    return int(differs.argmax()) if differs.any() else nt
+
+def _case_tasks(price, pool_x, pool_y, base_params, base_state, cases):
+    """
+    Divergence step of each case, and a task (step, carry, model_args) for
+    each case that diverges from the base run. carry is the base run's
+    state at the step, from rerunning the base case in segments split at
+    each step.
+    """
+    nt = len(price)
+
+    steps = [divergence_step(base_state, base_params, case) for case in cases]
+
+    base_args = model_args(base_params)
+
+    carry = SimState()
+
+    carries = {0: SimState()}
+
+    bounds = sorted({step for step in steps if 0 < step < nt})
+
+    for start, stop in zip([0] + bounds, bounds):
+        simulate_leveraged_token(price[start:stop], pool_x[start:stop],
+                                 pool_y[start:stop],
+                                 *window_args(base_args, start, stop),
+                                 carry=carry)
+
+        carries[stop] = dataclasses.replace(carry)
+
+    tasks = [(step, carries[step], model_args(case))
+             for case, step in zip(cases, steps) if step < nt]
+
+    return steps, tasks
+
+def _run_suffix(price, pool_x, pool_y, task):
+    # leveraged token value of a case from its divergence step onwards
+    start, carry, model_params = task
+
+    nt = len(price)
+
+    state = simulate_leveraged_token(price[start:], pool_x[start:],
+                                     pool_y[start:],
+                                     *window_args(model_params, start, nt),
+                                     carry=dataclasses.replace(carry))
+
+    return state['n_underlying'] * price[start:] - state['borrowed']
+
+# shared arrays attached by each worker process
+_worker_data = None
+
+def _init_worker(handle):
+    global _worker_data
+
+    _worker_data = attach(handle)
+
+def _run_worker_task(task):
+    _, arrays = _worker_data
+
+    return _run_suffix(*arrays, task)
+
+def run_cases(price, pool_x, pool_y, cases, processes=None):
+    """
+    Runs a batch of model parameter cases over the same price and pool
+    arrays, returning the final value and maximum drawdown of each.
+
+    The first case is the base case, which is run in full. The other cases
+    follow the base run until their parameters first change a liquidation
+    or rebalancing decision (see divergence_step), so each is only run from
+    that timestep, continuing from the base run's state. Cases which never
+    diverge reuse the base run's results.
+
+    Parameters
+    ----------
+    price : np.ndarray
+        Token price at each timestep.
+    pool_x : np.ndarray
+        UST pool balance at each timestep.
+    pool_y : np.ndarray
+        Token pool balance at each timestep.
+    cases : list
+        List of dictionaries of leveraged_token_model parameters, starting
+        with the base case.
+    processes : int
+        If given, the diverging parts of cases are run across this many
+        worker processes sharing the arrays. Otherwise they are run in turn.
+
+    Returns
+    -------
+    metrics : np.ndarray
+        Array of (final_value, max_drawdown) for each case.
+    """
+    base_params, cases = cases[0], cases[1:]
+
+    base_state = simulate_leveraged_token(price, pool_x, pool_y,
+                                          *model_args(base_params))
+
+    base_value = base_state['n_underlying'] * price - base_state['borrowed']
+
+    steps, tasks = _case_tasks(price, pool_x, pool_y, base_params, base_state,
+                               cases)
+
+    if processes is None:
+        suffixes = [_run_suffix(price, pool_x, pool_y, task) for task in tasks]
+    else:
+        with SharedModelData(price, pool_x, pool_y) as data:
+            with multiprocessing.Pool(processes, initializer=_init_worker,
+                                      initargs=(data.handle,)) as pool:
+                suffixes = pool.map(_run_worker_task, tasks)
+
+    suffixes = iter(suffixes)
+
+    metrics = [value_metrics(base_value)]
+
+    for step in steps:
+        if step < len(price):
+            metrics.append(value_metrics(np.concatenate([base_value[:step],
+                                                         next(suffixes)])))
+        else:
+            metrics.append(metrics[0])
+
+    return np.array(metrics, dtype=float).reshape(len(cases) + 1, 2)
+
+def sensitivity_analysis(price_data, pool_liquidity_data, model_params,
+                         parameters=sensitivity_params, rel_step=0.01,
+                         processes=None):
+    """
+    Sensitivity of the final leveraged token value and maximum drawdown to
+    model parameters, using central finite differences.
+
+    The base case and the two perturbed cases for each parameter are run as
+    a single batch (see run_cases) over the same extracted price and pool
+    arrays. Perturbed cases share the base run up to the first timestep
+    the perturbation changes a decision, and are only simulated from there.
+
+    Parameters
+    ----------
+    price_data : pd.DataFrame or ModelInputs
+        Ordered token prices at each timestep, or validated inputs.
+    pool_liquidity_data : pd.DataFrame
+        Ordered UST and token pool balances at each timestep. Not used if
+        price_data is a ModelInputs.
+    model_params : dict
+        Dictionary of leveraged_token_model parameters for the base case,
+        keyed by name (e.g. target_leverage, min_leverage, ...).
+    parameters : tuple
+        Names of the parameters to analyse. May include any numeric model
+        parameter (per timestep schedules are shifted by the same step at
+        every timestep), or leverage_band.
+    rel_step : float
+        Perturbation of each parameter, relative to its base value (or
+        absolute if the base value is zero).
+    processes : int
+        Optional number of worker processes to run cases across.
+
+    Returns
+    -------
+    table : pd.DataFrame
+        Base value, step, gradient and elasticity of the final value and
+        maximum drawdown for each parameter.
+    """
+    price, pool_x, pool_y = prepare_inputs(price_data,
+                                           pool_liquidity_data).arrays
+
+    values = np.array([_base_value(model_params, name) for name in parameters],
+                      dtype=float)
+
+    steps = rel_step * np.where(values != 0, np.abs(values), 1)
+
+    cases = [model_params]
+
+    for name, step in zip(parameters, steps):
+        cases.append(_perturb(model_params, name, step))
+        cases.append(_perturb(model_params, name, -step))
+
+    metrics = run_cases(price, pool_x, pool_y, cases, processes)
+
+    base = metrics[0]
+
+    up, down = metrics[1::2], metrics[2::2]
+
+    gradient = (up - down) / (2 * steps[:, None])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elasticity = gradient * values[:, None] / base
+
+    return pd.DataFrame({'parameter': parameters,
+                         'value': values,
+                         'step': steps,
+                         'final_value': base[0],
+                         'final_value_gradient': gradient[:, 0],
+                         'final_value_elasticity': elasticity[:, 0],
+                         'max_drawdown': base[1],
+                         'max_drawdown_gradient': gradient[:, 1],
+                         'max_drawdown_elasticity': elasticity[:, 1]})
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 
+from .pools import CONSTANT_PRODUCT
+
 def sim_swap(delta_x, delta_y, pool_x, pool_y, swap_fee, return_usd=True):
     """
     Computes the expected receive, spread and commision amounts for
@@ -21,33 +23,212 @@ def sim_swap(delta_x, delta_y, pool_x, pool_y, swap_fee, return_usd=True):
         Balance (number of tokens) for token y.
     swap_fee : float
         Percentage fee charged by AMM for swap execution.
-    convert_to_usd : bool
+    return_usd : bool
         Whether or not to convert token values to USD.
     """
 
-    if delta_x > 0:
-        ask = abs(delta_y)
-        out = delta_x * pool_y / (delta_x + pool_x)
-    elif delta_x < 0:
-        ask = abs(delta_x)
-        out = delta_y * pool_x / (delta_y + pool_y)
+    return CONSTANT_PRODUCT.swap(delta_x, delta_y, pool_x, pool_y, swap_fee,
+                                 return_usd)
+
+class TradeEvent:
+    """
+    Record of a single trade attempted against the pool, which was either
+    executed or rejected for exceeding the maximum slippage.
+
+    Attributes
+    ----------
+    hour : int
+        Model timestep (hour) the trade was made in.
+    kind : str
+        Reason for trading, e.g. 'periodic', 'emergency' or 'liquidation'.
+    step : int
+        Index of the trade attempt within the hour.
+    time : float
+        Time (seconds) from the start of the hour.
+    delta_x : float
+        Value offered (USD). If negative, token y is swapped for token x.
+    delta_y : float
+        Number of tokens asked (at the pool price).
+    pool_x, pool_y : float
+        Pool balances before the trade.
+    received, fee, spread, perc_spread : float
+        Swap amounts (see PoolCurve.swap). received, fee and spread are zero
+        for rejected trades.
+    executed : bool
+        Whether the trade was executed.
+    """
+    __slots__ = ('hour', 'kind', 'step', 'time', 'delta_x', 'delta_y',
+                 'pool_x', 'pool_y', 'received', 'fee', 'spread',
+                 'perc_spread', 'executed')
+
+    def __init__(self, hour, kind, step, time, delta_x, delta_y, pool_x,
+                 pool_y, received, fee, spread, perc_spread, executed):
+        self.hour = hour
+        self.kind = kind
+        self.step = step
+        self.time = time
+        self.delta_x = delta_x
+        self.delta_y = delta_y
+        self.pool_x = pool_x
+        self.pool_y = pool_y
+        self.received = received
+        self.fee = fee
+        self.spread = spread
+        self.perc_spread = perc_spread
+        self.executed = executed
+
+    def __repr__(self):
+        params = ', '.join(f'{name}={getattr(self, name)!r}'
+                           for name in self.__slots__)
+        return f'{type(self).__name__}({params})'
+
+
+class TradeLog:
+    """
+    Sparse log of trades attempted by execute_trades, for auditing. Only
+    attempted trades are recorded, rather than every trade timestep.
+
+    hour and kind are set by the caller (e.g. simulate_leveraged_token)
+    before each call of execute_trades, and attached to every trade
+    recorded.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.hour = 0
+        self.kind = 'trade'
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def record(self, step, time, delta_x, delta_y, pool_x, pool_y, swap,
+               executed):
+        if executed:
+            received, fee, spread, perc_spread = swap
+        else:
+            received = fee = spread = 0
+            perc_spread = swap[3]
+
+        self.events.append(TradeEvent(self.hour, self.kind, step, time,
+                                      delta_x, delta_y, pool_x, pool_y,
+                                      received, fee, spread, perc_spread,
+                                      executed))
+
+    def to_frame(self):
+        """
+        Returns the log as a DataFrame, one row per trade.
+        """
+        import pandas as pd
+
+        return pd.DataFrame([[getattr(event, name) for name in TradeEvent.__slots__]
+                             for event in self.events],
+                            columns=TradeEvent.__slots__)
+
+
+def _run_trades(delta_x, max_slippage, time_delay, arb_effectiveness,
+                arb_time, pool_x, pool_y, swap_fee, pool_curve, record=None):
+    """
+    Trade loop shared by sim_trades and execute_trades. Pool balances are
+    carried from trade to trade, and each trade is passed to the optional
+    record function instead of being stored for every timestep.
+
+    Returns
+    -------
+    received, fees, spread : float
+        Totals over executed trades.
+    max_perc_spread : float
+        Highest percentage spread of any attempted trade (at least zero if
+        not every timestep had a trade attempt, and zero if no trade could
+        be attempted, i.e. time_delay is longer than an hour).
+    """
+    # number of timesteps with duration time_delay within each hour
+    nt = int((60 * 60) // time_delay)
+
+    # target number of trades to execute. Not all trades may able to be
+    # executed due to time delay alone.
+    nte = min(len(delta_x), nt)
+
+    # no. timesteps to complete arb
+    narb = int(np.ceil(arb_time/time_delay))
+
+    # arb effectiveness in each timestep
+    arb_offset = (np.minimum(1, np.linspace(1, narb, narb) * time_delay / arb_time)
+                  * arb_effectiveness / 100).tolist()
+
+    received = fees = spread = 0
+
+    max_perc_spread = -np.inf
+
+    # trade attempted at the previous timestep, reversed by arbitrage
+    prev_dx = prev_dy = 0
+
+    # number of trades executed. Rejected trades are retried at the next
+    # timestep, so the trade attempted is always the next to execute.
+    ne = 0
+
+    narb_left = 0
+
+    t = 0
+
+    while (ne < nte) and (t < nt):
+
+        dx = delta_x[ne]
+
+        # Number of tokens being asked (at AMM price)
+        dy = - dx / pool_curve.spot_price(pool_x, pool_y)
+
+        swap = pool_curve.swap(dx, dy, pool_x, pool_y, swap_fee)
+
+        perc_spread = swap[3]
+
+        max_perc_spread = max(max_perc_spread, perc_spread)
+
+        executed = perc_spread < max_slippage
+
+        if record is not None:
+            record(t, t * time_delay, dx, dy, pool_x, pool_y, swap, executed)
+
+        # slippage will always exceed max slippage & all trades will fail
+        if ((t == 0) or (narb_left == 0)) and (perc_spread > max_slippage):
+            break
+
+        if executed:
+            pool_x, pool_y = pool_curve.apply_trade(dx, dy, pool_x, pool_y,
+                                                    1 - arb_offset[0])
+
+            narb_left = narb - 1
+
+            received += swap[0]
+
+            fees += swap[1]
+
+            spread += swap[2]
 
-    if return_usd and delta_x > 0:
-        ask *= pool_x / pool_y
-        out *= pool_x / pool_y
+            ne += 1
+        elif narb_left > 0:
+            # trade is rejected due to slippage exceeding acceptable level,
+            # and retried after time_delay. arbitrage continues, if time
+            # delay is smaller than arb time.
+            pool_x, pool_y = pool_curve.apply_trade(prev_dx, prev_dy,
+                                                    pool_x, pool_y,
+                                                    -arb_offset[narb-narb_left])
 
-    fee = out * swap_fee / 100
+            narb_left -= 1
 
-    spread = ask - out
+        prev_dx, prev_dy = dx, dy
 
-    perc_spread = spread / ask * 100
+        t += 1
 
-    received = out - fee
+    if t < nt or nt == 0:
+        max_perc_spread = max(max_perc_spread, 0)
 
-    return received, fee, spread, perc_spread
+    return received, fees, spread, max_perc_spread
 
 def sim_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
-               pool_x_i, pool_y_i, swap_fee):
+               pool_x_i, pool_y_i, swap_fee, pool_curve=CONSTANT_PRODUCT):
     """
     Simulates executing a series of trades, while accounting for AMM
     conditions throughout the time of swapping.
@@ -73,6 +254,8 @@ def sim_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
         Initial token balance for pool token y.
     swap_fee : float
         Percentage fee charged by AMM for swap execution.
+    pool_curve : PoolCurve
+        Pricing curve of the AMM pool. Defaults to constant product.
 
     Returns
     -------
@@ -84,27 +267,6 @@ def sim_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
     # number of timesteps with duration time_delay within each hour
     nt = int((60 * 60) // time_delay)
 
-    # not all trades may able to be executed due to time delay alone
-    if len(delta_x) > nt:
-        delta_x = delta_x[0:nt]
-
-    # target number of trades to execute
-    nte = len(delta_x)
-
-    # number of trades executed
-    ne = 0
-
-    # USD value of trade to execute at each timestep
-    delta_xt = np.concatenate([delta_x, np.zeros(nt - nte)])
-
-    # Number of tokens being asked (at AMM price)
-    delta_yt = np.zeros(nt)
-
-    # UST (x) and token (y) bool balances before each trade
-    pool_x = np.zeros(nt) + pool_x_i
-
-    pool_y = np.zeros(nt) + pool_y_i
-
     # trade volume executed at each timestep
     trade_actual = np.zeros(nt)
 
@@ -117,72 +279,138 @@ def sim_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
     # swap fees paid for all trades at each timestep
     swap_fees = np.zeros(nt)
 
-    # no. timesteps to complete arb
-    narb = int(np.ceil(arb_time/time_delay))
+    def record(t, time, dx, dy, pool_x, pool_y, swap, executed):
+        swap_perc_spread[t] = swap[3]
 
-    # arb effectiveness in each timestep
-    arb_offset = np.minimum(1, np.linspace(1, narb, narb) * time_delay / arb_time) * arb_effectiveness / 100
+        if executed:
+            trade_actual[t], swap_fees[t], swap_spread[t] = swap[:3]
 
-    narb_left = 0
+    _run_trades(delta_x, max_slippage, time_delay, arb_effectiveness, arb_time,
+                pool_x_i, pool_y_i, swap_fee, pool_curve, record)
 
-    t = 0
+    return trade_actual, swap_fees, swap_spread, swap_perc_spread
 
-    while (ne < nte) and (t < nt):
+def _split_pool_balances(delta_x, arb_retained, pool_liquidity):
+    """
+    Pool balances before each trade of equally sized trades (one candidate
+    split per row of delta_x), if every trade is accepted. Tokens asked are
+    valued at the pool price, so each trade scales the token balance by
+    (1 - delta_x / pool_x), less the immediate arbitrage.
+    """
+    k = np.arange(delta_x.shape[1])
 
-        delta_yt[t] = - delta_xt[t] / (pool_x[t] / pool_y[t])
+    pool_x = pool_liquidity['pool_x_i'] + delta_x * arb_retained * k
 
-        swap = sim_swap(delta_xt[t], delta_yt[t], pool_x[t], pool_y[t], swap_fee)
+    pool_y_scale = np.cumprod(1 - delta_x * arb_retained / pool_x, axis=1)
 
-        perc_spread = swap[3]
+    pool_y = pool_liquidity['pool_y_i'] * np.concatenate(
+        [np.ones((len(delta_x), 1)), pool_y_scale[:, :-1]], axis=1)
 
-        swap_perc_spread[t] = perc_spread
+    return pool_x, pool_y
 
-        # slippage will always exceed max slippage & all trades will fail
-        if ((t == 0) or (narb_left == 0)) and (perc_spread > max_slippage):
-            break
+def optimal_trade_split(trade_vol, max_trade, max_slippage, trade_delay,
+                        arb_effectiveness, arb_time, pool_liquidity, swap_fee,
+                        pool_curve=CONSTANT_PRODUCT, n_candidates=32):
+    """
+    Finds the size and number of equally sized trades that maximises the
+    volume executed within the hour, without any trade being rejected for
+    exceeding max_slippage.
 
-        if perc_spread < max_slippage:
-            pool_x[t:] += delta_xt[t] * (1 - arb_offset[0])
+    Candidate splits are evaluated together as a batch. Pool balances before
+    each trade follow the same updates as sim_trades for accepted trades
+    (each trade moves the pool, less the immediate arbitrage), so the
+    slippage of every trade for every candidate can be quoted at once.
 
-            pool_y[t:] += delta_yt[t] * (1 - arb_offset[0])
+    Parameters
+    ----------
+    trade_vol : float
+        Total value of swaps required to execute. Can be either positive
+        or negative (indicates direction of trade).
+    max_trade : float
+        Maximum value per swap.
+    max_slippage : float
+        Maximum acceptable slippage for accepting each trade.
+    trade_delay : float
+        Time between each trade.
+    arb_effectiveness : float
+        Maximum effectiveness of arbitrage bots in restoring AMM price to its
+        pre trade level.
+    arb_time : float
+        Time taken for arbitrage bots to restore AMM price by
+        arb_effectiveness.
+    pool_liquidity : dict
+        Dictionary of initial pool token balances.
+    swap_fee : float
+        Percentage fee charged by AMM for swap execution.
+    pool_curve : PoolCurve
+        Pricing curve of the AMM pool. Defaults to constant product.
+    n_candidates : int
+        Maximum number of candidate splits to evaluate.
 
-            narb_left = narb - 1
+    Returns
+    -------
+    trade_size : float
+        Absolute value of each trade.
+    n_trades : int
+        Number of trades, 0 if trade_delay leaves no time to trade within
+        the hour.
 
-            trade_actual[t] = swap[0]
+    """
+    direction = abs(trade_vol) / trade_vol
 
-            swap_fees[t] = swap[1]
+    # number of timesteps with duration trade_delay within each hour
+    nt = int((60 * 60) // trade_delay)
 
-            swap_spread[t] = swap[2]
+    # no time to trade within the hour, as for the fixed split
+    if nt == 0:
+        return 0, 0
 
-            ne += 1
-        else:
-            # trade is rejected due to slippage exceeding acceptable level.
-            # trades are shifted by a length of time equal to time_delay
+    # candidate number of trades, including the fixed max_trade split
+    n_fixed = int(np.ceil(abs(trade_vol) / max_trade))
 
-            if narb_left > 0:
-                # arbitrage continues, if time delay is smaller
-                # than arb time.
-                pool_x[t:] -= delta_xt[t-1] * arb_offset[narb-narb_left]
+    n_trades = np.unique(np.concatenate([
+        np.geomspace(1, nt, n_candidates).round().astype(int),
+        [min(n_fixed, nt)]]))
 
-                pool_y[t:] -= delta_yt[t-1] * arb_offset[narb-narb_left]
+    trade_size = np.minimum(abs(trade_vol) / n_trades, max_trade)
 
-                narb_left -= 1
+    # share of each trade remaining in the pool after immediate arbitrage
+    arb_retained = 1 - min(1, trade_delay / arb_time) * arb_effectiveness / 100
 
-            delta_xt[t+1:] = delta_xt[t:nt-1]
+    # value offered for the k-th trade of each candidate
+    k = np.arange(n_trades.max())
 
-            delta_yt[t+1:] = delta_yt[t:nt-1]
+    delta_x = np.zeros((len(n_trades), len(k))) + (direction * trade_size)[:, None]
 
-        t += 1
+    pool_x, pool_y = _split_pool_balances(delta_x, arb_retained, pool_liquidity)
 
-    return trade_actual, swap_fees, swap_spread, swap_perc_spread
+    delta_y = - delta_x / pool_curve.spot_price(pool_x, pool_y)
+
+    perc_spread = pool_curve.quote(delta_x, delta_y, pool_x, pool_y, swap_fee)[3]
+
+    # trades are accepted until the first trade exceeding max slippage
+    accepted = (perc_spread < max_slippage) & (k < n_trades[:, None])
+
+    executed_vol = np.cumprod(accepted, axis=1).sum(axis=1) * trade_size
+
+    # fewest trades amongst the candidates executing the most volume
+    best = np.flatnonzero(np.isclose(executed_vol, executed_vol.max()))[0]
+
+    return trade_size[best], int(n_trades[best])
 
 def execute_trades(trade_vol, max_trade, max_slippage, trade_delay,
-                   arb_effectiveness, arb_time, pool_liquidity, swap_fee):
+                   arb_effectiveness, arb_time, pool_liquidity, swap_fee,
+                   pool_curve=CONSTANT_PRODUCT, optimal_split=False,
+                   event_log=None):
     """
     Divides trade_vol into a number of equally sized trades for execution.
     Actual swap volumes reflect market conditions including spread and
     arbitrage.
 
+    By default trade_vol is divided into trades of max_trade, with the
+    remainder as the last trade. If optimal_split is set, the trade size
+    and number of trades are chosen by optimal_trade_split instead.
+
 
     Parameters
     ----------
@@ -205,6 +433,13 @@ def execute_trades(trade_vol, max_trade, max_slippage, trade_delay,
         Dictionary of initial pool token balances.
     swap_fee : float
         Percentage fee charged by AMM for swap execution.
+    pool_curve : PoolCurve
+        Pricing curve of the AMM pool. Defaults to constant product.
+    optimal_split : bool
+        Whether to size trades to maximise executed volume, rather than
+        dividing into max_trade sized trades.
+    event_log : TradeLog
+        Optional log to record each executed and rejected trade in.
 
     """
     if trade_vol == 0:
@@ -215,28 +450,36 @@ def execute_trades(trade_vol, max_trade, max_slippage, trade_delay,
     # if -ve: borrowing less UST and swapping token for UST
     direction = abs(trade_vol) / trade_vol
 
-    # number of max_volume trades
-    n = int(abs(trade_vol) // max_trade)
-
-    # remainder volume (assume to be last trade)
-    rem_vol = abs(trade_vol) - max_trade * n
-
     # array of desired USD swap volumes to execute
-    if rem_vol > 0:
-        trades = direction * np.array([max_trade] * n + [rem_vol])
+    if optimal_split:
+        trade_size, n_trades = optimal_trade_split(trade_vol, max_trade,
+                                                   max_slippage, trade_delay,
+                                                   arb_effectiveness, arb_time,
+                                                   pool_liquidity, swap_fee,
+                                                   pool_curve)
+
+        trades = direction * np.full(n_trades, trade_size)
     else:
-        trades = direction * np.array([max_trade] * n)
+        # number of max_volume trades
+        n = int(abs(trade_vol) // max_trade)
+
+        # remainder volume (assume to be last trade)
+        rem_vol = abs(trade_vol) - max_trade * n
+
+        if rem_vol > 0:
+            trades = direction * np.array([max_trade] * n + [rem_vol])
+        else:
+            trades = direction * np.array([max_trade] * n)
 
     # Value of swaps executed. Not all trades may execute
     # due to maximum slippage, or not enough time due to trade delay.
-    received, fees, spread, perc_spread = sim_trades(trades, max_slippage, trade_delay,
-                                                     arb_effectiveness, arb_time,
-                                                     pool_liquidity['pool_x_i'],
-                                                     pool_liquidity['pool_y_i'],
-                                                     swap_fee)
+    received, fees, spread, perc_spread = _run_trades(
+        trades, max_slippage, trade_delay, arb_effectiveness, arb_time,
+        pool_liquidity['pool_x_i'], pool_liquidity['pool_y_i'], swap_fee,
+        pool_curve, event_log.record if event_log is not None else None)
 
-    received_tot = direction * received.sum()
+    received_tot = direction * received
     
-    offered_tot = direction * (received + fees + spread).sum()
+    offered_tot = direction * (received + fees + spread)
     
-    return received_tot, offered_tot, fees.sum(), spread.sum(), perc_spread.max()
+    return received_tot, offered_tot, fees, spread, perc_spread
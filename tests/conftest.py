@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# tests import ltsim from this checkout
+root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.insert(0, root_dir)
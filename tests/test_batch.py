@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+
+from ltsim.batch import run_batch
+from ltsim.optimize import summary_metrics
+
+param_sets = [{'target_leverage': 2,
+               'min_leverage': min_leverage,
+               'max_leverage': 2.5,
+               'congestion_time': 2,
+               'rebalance_interval': 4,
+               'recentering_speed_periodic': 0.1,
+               'recentering_speed_emergency': 0.2,
+               'trade_params_periodic': (1e6, 2, 1),
+               'trade_params_emergency': (5e5, 4, 1),
+               'borrow_rate': 40,
+               'liq_thresh': 90,
+               'liq_premium': 20,
+               'n_tokens_issued': 1000,
+               'swap_fee': 0.3,
+               'arb_params': (95, 3)} for min_leverage in (1.5, 1.8)]
+
+windows = [(0, 100), (50, 200)]
+
+# number of tasks run by counting_metrics
+runs = []
+
+def counting_metrics(price, state):
+    runs.append(1)
+
+    return summary_metrics(price, state)
+
+def paths(nt=200):
+    rng = np.random.default_rng(0)
+
+    result = []
+
+    for _ in range(2):
+        price = 40 * np.exp(np.cumsum(rng.normal(0, 0.03, nt)))
+
+        pool_x = np.full(nt, 3e7)
+
+        result.append((price, pool_x, pool_x / price))
+
+    return result
+
+def run(directory):
+    runs.clear()
+
+    return run_batch(str(directory), paths(), param_sets, windows,
+                     reduce_fn=counting_metrics)
+
+def sorted_results(results):
+    return results.sort_values('key').reset_index(drop=True)
+
+def test_interrupted_batch_resumes_missing_tasks(tmp_path):
+    expected = run(tmp_path / 'full')
+
+    n_tasks = len(param_sets) * len(windows) * 2
+
+    assert len(runs) == len(expected) == n_tasks
+
+    directory = tmp_path / 'interrupted'
+
+    run(directory)
+
+    # interrupt after 5 complete rows: the 6th manifest line is torn, and
+    # column files hold bytes of rows which were never completed
+    manifest_path = directory / 'manifest.jsonl'
+
+    lines = manifest_path.read_bytes().splitlines(keepends=True)
+
+    manifest_path.write_bytes(b''.join(lines[:5]) + lines[5][:10])
+
+    for name in os.listdir(directory):
+        if name.endswith('.f8'):
+            with open(directory / name, 'ab') as f:
+                f.write(b'\x01' * 13)
+
+    results = run(directory)
+
+    assert len(runs) == n_tasks - 5
+
+    pd.testing.assert_frame_equal(sorted_results(results),
+                                  sorted_results(expected))
+
+    # a completed batch runs nothing
+    results = run(directory)
+
+    assert not runs
+
+    pd.testing.assert_frame_equal(sorted_results(results),
+                                  sorted_results(expected))
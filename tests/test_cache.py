@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ltsim import StableSwapCurve
+from ltsim.cache import ResultCache
+from ltsim.core import allocate_buffers
+from ltsim.model import leveraged_token_model
+
+nt = 100
+
+model_params = {'target_leverage': 2,
+                'min_leverage': 1.5,
+                'max_leverage': 2.5,
+                'congestion_time': 2,
+                'rebalance_interval': 4,
+                'recentering_speed_periodic': 0.1,
+                'recentering_speed_emergency': 0.2,
+                'trade_params_periodic': (1e6, 2, 1),
+                'trade_params_emergency': (5e5, 4, 1),
+                'borrow_rate': np.full(nt, 40.0),
+                'liq_thresh': 90,
+                'liq_premium': 20,
+                'n_tokens_issued': 1000,
+                'swap_fee': 0.3,
+                'arb_params': (95, 3)}
+
+def arrays():
+    rng = np.random.default_rng(0)
+
+    price = 40 * np.exp(np.cumsum(rng.normal(0, 0.03, nt)))
+
+    pool_x = np.full(nt, 3e7)
+
+    return price, pool_x, pool_x / price
+
+def changed_schedule(values, t=50):
+    values = values.copy()
+
+    values[t] += 1
+
+    return values
+
+def test_hit_returns_stored_results(tmp_path):
+    cache = ResultCache(tmp_path)
+
+    expected = cache.simulate(*arrays(), **model_params)
+
+    actual = cache.simulate(*arrays(), **model_params)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    for name in expected:
+        np.testing.assert_array_equal(actual[name], expected[name])
+
+@pytest.mark.parametrize('name, value', [
+    ('pool_curve', StableSwapCurve(100)),
+    ('borrow_rate', changed_schedule(model_params['borrow_rate'])),
+    ('swap_fee', np.full(nt, 0.3)),
+    ('liquidation_cascade', True),
+    ('optimal_split', True),
+    ('arb_params', (95, 4))])
+def test_key_depends_on_each_parameter(name, value, tmp_path):
+    cache = ResultCache(tmp_path)
+
+    params = dict(model_params, pool_curve=StableSwapCurve(50))
+
+    cache.simulate(*arrays(), **params)
+
+    cache.simulate(*arrays(), **dict(params, **{name: value}))
+
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_key_depends_on_array_values(tmp_path):
+    cache = ResultCache(tmp_path)
+
+    price, pool_x, pool_y = arrays()
+
+    cache.simulate(price, pool_x, pool_y, **model_params)
+
+    cache.simulate(changed_schedule(price), pool_x, pool_y, **model_params)
+
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    rng = np.random.default_rng(0)
+
+    # incompressible entries of the same size
+    entries = {key: {'values': rng.random(1000)} for key in 'abc'}
+
+    cache = ResultCache(tmp_path, max_bytes=2 ** 62)
+
+    cache.put('a', entries['a'])
+
+    cache.put('b', entries['b'])
+
+    # a was stored first, but is used after b
+    now = time.time()
+
+    os.utime(cache._path('a'), (now - 20, now - 20))
+
+    os.utime(cache._path('b'), (now - 10, now - 10))
+
+    assert cache.get('a') is not None
+
+    cache.max_bytes = 2.5 * os.path.getsize(cache._path('a'))
+
+    cache.put('c', entries['c'])
+
+    assert cache.evictions == 1
+
+    assert cache.get('b') is None
+
+    np.testing.assert_array_equal(cache.get('a')['values'],
+                                  entries['a']['values'])
+
+    assert cache.stats()['entries'] == 2
+
+def test_hit_is_stored_in_buffers(tmp_path):
+    price, pool_x, pool_y = arrays()
+
+    dates = pd.date_range('2021-01-01', periods=nt, freq='h')
+
+    price_data = pd.DataFrame({'DATE': dates, 'PRICE': price})
+
+    pool_liquidity = pd.DataFrame({'DATE': dates, 'pool_x_i': pool_x,
+                                   'pool_y_i': pool_y})
+
+    cache = ResultCache(tmp_path)
+
+    expected = leveraged_token_model(price_data, pool_liquidity,
+                                     **model_params, cache=cache)
+
+    buffers = allocate_buffers(nt)
+
+    res = leveraged_token_model(price_data, pool_liquidity, **model_params,
+                                buffers=buffers, cache=cache)
+
+    assert cache.hits == 1
+
+    for column, name in [('leverage', 'leverage'),
+                         ('loan_to_value_ratio', 'ltv'),
+                         ('leveraged_token_value', 'leveraged_token_value')]:
+        assert np.shares_memory(res[column].values, buffers[name])
+
+    pd.testing.assert_frame_equal(res, expected)
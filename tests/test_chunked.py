@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from ltsim.chunked import run_chunked
+from ltsim.model import leveraged_token_model
+
+model_params = {'target_leverage': 3,
+                'min_leverage': 2.5,
+                'max_leverage': 3.5,
+                'congestion_time': 1,
+                'rebalance_interval': 24,
+                'recentering_speed_periodic': 0.5,
+                'recentering_speed_emergency': 1,
+                'trade_params_periodic': (1e6, 4, 1),
+                'trade_params_emergency': (1e6, 4, 1),
+                'borrow_rate': 40,
+                'liq_thresh': 80,
+                'liq_premium': 20,
+                'n_tokens_issued': 1e5,
+                'swap_fee': 0.3,
+                'arb_params': (95, 3)}
+
+def series(nt=1000):
+    # volatile prices with a crash, so runs liquidate and rebalance
+    rng = np.random.default_rng(3)
+
+    log_returns = rng.normal(0, 0.03, nt)
+
+    log_returns[600:603] += np.log(0.4) / 3
+
+    price = 40 * np.exp(np.cumsum(log_returns))
+
+    pool_x = 3e7 * np.exp(rng.normal(0, 0.1, nt))
+
+    return price, pool_x, pool_x / price
+
+@pytest.mark.parametrize('liquidation_cascade', [False, True])
+def test_chunked_run_matches_single_run(liquidation_cascade, tmp_path):
+    price, pool_x, pool_y = series()
+
+    params = dict(model_params, liquidation_cascade=liquidation_cascade,
+                  borrow_rate=np.linspace(10, 80, len(price)))
+
+    dates = pd.date_range('2021-01-01', periods=len(price), freq='h')
+
+    expected = leveraged_token_model(
+        pd.DataFrame({'DATE': dates, 'PRICE': price}),
+        pd.DataFrame({'DATE': dates, 'pool_x_i': pool_x, 'pool_y_i': pool_y}),
+        **params)
+
+    assert expected['liquidation_amount'].any()
+
+    assert expected['periodic_rebalance'].any()
+
+    outputs = run_chunked(price, pool_x, pool_y, params, tmp_path,
+                          chunk_size=97)
+
+    assert set(outputs) == set(expected.columns) - {'date', 'hour',
+                                                     'underlying_token_price'}
+
+    for name, values in outputs.items():
+        np.testing.assert_allclose(values, expected[name], rtol=1e-9,
+                                   atol=1e-9, err_msg=name)
+
+def test_only_written_outputs_are_returned(tmp_path):
+    price, pool_x, pool_y = series(100)
+
+    np.save(tmp_path / 'stale.npy', np.zeros(3))
+
+    outputs = run_chunked(price, pool_x, pool_y, model_params, tmp_path,
+                          chunk_size=30, outputs=['leverage', 'drawdown_leveraged'])
+
+    assert list(outputs) == ['leverage', 'drawdown_leveraged']
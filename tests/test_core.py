@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from ltsim import kernel, reference
+from ltsim.core import simulate_leveraged_token
+from ltsim.model import leveraged_token_model
+
+def crash_inputs(nt=48, crash_at=24, drop=0.4):
+    # flat price which falls by drop in a single hour and stays there
+    price = np.full(nt, 100.0)
+
+    price[crash_at:] *= 1 - drop
+
+    pool_x = np.full(nt, 1e7)
+
+    return price, pool_x, pool_x / price
+
+def crash_params(**params):
+    model_params = {'target_leverage': 3,
+                    'min_leverage': 1.5,
+                    'max_leverage': 10,
+                    'congestion_time': 1,
+                    'rebalance_interval': 10 ** 9,
+                    'recentering_speed_periodic': 1,
+                    'recentering_speed_emergency': 1,
+                    'trade_params_periodic': (1e6, 5, 1),
+                    'trade_params_emergency': (1e6, 5, 1),
+                    'borrow_rate': 0,
+                    'liq_thresh': 80,
+                    'liq_premium': 120,
+                    'n_tokens_issued': 1000,
+                    'swap_fee': 0.3,
+                    'arb_params': (95, 3)}
+
+    model_params.update(params)
+
+    return model_params
+
+@pytest.mark.parametrize('liq_premium', [20, 120])
+def test_single_crash_liquidates_once_with_cascade(liq_premium):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        state = simulate_leveraged_token(*crash_inputs(),
+                                         **crash_params(liq_premium=liq_premium),
+                                         liquidation_cascade=True)
+
+    assert np.flatnonzero(state['liquidation_amount']).tolist() == [24]
+
+    assert np.flatnonzero(state['liquidation_volume']).tolist() == [24]
+
+def test_zero_arb_time_without_cascade():
+    state = simulate_leveraged_token(*crash_inputs(drop=0.1),
+                                     **crash_params(arb_params=(95, 0)))
+
+    assert not state['liquidation_amount'].any()
+
+@pytest.mark.parametrize('use_kernel', [True, False])
+def test_infinite_rebalance_interval_matches_reference(use_kernel, monkeypatch):
+    # never rebalancing periodically, as accepted by the reference model
+    monkeypatch.setattr(kernel, 'enabled', use_kernel)
+
+    nt = 200
+
+    rng = np.random.default_rng(0)
+
+    price = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, nt)))
+
+    dates = pd.date_range('2021-01-01', periods=nt, freq='h', tz='UTC')
+
+    price_data = pd.DataFrame({'DATE': dates, 'PRICE': price})
+
+    pool_liquidity = pd.DataFrame({'DATE': dates, 'pool_x_i': np.full(nt, 1e7),
+                                   'pool_y_i': 1e7 / price})
+
+    model_params = crash_params(rebalance_interval=np.inf, borrow_rate=20)
+
+    expected = reference.leveraged_token_model(price_data, pool_liquidity,
+                                               **model_params)
+
+    actual = leveraged_token_model(price_data, pool_liquidity, **model_params)
+
+    assert not actual['periodic_rebalance'].any()
+
+    for name in expected.columns.drop('date'):
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-9,
+                                   atol=1e-9, err_msg=name)
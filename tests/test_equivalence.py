@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from ltsim import kernel
+from ltsim.equivalence import check_equivalence
+from ltsim.model import leveraged_token_model
+
+def test_engines_match_reference():
+    report = check_equivalence(n_scenarios=10, n_steps=200)
+
+    assert report['passed'].all(), report.loc[~report['passed']].to_string()
+
+@pytest.mark.skipif(not kernel.available(),
+                    reason='compiled kernel could not be built')
+def test_numpy_model_matches_reference(monkeypatch):
+    # the model without the compiled kernel, which is checked above
+    monkeypatch.setattr(kernel, 'enabled', False)
+
+    report = check_equivalence(
+        n_scenarios=10, n_steps=200,
+        candidates={'leveraged_token_model': leveraged_token_model})
+
+    assert report['passed'].all(), report.loc[~report['passed']].to_string()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import http.server
+import threading
+import time
+
+import pytest
+
+from ltsim.fetch import DataClient, FetchError, HTTPTransport, run_sync
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    # sends the body a byte at a time, each within the socket timeout
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '1000')
+        self.end_headers()
+        for _ in range(100):
+            if self.server.stopped.wait(0.1):
+                break
+            try:
+                self.wfile.write(b' ')
+                self.wfile.flush()
+            except OSError:
+                break
+
+    def log_message(self, *args):
+        pass
+
+class JSONHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = b'[{"a": 1}, {"a": 2}]'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(request):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), request.param)
+    server.stopped = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.stopped.set()
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize('server', [SlowHandler], indirect=True)
+def test_timed_out_download_frees_its_worker(server):
+    # without aborting, the worker would keep reading for 10s
+    client = DataClient(HTTPTransport(), timeout=0.5, retries=0,
+                        max_connections=1)
+
+    with client:
+        start = time.perf_counter()
+
+        with pytest.raises(FetchError):
+            run_sync(client.fetch_frame(server))
+
+        # the only worker thread is free again once the download is aborted
+        client._executor.submit(lambda: None).result(timeout=2)
+
+        assert time.perf_counter() - start < 2
+
+@pytest.mark.parametrize('server', [JSONHandler], indirect=True)
+def test_download(server):
+    with DataClient(timeout=5) as client:
+        frame = run_sync(client.fetch_frame(server))
+
+    assert frame['a'].tolist() == [1, 2]
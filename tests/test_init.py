@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import ltsim
+
+def test_star_import_provides_all_names():
+    namespace = {}
+
+    exec('from ltsim import *', namespace)
+
+    for name in ltsim.__all__:
+        assert namespace[name] is getattr(ltsim, name)
+
+    for name in ('leveraged_token_model', 'get_all_model_data',
+                 'get_model_data', 'execute_trades', 'sim_trades',
+                 'prepare_inputs'):
+        assert name in namespace
+
+def test_import_does_not_load_pandas():
+    loaded = subprocess.run([sys.executable, '-c',
+                             'import sys, ltsim; print("pandas" in sys.modules)'],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(ltsim.__file__))).stdout
+
+    assert loaded.strip() == 'False'
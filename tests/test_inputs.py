@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from ltsim.inputs import prepare_inputs
+from ltsim.model import leveraged_token_model
+
+def frames(nt=48):
+    # naive dates, whose column values are the frame's own datetime64 array
+    dates = pd.date_range('2021-01-01', periods=nt, freq='h')
+
+    price = np.linspace(40, 60, nt)
+
+    pool_x = np.full(nt, 3e7)
+
+    return (pd.DataFrame({'DATE': dates, 'PRICE': price}),
+            pd.DataFrame({'DATE': dates, 'pool_x_i': pool_x,
+                          'pool_y_i': pool_x / price}))
+
+@pytest.mark.parametrize('run_model', [False, True])
+def test_caller_frames_stay_writable(run_model):
+    price_data, pool_liquidity = frames()
+
+    if run_model:
+        leveraged_token_model(price_data, pool_liquidity, 2, 1.5, 2.5, 2, 4,
+                              0.1, 0.2, (1e6, 2, 1), (5e5, 4, 1), 40, 90, 20,
+                              1000, 0.3, (95, 3))
+    else:
+        prepare_inputs(price_data, pool_liquidity)
+
+    price_data['PRICE'].values[0] = 5
+
+    pool_liquidity['pool_x_i'].values[0] = 5
+
+    pool_liquidity['pool_y_i'].values[0] = 5
+
+    price_data['DATE'].values[0] = np.datetime64('2020-01-01')
+
+def test_inputs_are_read_only_copies():
+    price_data, pool_liquidity = frames()
+
+    inputs = prepare_inputs(price_data, pool_liquidity)
+
+    for array in (inputs.price, inputs.pool_x, inputs.pool_y, inputs.dates):
+        assert not array.flags.writeable
+
+    assert not np.shares_memory(inputs.pool_x, pool_liquidity['pool_x_i'].values)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pytest
+
+from ltsim import kernel
+from ltsim.core import SimState, simulate_leveraged_token
+from ltsim.equivalence import random_model_scenario, scenario_kinds
+from ltsim.inputs import prepare_inputs
+from ltsim.parallel import model_args, window_args
+
+pytestmark = pytest.mark.skipif(not kernel.available(),
+                                reason='compiled kernel could not be built')
+
+def run_chunks(inputs, model_params, cuts, use_kernel, monkeypatch):
+    # state of a run split at cuts, concatenated, and the final carry
+    monkeypatch.setattr(kernel, 'enabled', use_kernel)
+
+    carry = SimState()
+
+    bounds = [0, *cuts, len(inputs.price)]
+
+    states = []
+
+    with np.errstate(all='ignore'):
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            states.append(simulate_leveraged_token(
+                inputs.price[start:stop], inputs.pool_x[start:stop],
+                inputs.pool_y[start:stop],
+                *window_args(model_args(model_params), start, stop),
+                carry=carry))
+
+    return {name: np.concatenate([state[name] for state in states])
+            for name in states[0]}, carry
+
+@pytest.mark.parametrize('seed', range(10))
+def test_kernel_matches_numpy_loop(seed, monkeypatch):
+    rng = np.random.default_rng(seed)
+
+    for kind in scenario_kinds:
+        price_data, pool_liquidity, model_params = \
+            random_model_scenario(rng, 400, kind)
+
+        model_params['liquidation_cascade'] = bool(seed % 2)
+
+        if seed % 3 == 0:
+            model_params['borrow_rate'] = rng.uniform(0, 100, 400)
+
+        inputs = prepare_inputs(price_data, pool_liquidity)
+
+        cuts = [] if seed % 4 else [150, 151]
+
+        expected, expected_carry = run_chunks(inputs, model_params, cuts,
+                                              False, monkeypatch)
+
+        actual, actual_carry = run_chunks(inputs, model_params, cuts, True,
+                                          monkeypatch)
+
+        for name in expected:
+            np.testing.assert_array_equal(actual[name], expected[name],
+                                          err_msg=f'{kind} {name}')
+
+        assert actual_carry == expected_carry
+
+def test_unsupported_inputs_fall_back_to_numpy_loop():
+    nt = 48
+
+    price = np.full(nt, 100.0)
+
+    pool_x = np.full(nt, 1e7)
+
+    # a zero max trade volume fails in execute_trades, as without the kernel
+    with pytest.raises(OverflowError), np.errstate(divide='ignore'):
+        simulate_leveraged_token(price, pool_x, pool_x / price, 2, 1.5, 2.5,
+                                 1, 0, 1, 1, (0, 3, 1), (0, 3, 1), 20, 85, 5,
+                                 1000, 0.3, (95, 3))
+
+def test_builds_in_private_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    build_dir = kernel._build_dir()
+
+    assert build_dir == str(tmp_path / 'ltsim')
+
+    assert os.stat(build_dir).st_mode & 0o777 == 0o700
+
+def test_shared_cache_dir_is_not_used(tmp_path, monkeypatch):
+    # a directory other users can write to could hold a planted library
+    shared_dir = tmp_path / 'ltsim'
+
+    shared_dir.mkdir()
+
+    shared_dir.chmod(0o777)
+
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    build_dir = kernel._build_dir()
+
+    assert build_dir != str(shared_dir)
+
+    assert os.stat(build_dir).st_mode & 0o077 == 0
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from ltsim.core import allocate_buffers
+from ltsim.model import leveraged_token_model
+
+model_params = (2, 1.5, 2.5, 2, 4, 0.1, 0.2, (1e6, 2, 1), (5e5, 4, 1), 40, 90,
+                20, 1000, 0.3, (95, 3))
+
+def model_inputs(nt=200):
+    rng = np.random.default_rng(0)
+
+    price = 40 * np.exp(np.cumsum(rng.normal(0, 0.03, nt)))
+
+    dates = pd.date_range('2021-01-01', periods=nt, freq='h', tz='UTC')
+
+    pool_x = np.full(nt, 3e7)
+
+    return (pd.DataFrame({'DATE': dates, 'PRICE': price}),
+            pd.DataFrame({'DATE': dates, 'pool_x_i': pool_x,
+                          'pool_y_i': pool_x / price}))
+
+def test_results_use_buffers_without_copying():
+    price_data, pool_liquidity = model_inputs()
+
+    buffers = allocate_buffers(len(price_data))
+
+    res = leveraged_token_model(price_data, pool_liquidity, *model_params,
+                                buffers=buffers)
+
+    for column, name in [('leveraged_token_value', 'leveraged_token_value'),
+                         ('leverage', 'leverage'),
+                         ('loan_to_value_ratio', 'ltv')]:
+        assert np.shares_memory(res[column].values, buffers[name])
+
+    expected = leveraged_token_model(price_data, pool_liquidity, *model_params)
+
+    pd.testing.assert_frame_equal(res, expected)
+
+def test_input_columns_are_writable_copies():
+    price_data, pool_liquidity = model_inputs()
+
+    res = leveraged_token_model(price_data, pool_liquidity, *model_params)
+
+    res.loc[0, 'underlying_token_price'] = 1.0
+
+    assert price_data.loc[0, 'PRICE'] != 1.0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from ltsim.core import simulate_leveraged_token
+from ltsim.inputs import ModelInputs
+from ltsim.optimize import optimize_parameters, summary_metrics
+from ltsim.parallel import model_args
+
+model_params = {'target_leverage': 2,
+                'min_leverage': 1.5,
+                'max_leverage': 2.5,
+                'congestion_time': 2,
+                'rebalance_interval': 4,
+                'recentering_speed_periodic': 0.1,
+                'recentering_speed_emergency': 0.2,
+                'trade_params_periodic': (1e6, 2, 1),
+                'trade_params_emergency': (5e5, 4, 1),
+                'borrow_rate': 40,
+                'liq_thresh': 90,
+                'liq_premium': 20,
+                'n_tokens_issued': 1000,
+                'swap_fee': 0.3,
+                'arb_params': (95, 3)}
+
+def test_continued_stages_match_full_runs():
+    nt = 1500
+
+    rng = np.random.default_rng(2)
+
+    price = 40 * np.exp(np.cumsum(rng.normal(0, 0.04, nt)))
+
+    pool_x = 3e7 * np.exp(rng.normal(0, 0.1, nt))
+
+    inputs = ModelInputs(price, pool_x, pool_x / price, np.arange(nt),
+                         np.zeros(nt))
+
+    search_space = {'min_leverage': (1.2, 2.0), 'max_leverage': (2.0, 3.0),
+                    'rebalance_interval': (1, 24)}
+
+    best_params, results = optimize_parameters(
+        inputs, None, model_params, search_space,
+        lambda m: m['total_return'] + m['max_drawdown'], n_candidates=8,
+        stages=(0.2, 0.5, 1), seed=0)
+
+    finalists = results[results['stage'] == 2]
+
+    assert len(finalists) >= 1
+
+    for _, row in finalists.iterrows():
+        params = {**model_params, **{name: row[name] for name in search_space}}
+
+        expected = summary_metrics(price, simulate_leveraged_token(
+            *inputs.arrays, *model_args(params)))
+
+        for name, value in expected.items():
+            np.testing.assert_allclose(row[name], value, rtol=1e-9, atol=1e-6)
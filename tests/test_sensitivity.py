@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ltsim.core import simulate_leveraged_token
+from ltsim.parallel import model_args
+from ltsim.sensitivity import (_perturb, case_metrics, divergence_step,
+                               run_cases)
+
+base_params = {'target_leverage': 3,
+               'min_leverage': 2.5,
+               'max_leverage': 3.5,
+               'congestion_time': 1,
+               'rebalance_interval': 24,
+               'recentering_speed_periodic': 0.5,
+               'recentering_speed_emergency': 1,
+               'trade_params_periodic': (1e6, 4, 1),
+               'trade_params_emergency': (1e6, 4, 1),
+               'borrow_rate': 40,
+               'liq_thresh': 80,
+               'liq_premium': 20,
+               'n_tokens_issued': 1e5,
+               'swap_fee': 0.3,
+               'arb_params': (99, 1)}
+
+def model_arrays(nt=2000):
+    rng = np.random.default_rng(1)
+
+    price = 40 * np.exp(np.cumsum(rng.normal(0, 0.03, nt)))
+
+    pool_x = 3e7 * np.exp(rng.normal(0, 0.1, nt))
+
+    return price, pool_x, pool_x / price
+
+@pytest.mark.parametrize('liquidation_cascade', [False, True])
+def test_run_cases_matches_independent_runs(liquidation_cascade):
+    price, pool_x, pool_y = model_arrays()
+
+    params = dict(base_params, liquidation_cascade=liquidation_cascade)
+
+    cases = [params]
+
+    for name, step in [('liq_thresh', 1), ('swap_fee', 0.01),
+                       ('borrow_rate', 1), ('leverage_band', 0.05),
+                       ('rebalance_interval', 1)]:
+        cases += [_perturb(params, name, step), _perturb(params, name, -step)]
+
+    expected = [case_metrics(price, simulate_leveraged_token(price, pool_x,
+                                                             pool_y,
+                                                             *model_args(case)))
+                for case in cases]
+
+    np.testing.assert_allclose(run_cases(price, pool_x, pool_y, cases),
+                               expected, rtol=1e-9)
+
+def test_divergence_step():
+    price, pool_x, pool_y = model_arrays()
+
+    state = simulate_leveraged_token(price, pool_x, pool_y,
+                                     *model_args(base_params))
+
+    assert divergence_step(state, base_params, dict(base_params)) == len(price)
+
+    step = divergence_step(state, base_params,
+                           _perturb(base_params, 'swap_fee', 0.01))
+
+    assert step == np.flatnonzero(state['target_rebalance_amount'])[0]
+
+    assert divergence_step(state, base_params,
+                           _perturb(base_params, 'target_leverage', 0.1)) == 0
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from ltsim import CONSTANT_PRODUCT, execute_trades
+from ltsim.trade_sim import _run_trades, _split_pool_balances
+
+pool_liquidity = {'pool_x_i': 30160053, 'pool_y_i': 659723}
+
+def test_no_trades_has_zero_spread():
+    totals = _run_trades(np.array([]), 3, 1, 95, 3,
+                         pool_liquidity['pool_x_i'], pool_liquidity['pool_y_i'],
+                         0.3, CONSTANT_PRODUCT)
+
+    assert totals == (0, 0, 0, 0)
+
+def test_no_trade_timesteps_has_zero_spread():
+    # trade_delay longer than an hour leaves no time to trade
+    result = execute_trades(750000, 75000, 3, 2 * 60 * 60, 95, 3,
+                            pool_liquidity, 0.3)
+
+    assert result == (0, 0, 0, 0, 0)
+
+def test_max_perc_spread_is_finite():
+    result = execute_trades(-750000, 75000, 3, 1, 95, 3, pool_liquidity, 0.3)
+
+    assert np.isfinite(result).all() and result[4] > 0
+
+def test_optimal_split_without_trade_timesteps():
+    result = execute_trades(1e6, 1e5, 3, 4000, 95, 3, pool_liquidity, 0.3,
+                            optimal_split=True)
+
+    assert result == (0, 0, 0, 0, 0)
+
+@pytest.mark.parametrize('trade_vol', [2e7, -2e7, 3e6, -5e5])
+@pytest.mark.parametrize('max_trade, max_slippage, trade_delay',
+                         [(2e6, 1, 10), (1e6, 3, 1), (5e4, 0.5, 60),
+                          (1e7, 10, 300)])
+def test_optimal_split_executes_at_least_fixed_split(
+        trade_vol, max_trade, max_slippage, trade_delay):
+    args = (trade_vol, max_trade, max_slippage, trade_delay, 95, 3,
+            pool_liquidity, 0.3)
+
+    fixed = execute_trades(*args)
+
+    optimal = execute_trades(*args, optimal_split=True)
+
+    # offered volume (including fees and spread) of executed trades
+    assert abs(optimal[1]) >= abs(fixed[1]) * (1 - 1e-9)
+
+def test_optimal_split_executes_where_fixed_split_cannot():
+    # a single 2e6 trade exceeds 1% slippage, so the fixed split executes
+    # nothing
+    args = (2e7, 2e6, 1, 10, 95, 3, pool_liquidity, 0.3)
+
+    assert execute_trades(*args)[1] == 0
+
+    assert execute_trades(*args, optimal_split=True)[1] > 0
+
+@pytest.mark.parametrize('trade_size', [1e5, -1e5])
+def test_split_pool_balances_match_run_trades(trade_size):
+    n_trades, trade_delay, arb_effectiveness, arb_time = 10, 5, 95, 30
+
+    arb_retained = 1 - min(1, trade_delay / arb_time) * arb_effectiveness / 100
+
+    delta_x = np.full((1, n_trades), trade_size)
+
+    pool_x, pool_y = _split_pool_balances(delta_x, arb_retained, pool_liquidity)
+
+    perc_spread = CONSTANT_PRODUCT.quote(
+        delta_x, - delta_x / CONSTANT_PRODUCT.spot_price(pool_x, pool_y),
+        pool_x, pool_y, 0.3)[3]
+
+    records = []
+
+    def record(t, time, dx, dy, pool_x, pool_y, swap, executed):
+        records.append((pool_x, pool_y, swap[3], executed))
+
+    _run_trades(delta_x[0], 3, trade_delay, arb_effectiveness, arb_time,
+                pool_liquidity['pool_x_i'], pool_liquidity['pool_y_i'], 0.3,
+                CONSTANT_PRODUCT, record)
+
+    run_pool_x, run_pool_y, run_perc_spread, executed = map(np.array,
+                                                            zip(*records))
+
+    assert executed.all() and len(executed) == n_trades
+
+    np.testing.assert_allclose(pool_x[0], run_pool_x, rtol=1e-12)
+
+    np.testing.assert_allclose(pool_y[0], run_pool_y, rtol=1e-12)
+
+    np.testing.assert_allclose(perc_spread[0], run_perc_spread, rtol=1e-9)